@@ -73,6 +73,41 @@ backToQueryBtn.addEventListener('click', () => {
     progress1.classList.remove('completed');
 });
 
+//We remembered the document session of every URL we scraped, so follow-up questions about the same page
+//were answered without scraping and embedding it again
+const scrapedDocuments = {};
+
+async function scrapeDocument(url) {
+    const scrapeResponse = await fetch(`${API_URL}/scrape_url_rag`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({ url })
+    });
+
+    const scrapeData = await scrapeResponse.json();
+
+    if (scrapeData.success) {
+        scrapedDocuments[url] = scrapeData.document_id;
+    }
+
+    return scrapeData;
+}
+
+async function queryDocument(documentId, query) {
+    return fetch(`${API_URL}/query_document`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({
+            question: query,
+            document_id: documentId
+        })
+    });
+}
+
 //Step 2: Submit and get answer - We handled the final submission and processing
 submitBtn.addEventListener('click', async () => {
     const query = queryInput.value.trim();
@@ -116,37 +151,34 @@ submitBtn.addEventListener('click', async () => {
     `;
 
     try {
-        // First, scrape the URL and add to database with document ID
-        const scrapeResponse = await fetch(`${API_URL}/scrape_url_rag`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({ url })
-        });
-
-        const scrapeData = await scrapeResponse.json();
-
-        if (!scrapeData.success) {
-            answerDisplay.innerHTML = `
-                <div class="answer-text" style="color: #d32f2f;">
-                    <strong>Error:</strong> ${scrapeData.error}
-                </div>
-            `;
-            return;
+        // First, scrape the URL into a document session, unless we already had one for it
+        let queryResponse = null;
+
+        if (scrapedDocuments[url]) {
+            queryResponse = await queryDocument(scrapedDocuments[url], query);
+
+            // The session expired, so we scrape the page again below
+            if (queryResponse.status === 404) {
+                delete scrapedDocuments[url];
+                queryResponse = null;
+            }
         }
 
-        // Now query with the document ID
-        const queryResponse = await fetch(`${API_URL}/query_document`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                question: query,
-                document_id: scrapeData.document_id
-            })
-        });
+        if (!queryResponse) {
+            const scrapeData = await scrapeDocument(url);
+
+            if (!scrapeData.success) {
+                answerDisplay.innerHTML = `
+                    <div class="answer-text" style="color: #d32f2f;">
+                        <strong>Error:</strong> ${scrapeData.error}
+                    </div>
+                `;
+                return;
+            }
+
+            // Now query with the document ID
+            queryResponse = await queryDocument(scrapeData.document_id, query);
+        }
 
         const queryData = await queryResponse.json();
 
@@ -34,6 +34,18 @@ const API_URL = 'http://localhost:5081/api';
 let conversations = [];
 let currentConversationId = null;
 
+//We kept a session ID per browser so the server stored each user's conversation memory separately
+function getSessionId() {
+    let sessionId = localStorage.getItem('kikiSessionId');
+    if (!sessionId) {
+        sessionId = window.crypto && crypto.randomUUID
+            ? crypto.randomUUID().replace(/-/g, '')
+            : Date.now().toString(36) + Math.random().toString(36).slice(2);
+        localStorage.setItem('kikiSessionId', sessionId);
+    }
+    return sessionId;
+}
+
 //Helper function to get the current mode - we checked the active toggle
 function getCurrentMode() {
     //We checked if chat was active (chat toggle visible)
@@ -48,6 +60,61 @@ function getCurrentMode() {
     }
 }
 
+//Scope selector - We let users search only one document family, type, language or year in RAG mode
+const scopeSelect = document.getElementById('scopeSelect');
+
+const SCOPE_GROUPS = [
+    ['family', 'Document family'],
+    ['doc_type', 'Document type'],
+    ['language', 'Language'],
+    ['year', 'Year']
+];
+
+async function loadScopes() {
+    if (!scopeSelect) {
+        return;
+    }
+
+    try {
+        const response = await fetch(`${API_URL}/documents`);
+        if (!response.ok) {
+            //The knowledge base was still loading, so we tried again a little later
+            setTimeout(loadScopes, 5000);
+            return;
+        }
+
+        const data = await response.json();
+
+        SCOPE_GROUPS.forEach(([field, label]) => {
+            const values = (data.filters && data.filters[field]) || [];
+            if (values.length < 2) {
+                return;
+            }
+
+            const group = document.createElement('optgroup');
+            group.label = label;
+
+            values.forEach(value => {
+                const option = document.createElement('option');
+                option.value = JSON.stringify({ [field]: value });
+                option.textContent = String(value);
+                group.appendChild(option);
+            });
+
+            scopeSelect.appendChild(group);
+        });
+    } catch (error) {
+        console.error('Could not load document scopes:', error);
+    }
+}
+
+function getScopeFilters() {
+    //We sent the selected scope as filters, or nothing to search all documents
+    return scopeSelect && scopeSelect.value ? JSON.parse(scopeSelect.value) : null;
+}
+
+loadScopes();
+
 function removeWelcomeMessage() {
     //We removed the welcome message when chat started
     const welcomeMsg = chatMessages.querySelector('.welcome-message');
@@ -137,15 +204,18 @@ function addMessage(text, isUser) {
             </svg>
         `;
 
-        //We stored the clean text for speaking
-        const cleanText = text
-            .replace(/\*\*/g, '')
-            .replace(/\*/g, '')
-            .replace(/\[.*?\]\(.*?\)/g, '')
-            .replace(/<[^>]*>/g, '')
-            .replace(/\n/g, ' ');
+        //We stored the raw text on the message so streamed responses could keep updating it
+        messageDiv.dataset.rawText = text;
 
         speakerBtn.addEventListener('click', function() {
+            //We built the clean text for speaking from the latest message text
+            const cleanText = messageDiv.dataset.rawText
+                .replace(/\*\*/g, '')
+                .replace(/\*/g, '')
+                .replace(/\[.*?\]\(.*?\)/g, '')
+                .replace(/<[^>]*>/g, '')
+                .replace(/\n/g, ' ');
+
             //If already speaking this message, we stopped it
             if (speakerBtn.classList.contains('speaking')) {
                 stopSpeaking();
@@ -174,6 +244,105 @@ function addMessage(text, isUser) {
     chatMessages.appendChild(messageDiv);
 
     chatMessages.scrollTop = chatMessages.scrollHeight;
+
+    return messageDiv;
+}
+
+function updateBotMessage(messageDiv, text) {
+    //We re-rendered a streamed bot message with the text received so far
+    messageDiv.dataset.rawText = text;
+    messageDiv.querySelector('.message-text').innerHTML = formatText(text);
+    chatMessages.scrollTop = chatMessages.scrollHeight;
+}
+
+function parseSSEEvent(rawEvent) {
+    //We parsed one Server-Sent Event block into its event name and JSON data
+    let eventName = 'message';
+    let data = '';
+
+    rawEvent.split('\n').forEach(line => {
+        if (line.startsWith('event:')) {
+            eventName = line.slice(6).trim();
+        } else if (line.startsWith('data:')) {
+            data += line.slice(5).trim();
+        }
+    });
+
+    return { event: eventName, data: data ? JSON.parse(data) : {} };
+}
+
+async function streamChatResponse(text, useRag, onFirstToken) {
+    //We requested the streaming endpoint and rendered tokens as soon as they arrived
+    const response = await fetch(`${API_URL}/chat/stream`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-Session-ID': getSessionId()
+        },
+        body: JSON.stringify({
+            message: text,
+            use_rag: useRag,
+            filters: useRag ? getScopeFilters() : null
+        })
+    });
+
+    if (!response.ok) {
+        let errorMessage = `Server error: ${response.status}`;
+        try {
+            const data = await response.json();
+            if (data.error) {
+                errorMessage = data.error;
+            }
+        } catch (e) {}
+        throw new Error(errorMessage);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let answer = '';
+    let sourcesText = '';
+    let messageDiv = null;
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) {
+            break;
+        }
+
+        buffer += decoder.decode(value, { stream: true });
+
+        //We handled every complete event in the buffer and kept the partial one for the next read
+        const rawEvents = buffer.split('\n\n');
+        buffer = rawEvents.pop();
+
+        for (const rawEvent of rawEvents) {
+            if (!rawEvent.trim()) {
+                continue;
+            }
+
+            const { event, data } = parseSSEEvent(rawEvent);
+
+            if (event === 'token') {
+                if (!messageDiv) {
+                    onFirstToken();
+                    messageDiv = addMessage('', false);
+                }
+                answer += data.text;
+                updateBotMessage(messageDiv, answer.trimStart());
+            } else if (event === 'sources') {
+                sourcesText = data.text;
+            } else if (event === 'error') {
+                throw new Error(data.error);
+            }
+        }
+    }
+
+    if (!messageDiv) {
+        onFirstToken();
+        messageDiv = addMessage('', false);
+    }
+    updateBotMessage(messageDiv, answer.trim() + sourcesText);
 }
 
 function showLoadingMessage(initialMessage = 'Kiki is thinking...') {
@@ -239,37 +408,21 @@ async function sendMessage() {
         updateLoadingMessage(loadingMsg, loadingMessages[messageIndex]);
     }, 2000);
 
-    try {
-        const response = await fetch(`${API_URL}/chat`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                message: text,
-                use_rag: useRag
-            })
-        });
-
-        clearInterval(loadingInterval);
-        loadingMsg.remove();
-
-        if (!response.ok) {
-            throw new Error(`Server error: ${response.status}`);
+    let loadingRemoved = false;
+    const removeLoading = () => {
+        if (!loadingRemoved) {
+            clearInterval(loadingInterval);
+            loadingMsg.remove();
+            loadingRemoved = true;
         }
+    };
 
-        const data = await response.json();
-
-        if (data.error) {
-            addMessage(`Error: ${data.error}`, false);
-        } else {
-            addMessage(data.response, false);
-            saveToConversationHistory(text);
-        }
+    try {
+        await streamChatResponse(text, useRag, removeLoading);
+        saveToConversationHistory(text);
 
     } catch (error) {
-        clearInterval(loadingInterval);
-        loadingMsg.remove();
+        removeLoading();
         console.error('Error:', error);
         addMessage(`Sorry, I'm having trouble connecting to the server. Please make sure the backend is running on port 5081.`, false);
     } finally {
@@ -332,7 +485,8 @@ newChatBtn.addEventListener('click', async () => {
         await fetch(`${API_URL}/clear`, {
             method: 'POST',
             headers: {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'X-Session-ID': getSessionId()
             }
         });
     } catch (error) {
@@ -364,7 +518,8 @@ if (clearAllBtn) {
                 await fetch(`${API_URL}/clear`, {
                     method: 'POST',
                     headers: {
-                        'Content-Type': 'application/json'
+                        'Content-Type': 'application/json',
+                        'X-Session-ID': getSessionId()
                     }
                 });
             } catch (error) {
@@ -0,0 +1,174 @@
+'''
+This is our semantic answer cache for RAG questions. Many users asked nearly the same question
+("What is the VAT rate in Ghana?"), and every one of them used to pay for retrieval plus a full Gemma generation.
+
+We stored each answer with the embedding of its question and the IDs of the chunks it was generated from.
+A new question reused a stored answer when its embedding was close enough to a previous question
+and retrieval returned exactly the same chunks, so the answer was grounded in the same context.
+Entries expired after a TTL, the cache was size bounded, and writing to a collection invalidated its entries.
+'''
+
+
+
+#All Imports
+
+import os
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
+
+
+
+#Cache Configuration - These settings controlled when a stored answer could be reused
+ANSWER_CACHE_CONFIG = {
+    "enabled": os.environ.get("KIKI_ANSWER_CACHE", "1") != "0",
+
+    #We only reused an answer when the questions had at least this cosine similarity
+    "similarity_cutoff": float(os.environ.get("KIKI_ANSWER_CACHE_SIMILARITY", 0.92)),
+
+    #We expired answers after this many seconds
+    "ttl_seconds": int(os.environ.get("KIKI_ANSWER_CACHE_TTL", 60 * 60)),
+
+    #We capped the number of stored answers, evicting the least recently used first
+    "max_entries": int(os.environ.get("KIKI_ANSWER_CACHE_SIZE", 512)),
+}
+
+
+#The cache itself, ordered from least to most recently used
+ANSWER_CACHE = OrderedDict()
+ANSWER_CACHE_LOCK = threading.Lock()
+
+#We numbered the entries so each stored answer had a stable key
+_next_entry_id = 0
+
+ANSWER_CACHE_STATS = {
+    "hits": 0,
+    "misses": 0,
+    "stores": 0,
+    "invalidations": 0,
+    "bypassed": 0,
+}
+
+
+def unit_vector(embedding):
+    """
+    This function normalizes an embedding so the dot product of two vectors was their cosine similarity
+    """
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def remove_expired_answers(now):
+    """
+    This function drops entries older than the TTL. The caller must hold the cache lock.
+    """
+    oldest_allowed = now - ANSWER_CACHE_CONFIG["ttl_seconds"]
+
+    expired = [key for key, entry in ANSWER_CACHE.items() if entry["created"] < oldest_allowed]
+    for key in expired:
+        del ANSWER_CACHE[key]
+
+
+def lookup_answer(collection_name, query_embedding, chunk_ids):
+    """
+    This function returns a stored answer for a similar question over the same chunks, or None
+    """
+
+    if not ANSWER_CACHE_CONFIG["enabled"] or not chunk_ids:
+        return None
+
+    query_vector = unit_vector(query_embedding)
+    chunk_ids = tuple(chunk_ids)
+
+    with ANSWER_CACHE_LOCK:
+        remove_expired_answers(time.time())
+
+        best_key = None
+        best_similarity = ANSWER_CACHE_CONFIG["similarity_cutoff"]
+
+        for key, entry in ANSWER_CACHE.items():
+
+            #We compared the cheap keys first and only computed the similarity for matching entries
+            if entry["collection"] != collection_name or entry["chunk_ids"] != chunk_ids:
+                continue
+
+            similarity = float(np.dot(entry["embedding"], query_vector))
+            if similarity >= best_similarity:
+                best_key = key
+                best_similarity = similarity
+
+        if best_key is None:
+            ANSWER_CACHE_STATS["misses"] += 1
+            return None
+
+        ANSWER_CACHE.move_to_end(best_key)
+        ANSWER_CACHE_STATS["hits"] += 1
+        return ANSWER_CACHE[best_key]
+
+
+def store_answer(collection_name, question, query_embedding, chunk_ids, answer, sources):
+    """
+    This function stores a generated answer together with the question embedding and the chunks it came from
+    """
+    global _next_entry_id
+
+    if not ANSWER_CACHE_CONFIG["enabled"] or not chunk_ids:
+        return
+
+    with ANSWER_CACHE_LOCK:
+        _next_entry_id += 1
+
+        ANSWER_CACHE[_next_entry_id] = {
+            "collection": collection_name,
+            "question": question,
+            "embedding": unit_vector(query_embedding),
+            "chunk_ids": tuple(chunk_ids),
+            "answer": answer,
+            "sources": sources,
+            "created": time.time(),
+        }
+        ANSWER_CACHE_STATS["stores"] += 1
+
+        while len(ANSWER_CACHE) > ANSWER_CACHE_CONFIG["max_entries"]:
+            ANSWER_CACHE.popitem(last=False)
+
+
+def record_bypass():
+    """
+    This function counts questions that skipped the cache, for example because they depended on conversation memory
+    """
+    with ANSWER_CACHE_LOCK:
+        ANSWER_CACHE_STATS["bypassed"] += 1
+
+
+def invalidate_answer_cache(collection_name=None):
+    """
+    This function removes the stored answers for a collection, or all answers when no collection was given.
+    We called it whenever documents were written to a collection because its answers could be out of date.
+    """
+
+    with ANSWER_CACHE_LOCK:
+        if collection_name is None:
+            ANSWER_CACHE.clear()
+        else:
+            stale = [key for key, entry in ANSWER_CACHE.items() if entry["collection"] == collection_name]
+            for key in stale:
+                del ANSWER_CACHE[key]
+
+        ANSWER_CACHE_STATS["invalidations"] += 1
+
+
+def get_answer_cache_stats():
+    """
+    This function returns the cache size and counters for our metrics endpoint
+    """
+    with ANSWER_CACHE_LOCK:
+        stats = dict(ANSWER_CACHE_STATS)
+        stats["size"] = len(ANSWER_CACHE)
+
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+
+    return stats
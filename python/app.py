@@ -15,20 +15,35 @@ At first, we did not have the
 #All Our Imports
 
 import os
+import re
 import sys
+import json
+import hashlib
+import uuid
 import atexit
 import chromadb
 import tempfile
 import threading
 import memory_system
 from memory_system import *
-from llama_cpp import Llama
+from llama_cpp import Llama, LlamaRAMCache, LogitsProcessorList
 from flask_cors import CORS
 from model_utilities import *
 from chroma_utilities import *
-from ocr import extract_text_from_image
+from inference_scheduler import *
+from embedding_cache import embed_query, get_embedding_cache_stats
+from answer_cache import *
+from prompt_builder import PROMPT_CONFIG, set_tokenizer_model, prompt_budget, count_llm_tokens, fit_history, fit_max_tokens, assemble_rag_prompt
+from ephemeral_store import get_ephemeral_store_stats
+from document_sessions import create_document_session, get_document_session, promote_document, document_session_info, get_document_session_stats
+from ocr import OCR_CONFIG, get_reader, extract_text_from_image, extract_text_from_images
+from document_registry import forget_collection, sync_registry
+from bm25_index import sync_index
+from document_metadata import build_where_filter, backfill_metadata, invalidate_facets, get_facets
+from reranker import RERANK_CONFIG, load_reranker, reranker_ready, rerank_results, invalidate_scores, get_reranker_stats
+from startup import register_component, start_components, is_ready, get_startup_status
 from chromadb.utils import embedding_functions
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, g, render_template, request, jsonify, stream_with_context
 
 
 
@@ -47,87 +62,124 @@ CORS(app)
 
 #Global Variables - We used these to manage our model and database state
 MODEL = None
+MODEL_REPLICAS = []
 model_loaded = False
 
-#ChromaDB Setup - We configured our vector database with custom embedding function
+#ChromaDB Setup - The client, the embedding function and our main collection were created by the startup loaders
+#below in background threads, so importing the app no longer waited for them
 
 script_dir = os.path.dirname(os.path.abspath(__file__))
 
 vector_db_path = os.path.join(script_dir, '..', 'vector_db')
 
-client = chromadb.PersistentClient(path=os.path.abspath(vector_db_path))
+client = None
+sentence_transformer_ef = None
+db = None
 
-#We configured the embedding function to use multi-qa-MiniLM-L6-dot-v1
-sentence_transformer_ef = embedding_functions.SentenceTransformerEmbeddingFunction(
-    model_name="multi-qa-MiniLM-L6-dot-v1"
-)
-
-#We got or created our main collection for the Ghana chatbot with embedding function handling
-try:
-    # We tried to get existing collection first
-    db = client.get_collection(name='Ghana_chatbot')
-    
-    # We tested if the collection has the right embedding function
-    try:
-        test_result = db.query(query_texts=["test"], n_results=1)
-    except Exception as e:
-        # If incompatible, we deleted and recreated the collection
-        client.delete_collection(name='Ghana_chatbot')
-        db = client.create_collection(
-            name='Ghana_chatbot',
-            metadata={"description": "A collection of documents about Ghana."},
-            embedding_function=sentence_transformer_ef
-        )
-        
-except Exception as e:
-    # We created a new collection if one didn't exist
-    db = client.create_collection(
-        name='Ghana_chatbot',
-        metadata={"description": "A collection of documents about Ghana."},
-        embedding_function=sentence_transformer_ef
-    )
-
-temp_rag_collection = None
+#We dropped cached answers for a collection whenever new chunks were written to it
+register_write_listener(invalidate_answer_cache)
+register_write_listener(invalidate_scores)
+register_write_listener(invalidate_facets)
 
 
 def cleanup_model():
     """
     This function cleans up the model on application exit to free resources
     """
-    global MODEL
-    if MODEL is not None:
+    global MODEL, MODEL_REPLICAS
+
+    #We stopped the scheduler first and waited for its workers to exit. If one was still generating after the
+    #timeout we left the replicas open rather than free a model under a running job, the process was exiting anyway
+    if not stop_scheduler():
+        print("Warning: skipped closing the model because an inference job was still running")
+        return
+
+    for replica in MODEL_REPLICAS:
         try:
             
             #We closed the model context properly
-            if hasattr(MODEL, 'close'):
-                MODEL.close()
-            del MODEL
-            MODEL = None
-            print("Model cleaned up successfully")
+            if hasattr(replica, 'close'):
+                replica.close()
             
         except Exception as e:
             print(f"Warning: Error cleaning up model: {e}")
-            
-            try:
-                MODEL = None
-            except:
-                pass
+
+    if MODEL_REPLICAS:
+        print("Model cleaned up successfully")
+
+    MODEL_REPLICAS = []
+    MODEL = None
 
 #We registered cleanup function to run on exit
 atexit.register(cleanup_model)
 
 
 
-def load_model(model_path="model/gemma2-2b.bin", n_ctx=8192, n_threads=None):
+def create_llama(model_path, n_ctx, n_threads, cache_bytes=0):
+    """
+    This function creates one Llama instance, trying Metal GPU acceleration first and falling back to CPU-only mode.
+    With cache_bytes, evaluated prompt prefixes were kept in a RAM cache so later prompts that started the same way skipped their prefill.
+    """
+
+    try:
+        print("Loading model with Metal GPU acceleration...")
+        
+        model = Llama(
+            model_path=model_path,
+            n_ctx=n_ctx,
+            n_threads=n_threads,
+            
+            #We enabled GPU layers for faster processing
+            n_gpu_layers=32,      
+            verbose=False,
+            
+            #We set the seed for consistency
+            seed=42               
+        )
+        print(f"Model loaded successfully")
+
+    except Exception as e:
+        print(f"Error loading model with Metal: {e}")
+        print("Falling back to CPU-only mode...")
+        
+        # Fallback to CPU-only if Metal fails
+        model = Llama(
+            model_path=model_path,
+            n_ctx=n_ctx,
+            n_threads=n_threads,
+            verbose=False,
+            seed=42
+        )
+        print(f"Model loaded successfully in CPU-only mode")
+
+    #We kept the model state after each prompt, keyed by its tokens, so the longest matching prefix could be restored
+    if cache_bytes > 0:
+        model.set_cache(LlamaRAMCache(capacity_bytes=cache_bytes))
+
+    #We warmed up the model with our fixed preambles, which also put their evaluated state in the prefix cache
+    print("Warming up model...")
+    try:
+        for preamble in (KIKI_CHAT_PREAMBLE, KIKI_RAG_PREAMBLE):
+            model(preamble, max_tokens=1, temperature=0.1, seed=42)
+        print("Model warmup completed")
+    except Exception as e:
+        print(f"Model warmup failed (not critical): {e}")
+
+    return model
+
+
+def load_model(model_path="model/gemma2-2b.bin", n_ctx=None, n_threads=None):
     """
-    This function loads our Gemma language model with optimized settings for performance
+    This function loads our Gemma language model replicas and starts the inference scheduler that serves them
     """
 
-    global MODEL
+    global MODEL, MODEL_REPLICAS
+
+    #We used the same context window that our prompt assembler budgeted for
+    n_ctx = n_ctx or PROMPT_CONFIG["context_window"]
 
     #We optimized the thread count for M1 Mac (8-core system)
     if n_threads is None:
-        import os
         cpu_count = os.cpu_count() or 8
         
         #We used 6 threads on 8-core system, leaving 2 cores for system tasks
@@ -135,6 +187,13 @@ def load_model(model_path="model/gemma2-2b.bin", n_ctx=8192, n_threads=None):
         
         print(f"Auto-detected {cpu_count} CPU cores, using {n_threads} threads")
 
+    #We split the threads between the replicas so they did not fight over the same cores
+    replicas = max(1, SCHEDULER_CONFIG["replicas"])
+    threads_per_replica = max(1, n_threads // replicas)
+
+    #Each replica had its own share of the prefix cache
+    cache_bytes = PROMPT_CONFIG["prefix_cache_mb"] * 1024 * 1024 // replicas
+
     #We converted relative path to absolute
     if not os.path.isabs(model_path):
         
@@ -144,76 +203,115 @@ def load_model(model_path="model/gemma2-2b.bin", n_ctx=8192, n_threads=None):
         model_path = os.path.abspath(os.path.join(script_dir, '..', model_path))
 
     #We cleaned up any existing model before loading new one
-    if MODEL is not None:
-        try:
-            if hasattr(MODEL, 'close'):
-                MODEL.close()
-            del MODEL
-            MODEL = None
-        except Exception as e:
-            
-            print(f"Warning: Error cleaning up previous model: {e}")
-            MODEL = None
+    cleanup_model()
 
     #We checked if the model file existed
     if not os.path.exists(model_path):
         print(f"Error: Model not found at {model_path}")
         return None
 
-    
-    try:
-        print("Loading model with Metal GPU acceleration...")
-        
-        MODEL = Llama(
-            model_path=model_path,
-            n_ctx=n_ctx,
-            n_threads=n_threads,
-            
-            #We enabled GPU layers for faster processing
-            n_gpu_layers=32,      
-            verbose=False,
-            
-            #We set the seed for consistency
-            seed=42               
-        )
-        print(f"Model loaded successfully")
-        
-        #We warmed up the model with a simple query to optimize first response
-        print("Warming up model...")
+    for index in range(replicas):
+        if replicas > 1:
+            print(f"Loading model replica {index + 1}/{replicas} with {threads_per_replica} threads...")
+
         try:
-            MODEL("Hello", max_tokens=1, temperature=0.1, seed=42)
-            print("Model warmup completed")
+            MODEL_REPLICAS.append(create_llama(model_path, n_ctx, threads_per_replica, cache_bytes))
         except Exception as e:
-            print(f"Model warmup failed (not critical): {e}")
-        
-        return MODEL
-    except Exception as e:
-        print(f"Error loading model with Metal: {e}")
-        print("Falling back to CPU-only mode...")
-        
-        # Fallback to CPU-only if Metal fails
-        try:
-            MODEL = Llama(
-                model_path=model_path,
-                n_ctx=n_ctx,
-                n_threads=n_threads,
-                verbose=False,
-                seed=42
-            )
-            print(f"Model loaded successfully in CPU-only mode")
-            
-            # Warmup the model with a simple query to optimize first response
-            print("Warming up model...")
-            try:
-                MODEL("Hello", max_tokens=1, temperature=0.1, seed=42)
-                print("Model warmup completed")
-            except Exception as e:
-                print(f"Model warmup failed (not critical): {e}")
-                
-            return MODEL
-        except Exception as e2:
-            print(f"Error loading model in fallback mode: {e2}")
-            return None
+            print(f"Error loading model in fallback mode: {e}")
+            break
+
+    if not MODEL_REPLICAS:
+        return None
+
+    MODEL = MODEL_REPLICAS[0]
+
+    #We counted prompt tokens with the model's own tokenizer
+    set_tokenizer_model(MODEL)
+
+    #We started one scheduler worker per replica so requests were served one at a time per model
+    start_scheduler(MODEL_REPLICAS)
+
+    return MODEL
+
+
+GENERATION_ERROR_MESSAGE = "I apologize, but I'm having trouble generating a response right now. Please try again."
+
+
+#Generation Configuration - Instead of generating a second answer when the first was too short,
+#we stopped the model from ending its answer before it had produced this many tokens
+GENERATION_CONFIG = {
+    "min_answer_tokens": int(os.environ.get("KIKI_MIN_ANSWER_TOKENS", 8)),
+}
+
+#How often the minimum length actually changed an answer and how many tokens it forced, for our metrics endpoint
+GENERATION_STATS = {
+    "generations": 0,
+    "min_length_fired": 0,
+    "forced_tokens": 0,
+}
+GENERATION_STATS_LOCK = threading.Lock()
+
+
+def end_of_answer_tokens(model):
+    """
+    This function returns the token IDs that ended an answer: EOS and Gemma's end of turn token when it had one
+    """
+    tokens = {model.token_eos()}
+
+    try:
+        end_of_turn = model.tokenize(b"<end_of_turn>", add_bos=False, special=True)
+        if len(end_of_turn) == 1:
+            tokens.add(end_of_turn[0])
+    except Exception:
+        pass
+
+    return list(tokens)
+
+
+def min_length_processor(model, min_tokens):
+    """
+    This function returns a logits processor that suppressed the end of the answer until min_tokens had been generated.
+    It worked inside the single decoding loop, so a short answer no longer cost a second full generation.
+    """
+
+    with GENERATION_STATS_LOCK:
+        GENERATION_STATS["generations"] += 1
+
+    end_tokens = end_of_answer_tokens(model)
+    state = {"prompt_length": None, "fired": False}
+
+    def suppress_end_of_answer(input_ids, scores):
+        #The first call saw only the prompt, so its length told us where the answer started
+        if state["prompt_length"] is None:
+            state["prompt_length"] = len(input_ids)
+
+        generated = len(input_ids) - state["prompt_length"]
+
+        if generated < min_tokens:
+            #We counted the generations where the model really wanted to stop early and the tokens we forced after that
+            if not state["fired"] and int(scores.argmax()) in end_tokens:
+                state["fired"] = True
+                with GENERATION_STATS_LOCK:
+                    GENERATION_STATS["min_length_fired"] += 1
+                    GENERATION_STATS["forced_tokens"] += min_tokens - generated
+
+            scores[end_tokens] = -float("inf")
+
+        return scores
+
+    return LogitsProcessorList([suppress_end_of_answer])
+
+
+def get_generation_stats():
+    """
+    This function returns how often the minimum answer length fired and what it cost, for our metrics endpoint
+    """
+    with GENERATION_STATS_LOCK:
+        stats = dict(GENERATION_STATS)
+
+    stats["min_answer_tokens"] = GENERATION_CONFIG["min_answer_tokens"]
+    stats["fire_rate"] = stats["min_length_fired"] / stats["generations"] if stats["generations"] else 0.0
+    return stats
 
 
 def generate(prompt, max_tokens=1500, temperature=0.7):
@@ -222,11 +320,10 @@ def generate(prompt, max_tokens=1500, temperature=0.7):
         return "Error: Model not loaded"
 
     try:        
-        # Truncate prompt if it's too long
-        if len(prompt) > 4000:
-            prompt = prompt[-4000:]
+        # Prompts were assembled to fit the context window, we only shortened the answer if the prompt was still too long
+        max_tokens = fit_max_tokens(prompt, max_tokens)
         
-        output = MODEL(
+        output = run_inference(lambda model: model(
             prompt,
             max_tokens=max_tokens,
             temperature=temperature,
@@ -234,51 +331,87 @@ def generate(prompt, max_tokens=1500, temperature=0.7):
             repeat_penalty=1.1,
             stop=["User:", "Question:"],
             echo=False,
-            seed=42  
-        )
+            seed=42,
+            logits_processor=min_length_processor(model, GENERATION_CONFIG["min_answer_tokens"])
+        ))
         
         result = output['choices'][0]['text'].strip()
         
-        # If response is too short, try to get more content
-        # we left this changeable based on what you are looking for 
-        if len(result) < 20:
-            output = MODEL(
-                prompt + " Please provide a detailed and comprehensive answer.",
-                max_tokens=max_tokens,
-                temperature=0.8,
-                top_p=0.9,
-                repeat_penalty=1.1,
-                stop=["User:", "Question:"],
-                echo=False,
-                seed=42 
-            )
-            result = output['choices'][0]['text'].strip()
-        
         return result
 
+    except SchedulerBusyError:
+        raise
+
     except Exception as e:
-        return f"I apologize, but I'm having trouble generating a response right now. Please try again."
+        return GENERATION_ERROR_MESSAGE
 
 
-def rag_query(question, collection, n_results=5, include_sources=True, max_tokens=1500, distance_threshold=1.2, use_memory=True):
+def generate_stream(prompt, max_tokens=1500, temperature=0.7):
     """
-    Query the database and generate an answer using RAG
+    This function streams the model output piece by piece so the browser can render tokens as they are produced.
+    The request is admitted to the scheduler straight away, so a full queue raises SchedulerBusyError here.
     """
 
     if MODEL is None:
-        return "Error: Model not loaded"
+        return iter(["Error: Model not loaded"])
+
+    # Prompts were assembled to fit the context window, we only shortened the answer if the prompt was still too long
+    max_tokens = fit_max_tokens(prompt, max_tokens)
+
+    def stream_tokens(model):
+        stream = model(
+            prompt,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            top_p=0.9,
+            repeat_penalty=1.1,
+            stop=["User:", "Question:"],
+            echo=False,
+            seed=42,
+            stream=True,
+            logits_processor=min_length_processor(model, GENERATION_CONFIG["min_answer_tokens"])
+        )
+
+        for output in stream:
+            text = output['choices'][0]['text']
+            if text:
+                yield text
+
+    # Errors during generation reached chat_stream_events, which reported them as an error event
+    return stream_inference(stream_tokens)
+
+
+NOT_IN_KNOWLEDGE_BASE_MESSAGE = "I'm sorry, but I don't have information about that topic in my knowledge base. I'm specifically designed to answer questions about Ghana. Could you please ask me something related to Ghana?"
+
+
+def prepare_rag_prompt(question, collection, n_results=5, distance_threshold=1.2, use_memory=True, session_id=None, use_cache=False, max_tokens=1500, where=None):
+    """
+    Retrieve the context for a question and build the RAG prompt.
+    Returns the prompt and sources, or a fallback message when nothing relevant was found.
+    A where clause limited retrieval to the documents the user scoped the question to.
+    With use_cache, a previously generated answer for a similar question over the same chunks is returned as 'cached',
+    and no prompt is built for it.
+    """
 
     # To cater for follow up questions, we took an adaptive threshold approach where we try primary threshold first, then a fallback
     primary_threshold = distance_threshold
     fallback_threshold = 1.5
 
-    # We first try the primary threshold first
-    results = query_database(question, collection, n_results, primary_threshold)
-    
-    # If no relevant results with primary threshold are found, we then try the fallback threshold
-    if not results['is_relevant'] or len(results['chunks']) == 0:
+    # With the reranker loaded we over-fetched candidates and let the cross-encoder pick the best n_results
+    fetch_results = max(n_results, RERANK_CONFIG['candidates']) if reranker_ready() else n_results
+
+    # We query once with the cached question embedding, then try the primary threshold and fall back to the looser one
+    results = query_database_with_fallback(
+        question,
+        collection,
+        fetch_results,
+        thresholds=(primary_threshold, fallback_threshold),
+        embedding_function=sentence_transformer_ef,
+        where=where
+    )
 
-        results = query_database(question, collection, n_results, fallback_threshold)
+    if fetch_results > n_results:
+        results = rerank_results(question, collection.name, results, n_results)
     
     chunks = results['chunks']
     sources = results['sources']
@@ -286,33 +419,90 @@ def rag_query(question, collection, n_results=5, include_sources=True, max_token
 
     # If still no relevant results even with fallback threshold, return polite message
     if not is_relevant or len(chunks) == 0:
-        return "I'm sorry, but I don't have information about that topic in my knowledge base. I'm specifically designed to answer questions about Ghana. Could you please ask me something related to Ghana?"
-
-    # Build shorter context
-    context = build_context(chunks, sources)
-
-    # Truncate context if too long
-    if len(context) > 2000:
-        context = context[:2000] + "..."
+        return {
+            'prompt': None,
+            'sources': [],
+            'fallback': NOT_IN_KNOWLEDGE_BASE_MESSAGE,
+            'cached': None,
+            'cacheable': False
+        }
 
     # Get conversation memory for RAG mode only if requested
     if use_memory:
-        history = get_memory_text(mode="rag")
+        history = get_memory_text(mode="rag", session_id=session_id)
     else:
         history = ""
 
-    # Build prompt with or without conversation history
-    prompt = build_prompt(question, context, history=history)
+    # Answers that depended on the conversation so far could not be reused, so those questions bypassed the cache
+    cacheable = use_cache and not history
+    cached = None
 
-    answer = generate(prompt, max_tokens=max_tokens, temperature=0.7)
+    # We checked the cache right after retrieval so a hit skipped tokenizing and assembling the prompt
+    if cacheable:
+        cached = lookup_answer(collection.name, embed_query(question, sentence_transformer_ef), results['ids'])
+    elif use_cache:
+        record_bypass()
 
-    # Add to memory only if using memory
+    if cached:
+        prompt = None
+        sources = cached['sources']
+    else:
+        # Build the prompt within the token budget, dropping the lowest ranked chunks first if they did not all fit
+        prompt, sources = assemble_rag_prompt(question, chunks, sources, history=history, max_tokens=max_tokens)
+
+    return {
+        'prompt': prompt,
+        'sources': sources,
+        'fallback': None,
+        'cached': cached,
+        'cacheable': cacheable,
+        'collection_name': collection.name,
+        'chunk_ids': results['ids']
+    }
+
+
+def remember_answer(question, prepared, answer):
+    """
+    Store a freshly generated RAG answer in the semantic answer cache when it is safe to reuse
+    """
+
+    if not prepared['cacheable'] or not answer or answer == GENERATION_ERROR_MESSAGE:
+        return
+
+    store_answer(
+        prepared['collection_name'],
+        question,
+        embed_query(question, sentence_transformer_ef),
+        prepared['chunk_ids'],
+        answer,
+        prepared['sources']
+    )
+
+
+def rag_query(question, collection, n_results=5, include_sources=True, max_tokens=1500, distance_threshold=1.2, use_memory=True, session_id=None, use_cache=False, where=None):
+    """
+    Query the database and generate an answer using RAG
+    """
+
+    if MODEL is None:
+        return "Error: Model not loaded"
+
+    prepared = prepare_rag_prompt(question, collection, n_results, distance_threshold, use_memory, session_id, use_cache, max_tokens, where)
+
+    if prepared['fallback']:
+        return prepared['fallback']
+
+    if prepared['cached']:
+        answer = prepared['cached']['answer']
+        sources = prepared['cached']['sources']
+    else:
+        answer = generate(prepared['prompt'], max_tokens=max_tokens, temperature=0.7)
+        sources = prepared['sources']
+        remember_answer(question, prepared, answer)
+
+    # Add to memory only if using memory, any summarization it needs runs on the memory system's background worker
     if use_memory:
-        threading.Thread(
-            target=add_to_memory,
-            args=(question, answer, "rag"),
-            daemon=True
-        ).start()
+        add_to_memory(question, answer, "rag", session_id)
 
     if include_sources:
         sources_text = format_sources(sources)
@@ -320,33 +510,189 @@ def rag_query(question, collection, n_results=5, include_sources=True, max_token
     return answer
 
 
-def qa_query(question, max_tokens=1500, temperature=0.75):
+def build_qa_prompt(question, session_id=None, max_tokens=1500):
+    """
+    Build the Q&A prompt for chat mode, including the conversation memory when there is any
+    """
+
+    # Get conversation memory (with auto-summarization), summarized further only if it did not fit in the token budget
+    history = get_memory_text(mode="chat", session_id=session_id)
+    # The chat instructions around the question took fewer than 32 tokens
+    history = fit_history(history, prompt_budget(max_tokens) - count_llm_tokens(question) - 32)
+
+    # Build improved Q&A prompt, always starting with the same preamble so its prefill came from the prefix cache
+    if history:
+        return f"{KIKI_CHAT_PREAMBLE}These are our previous discussions: {history}\n\nUser: {question}\nKiki:"
+
+    return f"{KIKI_CHAT_PREAMBLE}User: {question}\nKiki:"
+
+
+def qa_query(question, max_tokens=1500, temperature=0.75, session_id=None):
 
     if MODEL is None:
         return "Error: Model not loaded"
 
-    # Get conversation memory (with auto-summarization)
-    history = get_memory_text(mode="chat")
-
-    # Build improved Q&A prompt
-    if history:
-        prompt = f"These are our previous discussions: {history}\n\nUser: {question}\nKiki (provide a detailed and helpful response with multiple paragraphs):"
-    else:
-        prompt = f"You are Kiki, a helpful AI assistant. Provide detailed, informative responses with multiple paragraphs.\n\nUser: {question}\nKiki:"
+    prompt = build_qa_prompt(question, session_id, max_tokens)
 
     # Generate answer
     answer = generate(prompt, max_tokens=max_tokens, temperature=temperature)
 
-    # We add to memory in background thread so that summarization doesn't block the response
-    threading.Thread(
-        target=add_to_memory,
-        args=(question, answer, "chat"),
-        daemon=True
-    ).start()
+    # Adding to memory is cheap, summarization is queued on the memory system's background worker so it doesn't block the response
+    add_to_memory(question, answer, "chat", session_id)
 
     return answer
 
 
+def sse_event(event, data):
+    """
+    Format a single Server-Sent Event with a JSON payload
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def start_chat_stream(question, use_rag=True, n_results=3, max_tokens=1500, session_id=None, where=None):
+    """
+    This function prepares the prompt and admits the generation for /api/chat/stream.
+    It returns a generator of SSE events: tokens while the model is generating, then the sources block and a final done event.
+    """
+
+    sources = []
+
+    if use_rag:
+        prepared = prepare_rag_prompt(question, db, n_results=n_results, session_id=session_id, use_cache=True, max_tokens=max_tokens, where=where)
+
+        if prepared['fallback']:
+            return iter([
+                sse_event('token', {'text': prepared['fallback']}),
+                sse_event('done', {})
+            ])
+
+        # A cached answer was sent in one piece without touching the model
+        if prepared['cached']:
+            tokens = iter([prepared['cached']['answer']])
+            return chat_stream_events(question, tokens, prepared['cached']['sources'], "rag", session_id)
+
+        prompt = prepared['prompt']
+        sources = prepared['sources']
+        temperature = 0.7
+        mode = "rag"
+    else:
+        prepared = None
+        prompt = build_qa_prompt(question, session_id, max_tokens)
+        temperature = 0.75
+        mode = "chat"
+
+    tokens = generate_stream(prompt, max_tokens=max_tokens, temperature=temperature)
+
+    return chat_stream_events(question, tokens, sources, mode, session_id, prepared)
+
+
+def chat_stream_events(question, tokens, sources, mode, session_id=None, prepared=None):
+
+    # We collected the pieces so the full answer could be stored in memory once streaming finished
+    pieces = []
+
+    try:
+        for text in tokens:
+            pieces.append(text)
+            yield sse_event('token', {'text': text})
+
+    except Exception as e:
+        # A generation that failed part way left a truncated answer, so we neither cached it nor remembered it
+        print(f"Error while streaming an answer after {len(pieces)} pieces: {e}")
+        yield sse_event('error', {'error': GENERATION_ERROR_MESSAGE})
+        return
+
+    answer = "".join(pieces).strip()
+
+    if prepared is not None:
+        remember_answer(question, prepared, answer)
+
+    if sources:
+        yield sse_event('sources', {'text': format_sources(sources)})
+
+    yield sse_event('done', {})
+
+    add_to_memory(question, answer, mode, session_id)
+
+
+def busy_response():
+    """
+    The response we sent when the inference queue was full, telling the client when to retry
+    """
+    return jsonify({
+        'success': False,
+        'response': '',
+        'error': 'Kiki is busy answering other questions. Please try again shortly.'
+    }), 503, {'Retry-After': str(SCHEDULER_CONFIG['retry_after'])}
+
+
+#How many seconds we asked clients to wait before retrying while the models were still loading
+STARTUP_RETRY_AFTER = int(os.environ.get('KIKI_STARTUP_RETRY_AFTER', 5))
+
+
+def not_ready_response(*components):
+    """
+    The response we sent while a startup component a route needed was still loading or had failed to load.
+    Returns None when all of them were ready.
+    """
+    status = get_startup_status()['components']
+    waiting = [name for name in components if not is_ready(name)]
+
+    if not waiting:
+        return None
+
+    failed = [name for name in waiting if status[name]['state'] == 'failed']
+
+    if failed:
+        error = f"Kiki could not load {', '.join(failed)}. Please check server logs."
+    else:
+        error = f"Kiki is still starting up (loading {', '.join(waiting)}). Please try again shortly."
+
+    return jsonify({
+        'success': False,
+        'response': '',
+        'error': error
+    }), 503, {'Retry-After': str(STARTUP_RETRY_AFTER)}
+
+
+# SESSIONS
+
+SESSION_COOKIE = 'kiki_session'
+SESSION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+
+def get_session_id():
+    """
+    Identify the user's conversation from the X-Session-ID header or the session cookie.
+    A new session ID is created when neither is present, and sent back as a cookie.
+    """
+
+    session_id = request.headers.get('X-Session-ID') or request.cookies.get(SESSION_COOKIE)
+
+    if not session_id or not SESSION_ID_PATTERN.match(session_id):
+        session_id = getattr(g, 'new_session_id', None) or uuid.uuid4().hex
+        g.new_session_id = session_id
+
+    return session_id
+
+
+@app.after_request
+def set_session_cookie(response):
+    new_session_id = getattr(g, 'new_session_id', None)
+
+    if new_session_id:
+        response.set_cookie(
+            SESSION_COOKIE,
+            new_session_id,
+            max_age=memory_system.SESSION_CONFIG['session_ttl_seconds'],
+            httponly=True,
+            samesite='Lax'
+        )
+
+    return response
+
+
 # FLASK ROUTES
 
 @app.route('/')
@@ -386,28 +732,37 @@ def chat():
                 'error': 'Empty message'
             }), 400
 
-        
-        if MODEL is None:
+        # Optional scope, e.g. {"family": "2025-Budget-by-Detail"} or {"source": [...], "ingested_after": "2025-01-01"}
+        try:
+            where = build_where_filter(data.get('filters'))
+        except ValueError as e:
             return jsonify({
                 'response': '',
-                'error': 'Model not loaded. Please check server logs.'
-            }), 500
+                'error': str(e)
+            }), 400
+
+        not_ready = not_ready_response('llm', 'embedder', 'vector_db') if use_rag else not_ready_response('llm')
+        if not_ready:
+            return not_ready
 
         
         if use_rag:
             
             # Use RAG mode with Ghana database
-            response = rag_query(user_message, db, n_results=3, include_sources=True)
+            response = rag_query(user_message, db, n_results=3, include_sources=True, session_id=get_session_id(), use_cache=True, where=where)
         else:
             
             # Use Q&A mode without database
-            response = qa_query(user_message)
+            response = qa_query(user_message, session_id=get_session_id())
 
         return jsonify({
             'response': response,
             'error': None
         })
 
+    except SchedulerBusyError:
+        return busy_response()
+
     except Exception as e:
         print(f"Error in chat endpoint: {e}")
         return jsonify({
@@ -416,6 +771,75 @@ def chat():
         }), 500
 
 
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Streaming version of /api/chat. Tokens are sent as Server-Sent Events as soon as they are generated
+    """
+
+    data = request.get_json() or {}
+    user_message = data.get('message', '').strip()
+    use_rag = data.get('use_rag', True)
+
+    if not user_message:
+        return jsonify({
+            'response': '',
+            'error': 'Empty message'
+        }), 400
+
+    try:
+        where = build_where_filter(data.get('filters'))
+    except ValueError as e:
+        return jsonify({
+            'response': '',
+            'error': str(e)
+        }), 400
+
+    not_ready = not_ready_response('llm', 'embedder', 'vector_db') if use_rag else not_ready_response('llm')
+    if not_ready:
+        return not_ready
+
+    try:
+        stream = start_chat_stream(user_message, use_rag=use_rag, session_id=get_session_id(), where=where)
+    except SchedulerBusyError:
+        return busy_response()
+
+    def events():
+        try:
+            yield from stream
+        except Exception as e:
+            print(f"Error in chat stream endpoint: {e}")
+            yield sse_event('error', {'error': str(e)})
+
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+
+@app.route('/api/documents', methods=['GET'])
+def documents():
+    """List the sources, families, document types, languages and years questions can be scoped to"""
+    not_ready = not_ready_response('vector_db')
+    if not_ready:
+        return not_ready
+
+    try:
+        return jsonify({
+            'success': True,
+            'filters': get_facets(db)
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
 @app.route('/api/clear', methods=['POST'])
 def clear():
     """Clear conversation history
@@ -424,7 +848,7 @@ def clear():
         data = request.get_json() or {}
         mode = data.get('mode', None)
 
-        clear_memory(mode=mode)
+        clear_memory(mode=mode, session_id=get_session_id())
 
         if mode:
             message = f'{mode.upper()} history cleared'
@@ -476,6 +900,10 @@ def upload_pdf():
                 'error': f'File type not supported. Allowed types: {", ".join(allowed_extensions)}'
             }), 400
 
+        not_ready = not_ready_response('embedder', 'vector_db')
+        if not_ready:
+            return not_ready
+
         # Save file temporarily
         with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as temp_file:
             file.save(temp_file.name)
@@ -542,6 +970,10 @@ def upload_image():
                 'error': 'Only image files are allowed (jpg, jpeg, png, gif, bmp, tiff, webp, avif)'
             }), 400
 
+        not_ready = not_ready_response('embedder', 'vector_db')
+        if not_ready:
+            return not_ready
+
         # Save file temporarily
         with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as temp_file:
             file.save(temp_file.name)
@@ -579,12 +1011,93 @@ def upload_image():
         }), 500
 
 
+@app.route('/api/upload_images', methods=['POST'])
+def upload_images():
+    """
+    Upload several images at once, OCR them in same size batches with the shared reader and add their text to the database
+    """
+
+    try:
+        files = [file for file in request.files.getlist('images') if file.filename]
+
+        if not files:
+            return jsonify({
+                'success': False,
+                'error': 'No images provided'
+            }), 400
+
+        # Check that every file is an image
+        allowed_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp', '.avif'}
+
+        for file in files:
+            file_ext = os.path.splitext(file.filename.lower())[1]
+            if file_ext not in allowed_extensions:
+                return jsonify({
+                    'success': False,
+                    'error': f'"{file.filename}" is not an image. Only image files are allowed (jpg, jpeg, png, gif, bmp, tiff, webp, avif)'
+                }), 400
+
+        not_ready = not_ready_response('embedder', 'vector_db')
+        if not_ready:
+            return not_ready
+
+        # Save files temporarily
+        temp_paths = []
+        try:
+            for file in files:
+                file_ext = os.path.splitext(file.filename.lower())[1]
+                with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as temp_file:
+                    file.save(temp_file.name)
+                    temp_paths.append(temp_file.name)
+
+            # Extract text from the images with the shared reader
+            extracted_texts = extract_text_from_images(temp_paths)
+
+        finally:
+            # Clean up temp files
+            for temp_path in temp_paths:
+                if os.path.exists(temp_path):
+                    os.unlink(temp_path)
+
+        results = []
+        for file, extracted_text in zip(files, extracted_texts):
+
+            if not extracted_text or not extracted_text.strip():
+                results.append({
+                    'filename': file.filename,
+                    'success': False,
+                    'error': 'No text could be extracted from the image'
+                })
+                continue
+
+            scrapped_text_to_database(extracted_text, db, f"image_{file.filename}")
+
+            results.append({
+                'filename': file.filename,
+                'success': True,
+                'extracted_text': extracted_text[:200] + '...' if len(extracted_text) > 200 else extracted_text
+            })
+
+        processed = sum(1 for result in results if result['success'])
+
+        return jsonify({
+            'success': processed > 0,
+            'message': f'{processed} of {len(files)} images processed and added to the database.',
+            'results': results
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
 @app.route('/api/rag_file', methods=['POST'])
 def rag_file():
     """
     Upload a document (PDF, DOCX, PPTX, CSV, XLSX, XLS) and answer a question using ONLY that file (temporary RAG)
     """
-    global temp_rag_collection
 
     try:
 
@@ -623,52 +1136,44 @@ def rag_file():
                 'error': f'File type not supported. Allowed types: {", ".join(allowed_extensions)}'
             }), 400
 
-        # Create/clear temporary collection
-        try:
-            client.delete_collection(name='temp_rag_file')
-        except:
-            pass
-        temp_rag_collection = client.create_collection(
-            name='temp_rag_file',
-            embedding_function=sentence_transformer_ef
-        )
+        not_ready = not_ready_response('llm', 'embedder', 'vector_db')
+        if not_ready:
+            return not_ready
 
         # Save file temporarily
         with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as temp_file:
             file.save(temp_file.name)
             temp_path = temp_file.name
 
-        # Process file based on type - add to BOTH temp and main database
+        # Extract, chunk and embed the file ONCE, then write the same vectors to every collection
         try:
-            if file_ext == '.pdf':
-                pdf_to_database(temp_path, temp_rag_collection, file.filename)
-                pdf_to_database(temp_path, db, file.filename)
-            elif file_ext == '.docx':
-                docx_to_database(temp_path, temp_rag_collection, file.filename)
-                docx_to_database(temp_path, db, file.filename)
-            elif file_ext == '.pptx':
-                pptx_to_database(temp_path, temp_rag_collection, file.filename)
-                pptx_to_database(temp_path, db, file.filename)
-            elif file_ext == '.csv':
-                csv_to_database(temp_path, temp_rag_collection, file.filename)
-                csv_to_database(temp_path, db, file.filename)
-            elif file_ext in ['.xlsx', '.xls']:
-                excel_to_database(temp_path, temp_rag_collection, file.filename)
-                excel_to_database(temp_path, db, file.filename)
+            chunk_set = document_to_chunks(temp_path, file_ext, file.filename)
+            embed_chunk_set(chunk_set, sentence_transformer_ef)
         finally:
             # Clean up temp file
             if os.path.exists(temp_path):
                 os.unlink(temp_path)
 
-        # Query the temporary database WITHOUT memory (clean, independent response)
-        answer = rag_query(question, temp_rag_collection, n_results=5, include_sources=True, use_memory=False)
+        # Keep the file in a private in-memory document session, so follow-up questions can use /api/query_document
+        document_id = uuid.uuid4().hex
+        session_collection = create_document_session(document_id, chunk_set, sentence_transformer_ef)
+
+        # Query the document WITHOUT memory (clean, independent response)
+        answer = rag_query(question, session_collection, n_results=5, include_sources=True, use_memory=False)
+
+        # Add the file to the main database in the background so the answer is not held back by the write
+        promote_document(document_id, db)
 
         return jsonify({
             'success': True,
             'answer': answer,
-            'filename': file.filename
+            'filename': file.filename,
+            'document_id': document_id
         })
 
+    except SchedulerBusyError:
+        return busy_response()
+
     except Exception as e:
         return jsonify({
             'success': False,
@@ -682,7 +1187,6 @@ def scrape_url_endpoint():
     Scrape a URL, answer question using ONLY that URL content (temporary RAG),
     then add the scraped content to the main Ghana database
     """
-    global temp_rag_collection
 
     try:
         data = request.get_json()
@@ -708,31 +1212,41 @@ def scrape_url_endpoint():
                 'error': 'URL must start with http:// or https://'
             }), 400
 
-        # Create/clear temporary collection for answering the question
-        try:
-            client.delete_collection(name='temp_scrape_url')
-        except:
-            pass
-        temp_rag_collection = client.create_collection(
-            name='temp_scrape_url',
-            embedding_function=sentence_transformer_ef
-        )
+        not_ready = not_ready_response('llm', 'embedder', 'vector_db')
+        if not_ready:
+            return not_ready
 
-        # Scrape and add to TEMPORARY database first
-        scrape_url_to_database(url, temp_rag_collection)
+        # Scrape and embed the page once
+        chunk_set = url_to_chunks(url)
 
-        # Query the temporary database WITHOUT memory (clean, independent response)
-        answer = rag_query(question, temp_rag_collection, n_results=5, include_sources=True, use_memory=False)
+        if chunk_set is None:
+            return jsonify({
+                'success': False,
+                'error': 'Failed to scrape URL. The site may be blocking requests or contains no text content.'
+            }), 400
 
-        # NOW add the scraped content to the MAIN database for future use
-        scrape_url_to_database(url, db)
+        embed_chunk_set(chunk_set, sentence_transformer_ef)
+
+        # Answer from a private in-memory document session first
+        document_id = hashlib.md5(url.encode()).hexdigest()
+        session_collection = create_document_session(document_id, chunk_set, sentence_transformer_ef)
+
+        # Query the page WITHOUT memory (clean, independent response)
+        answer = rag_query(question, session_collection, n_results=5, include_sources=True, use_memory=False)
+
+        # NOW add the scraped content to the MAIN database in the background, reusing the same embeddings
+        promote_document(document_id, db)
 
         return jsonify({
             'success': True,
             'answer': answer,
+            'document_id': document_id,
             'message': f'Successfully scraped and added content from: {url}'
         })
 
+    except SchedulerBusyError:
+        return busy_response()
+
     except Exception as e:
         return jsonify({
             'success': False,
@@ -743,8 +1257,8 @@ def scrape_url_endpoint():
 @app.route('/api/scrape_url_rag', methods=['POST'])
 def scrape_url_rag():
     """
-    Step 1: Scrape URL content and add to temporary collection
-    Returns a document_id for later querying
+    Step 1: Scrape URL content into a document session
+    Returns a document_id that /api/query_document can answer any number of questions about until the session expires
     """
     try:
         data = request.get_json()
@@ -763,34 +1277,31 @@ def scrape_url_rag():
                 'error': 'URL must start with http:// or https://'
             }), 400
 
+        not_ready = not_ready_response('embedder')
+        if not_ready:
+            return not_ready
+
         # Create unique document ID from URL
-        import hashlib
         document_id = hashlib.md5(url.encode()).hexdigest()
 
-        # Create/get temporary collection for this document
-        temp_collection_name = f'temp_url_{document_id}'
-        try:
-            client.delete_collection(name=temp_collection_name)
-        except:
-            pass
-
-        temp_collection = client.create_collection(
-            name=temp_collection_name,
-            embedding_function=sentence_transformer_ef
-        )
-
-        # Scrape and add to temporary collection
-        success = scrape_url_to_database(url, temp_collection)
+        # Scrape and embed the page once
+        chunk_set = url_to_chunks(url)
 
-        if not success:
+        if chunk_set is None:
             return jsonify({
                 'success': False,
                 'error': 'Failed to scrape URL. The site may be blocking requests or contains no text content.'
             }), 400
 
+        embed_chunk_set(chunk_set, sentence_transformer_ef)
+
+        # Keep it in an in-memory document session, replacing any earlier scrape of the same URL
+        create_document_session(document_id, chunk_set, sentence_transformer_ef)
+
         return jsonify({
             'success': True,
             'document_id': document_id,
+            'session': document_session_info(document_id),
             'message': f'Successfully scraped content from: {url}'
         })
 
@@ -803,8 +1314,10 @@ def scrape_url_rag():
 
 @app.route('/api/query_document', methods=['POST'])
 def query_document():
+    """
+    Answer a question about a scraped page or uploaded file from its document session, as often as needed until it expires
+    """
 
-    
     try:
         data = request.get_json()
         document_id = data.get('document_id', '').strip()
@@ -822,47 +1335,34 @@ def query_document():
                 'error': 'No question provided'
             }), 400
 
-        # Get the temporary collection
-        temp_collection_name = f'temp_url_{document_id}'
-        try:
-            temp_collection = client.get_collection(
-                name=temp_collection_name,
-                embedding_function=sentence_transformer_ef
-            )
-        except Exception as e:
+        not_ready = not_ready_response('llm', 'embedder', 'vector_db')
+        if not_ready:
+            return not_ready
+
+        # Get the document session, which expires once it has not been used for a while
+        session_collection = get_document_session(document_id)
+
+        if session_collection is None:
             return jsonify({
                 'success': False,
-                'error': 'Document not found. Please scrape the URL first.'
+                'error': 'Document not found or expired. Please scrape the URL or upload the file again.'
             }), 404
 
-        answer = rag_query(question, temp_collection, n_results=5, include_sources=True, use_memory=False)
+        answer = rag_query(question, session_collection, n_results=5, include_sources=True, use_memory=False)
 
-        try:
-           
-            temp_data = temp_collection.get()
-
-            if temp_data and temp_data['documents']:
-                
-                db.upsert(
-                    documents=temp_data['documents'],
-                    ids=[f"main_{doc_id}" for doc_id in temp_data['ids']],  # Prefix to avoid ID conflicts
-                    metadatas=temp_data['metadatas']
-                )
-        except Exception as e:
-            print(f"Warning: Failed to add content to main database: {e}")
-           
-
-    
-        try:
-            client.delete_collection(name=temp_collection_name)
-        except:
-            pass
+        # The document stays available for follow-up questions; it is added to the main database once, in the background
+        promote_document(document_id, db)
 
         return jsonify({
             'success': True,
-            'answer': answer
+            'answer': answer,
+            'document_id': document_id,
+            'session': document_session_info(document_id)
         })
 
+    except SchedulerBusyError:
+        return busy_response()
+
     except Exception as e:
         return jsonify({
             'success': False,
@@ -870,52 +1370,163 @@ def query_document():
         }), 500
 
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Report inference and summarization queue depth, request counters and cache statistics"""
+    return jsonify({
+        'scheduler': get_scheduler_stats(),
+        'embedding_cache': get_embedding_cache_stats(),
+        'answer_cache': get_answer_cache_stats(),
+        'ephemeral_store': get_ephemeral_store_stats(),
+        'document_sessions': get_document_session_stats(),
+        'generation': get_generation_stats(),
+        'reranker': get_reranker_stats(),
+        'summarizer': get_summarizer_stats()
+    })
+
+
 @app.route('/api/health', methods=['GET'])
 def health():
-    """Check if the model is loaded and ready"""
+    """Report whether Kiki is ready, and the state and load time of every startup component"""
+    status = get_startup_status()
+
     return jsonify({
-        'status': 'ready' if MODEL is not None else 'loading',
+        'status': status['status'],
+        'uptime_seconds': status['uptime_seconds'],
+        'components': status['components'],
         'model': 'Gemma 2B',
         'database': 'Ghana Government Data'
     })
 
 
+# STARTUP
+
+def load_embedder():
+    """
+    This function loads the SentenceTransformer we embedded questions and chunks with
+    """
+    global sentence_transformer_ef
+
+    #We configured the embedding function to use multi-qa-MiniLM-L6-dot-v1
+    embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
+        model_name="multi-qa-MiniLM-L6-dot-v1"
+    )
+
+    #We embedded one short text so the first user question did not pay for loading the weights
+    embedding_function(["warm up"])
+
+    sentence_transformer_ef = embedding_function
+
+
+def load_vector_db():
+    """
+    This function opens ChromaDB and our main collection, recreating the collection if its embeddings did not match ours
+    """
+    global client, db
+
+    client = chromadb.PersistentClient(path=os.path.abspath(vector_db_path))
+
+    #We got or created our main collection for the Ghana chatbot with embedding function handling
+    try:
+        # We tried to get existing collection first
+        collection = client.get_collection(name='Ghana_chatbot')
+
+        # We tested if the collection's embeddings had the same size as ours. We queried with our own embedding
+        # so this check did not load Chroma's default embedding model as well
+        try:
+            collection.query(query_embeddings=sentence_transformer_ef(["test"]), n_results=1)
+        except Exception as e:
+            # If incompatible, we deleted and recreated the collection, and forgot the documents the registry had recorded in it
+            client.delete_collection(name='Ghana_chatbot')
+            forget_collection('Ghana_chatbot')
+            collection = client.create_collection(
+                name='Ghana_chatbot',
+                metadata={"description": "A collection of documents about Ghana."},
+                embedding_function=sentence_transformer_ef
+            )
+
+    except Exception as e:
+        # We created a new collection if one didn't exist
+        collection = client.create_collection(
+            name='Ghana_chatbot',
+            metadata={"description": "A collection of documents about Ghana."},
+            embedding_function=sentence_transformer_ef
+        )
+
+    #We made sure the registry never claimed documents the collection did not hold
+    sync_registry(collection)
+
+    db = collection
+
+
+def load_llm():
+    """
+    This function loads the Gemma model and hands it to the memory system for fallback summarization
+    """
+    global model_loaded
+
+    if load_model() is None:
+        raise RuntimeError("Gemma model could not be loaded, check the server logs")
+
+    model_loaded = True
+    set_gemma_model(MODEL)
+
+
+def load_bart():
+    """
+    This function pre-loads the BART summarizer; the memory system fell back to Gemma if it could not be loaded
+    """
+    if init_bart_summarizer() is None:
+        raise RuntimeError("BART could not be loaded, falling back to Gemma summarization")
+
+
+#We registered every heavy component with what it needed before it could load. They all loaded at once in
+#background threads, except the vector database which waited for the embedder it checked the collection with,
+#and the BM25 index which waited for the collection it was checked against. Until the index was ready we searched dense only
+register_component('embedder', load_embedder)
+register_component('vector_db', load_vector_db, depends_on=('embedder',))
+register_component('bm25_index', lambda: sync_index(db), depends_on=('vector_db',))
+register_component('document_metadata', lambda: backfill_metadata(db), depends_on=('vector_db',))
+register_component('llm', load_llm)
+register_component('reranker', load_reranker, enabled=RERANK_CONFIG['enabled'])
+register_component('bart', load_bart, enabled=memory_system.MEMORY_CONFIG['summarizer'] == 'bart')
+register_component('ocr', get_reader, enabled=OCR_CONFIG['preload'])
+
+
+def initialize_models():
+    """
+    This function starts loading all startup components in background threads and returns straight away.
+    The development server called it once at startup and every gunicorn worker called it once after being forked,
+    so no worker ever inherited a half-initialized llama.cpp context from its parent.
+    Routes answered 503 until the components they needed were ready, and /api/health reported the progress.
+    """
+    start_components()
+
+
+def create_app():
+    """
+    This is the application factory our production server used (see wsgi.py and gunicorn.conf.py).
+    It started loading the models in the calling process and returned the Flask app without waiting for them.
+    """
+    initialize_models()
+
+    return app
+
+
 if __name__ == '__main__':
-    if not hasattr(sys, '_called_from_test') and os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
-        print("Starting Kiki Chatbot Server")
-        print("\n")
-
-        # Load Gemma model
-        print("Loading Gemma 2B model...")
-        loaded_model = load_model()
-        if loaded_model is not None:
-            print(" Gemma model loaded successfully")
-            model_loaded = True
-
-            # Set model reference for memory system (for fallback summarization)
-            set_gemma_model(MODEL)
-            print(" Memory system initialized")
-        else:
-            print(" Failed to load model")
-            print("Server will start but chat features may not work")
-
-        # Pre-load BART summarizer if configured
-        if memory_system.MEMORY_CONFIG['summarizer'] == 'bart':
-            print("\nPre-loading BART summarizer...")
-            try:
-                from memory_system import init_bart_summarizer
-                init_bart_summarizer()
-                print(" BART summarizer ready")
-            except Exception as e:
-                print(f" BART pre-load failed: {e}")
-                print(" Will fall back to Gemma when needed")
-
-        print("\n")
-        # Use port 7860 for Hugging Face Spaces, fallback to 5081 for local
-        port = int(os.environ.get('PORT', 5081))
-        print(f"Server starting at http://localhost:{port}")
-        print("\n")
+    print("Starting Kiki Chatbot Server")
+    print("\n")
+
+    initialize_models()
 
     # Use port from environment variable (7860 for HF Spaces, 5081 for local)
     port = int(os.environ.get('PORT', 5081))
-    app.run(debug=True, host='0.0.0.0', port=port, use_reloader=False)
+
+    print("\n")
+    print(f"Server starting at http://localhost:{port}")
+    print("Models are loading in the background, see /api/health for progress")
+    print("This is the development server, use gunicorn with gunicorn.conf.py for production")
+    print("\n")
+
+    # Debug mode was slow and unsafe, so it was only switched on explicitly with KIKI_DEBUG=1
+    app.run(debug=os.environ.get('KIKI_DEBUG') == '1', host='0.0.0.0', port=port, use_reloader=False, threaded=True)
@@ -0,0 +1,215 @@
+'''
+This is the script we used to compare our sentence-aware chunker with the original 1000/200 character chunker.
+
+For each strategy it chunked the same PDFs and reported the number of chunks, their token counts, how many went over
+MiniLM's 256 word piece window, the approximate index size and the time spent chunking. It then embedded the chunks
+into an in-memory collection and measured a retrieval hit rate: we sampled sentences from the documents as questions
+and counted a hit when one of the top k chunks came from the sentence's page and covered at least half of its characters.
+We located sentences and chunks as character spans in the same whitespace normalized page text, so a sentence that a
+fixed chunk cut in two still counted for the chunk holding most of it and both strategies were judged the same way.
+
+Usage: python benchmark_chunker.py [pdf files or folders] --queries 200 --k 5
+'''
+
+
+
+#All Imports
+
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+import pymupdf
+from chromadb.utils import embedding_functions
+from text_chunker import CHUNKER_CONFIG, count_tokens_batch, iter_sentences
+from chroma_utilities import clean_text, split_into_chunks
+from ephemeral_store import EphemeralCollection
+
+
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PDF_DATASETS_PATH = os.path.join(os.path.dirname(SCRIPT_DIR), "pdf_datasets")
+
+#The embedding size of multi-qa-MiniLM-L6-dot-v1, stored as 4 byte floats
+EMBEDDING_BYTES = 384 * 4
+
+#MiniLM's window including its two special tokens
+MODEL_WINDOW = 256
+
+#The share of a sampled sentence's characters a retrieved chunk had to cover to count as a hit
+HIT_COVERAGE = 0.5
+
+
+def find_pdfs(paths, limit):
+    pdf_paths = []
+
+    for path in paths:
+        if os.path.isdir(path):
+            pdf_paths.extend(os.path.join(path, name) for name in sorted(os.listdir(path)) if name.lower().endswith(".pdf"))
+        else:
+            pdf_paths.append(path)
+
+    return pdf_paths[:limit] if limit else pdf_paths
+
+
+def read_pages(pdf_paths):
+    """
+    This function reads the raw text of every page once so both strategies chunked exactly the same input
+    """
+    pages = []
+
+    for path in pdf_paths:
+        doc = pymupdf.open(path)
+        pages.extend((os.path.basename(path), page.get_text()) for page in doc)
+        doc.close()
+
+    return pages
+
+
+def normalize(text):
+    return " ".join(text.split())
+
+
+def locate_span(text, page_text, cursor=0):
+    """
+    This function finds a chunk or sentence as a (start, end) character span in the normalized page text.
+    We searched forward from the previous match first so repeated passages mapped to the right place.
+    """
+    text = normalize(text)
+    start = page_text.find(text, cursor)
+
+    if start < 0:
+        start = page_text.find(text)
+
+    return (start, start + len(text)) if start >= 0 else None
+
+
+def run_strategy(strategy, pages):
+    CHUNKER_CONFIG["strategy"] = strategy
+
+    started = time.perf_counter()
+    page_chunks = [split_into_chunks(text) for _, text in pages]
+    elapsed = time.perf_counter() - started
+
+    chunks = []
+    spans = []
+
+    #We recorded the page and character span of every chunk outside the timed section
+    for page_index, ((_, text), texts) in enumerate(zip(pages, page_chunks)):
+        page_text = clean_text(text)
+        cursor = 0
+
+        for chunk in texts:
+            span = locate_span(chunk, page_text, cursor)
+            if span:
+                cursor = span[0] + 1
+
+            chunks.append(chunk)
+            spans.append((page_index, span))
+
+    tokens = count_tokens_batch(chunks)
+
+    return {
+        "strategy": strategy,
+        "chunks": chunks,
+        "spans": spans,
+        "seconds": elapsed,
+        "mean_tokens": statistics.mean(tokens) if tokens else 0,
+        "stdev_tokens": statistics.pstdev(tokens) if tokens else 0,
+        "over_window": sum(1 for count in tokens if count + 2 > MODEL_WINDOW),
+        "index_bytes": sum(len(chunk.encode("utf-8")) for chunk in chunks) + len(chunks) * EMBEDDING_BYTES,
+    }
+
+
+def sample_questions(pages, count, seed):
+    """
+    This function samples medium length sentences from the documents to use as questions.
+    Every question kept its page and character span so hits could be scored by overlap instead of containment.
+    """
+    sentences = []
+
+    for page_index, (_, text) in enumerate(pages):
+        page_text = clean_text(text)
+        cursor = 0
+
+        for sentence in iter_sentences(clean_text(text, preserve_paragraphs=True)):
+            span = locate_span(sentence, page_text, cursor)
+            if not span:
+                continue
+
+            cursor = span[1]
+            words = len(sentence.split())
+            if 8 <= words <= 40:
+                sentences.append((sentence, page_index, span))
+
+    random.Random(seed).shuffle(sentences)
+    return sentences[:count]
+
+
+def covers_question(chunk_span, question):
+    """
+    This function checks if a chunk from the question's page covered enough of the sampled sentence's span
+    """
+    chunk_page, span = chunk_span
+    _, page_index, (start, end) = question
+
+    if chunk_page != page_index or span is None:
+        return False
+
+    overlap = min(end, span[1]) - max(start, span[0])
+    return overlap >= HIT_COVERAGE * (end - start)
+
+
+def hit_rate(chunks, spans, questions, embedding_function, k):
+    collection = EphemeralCollection("benchmark", embedding_function)
+
+    for start in range(0, len(chunks), 256):
+        batch = chunks[start:start + 256]
+        collection.upsert(ids=[str(i) for i in range(start, start + len(batch))], documents=batch)
+
+    results = collection.query(query_embeddings=embedding_function([sentence for sentence, _, _ in questions]), n_results=k)
+
+    hits = 0
+    for question, retrieved_ids in zip(questions, results["ids"]):
+        if any(covers_question(spans[int(chunk_id)], question) for chunk_id in retrieved_ids):
+            hits += 1
+
+    return hits / len(questions) if questions else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the fixed and sentence-aware chunkers")
+    parser.add_argument("paths", nargs="*", default=[PDF_DATASETS_PATH])
+    parser.add_argument("--limit", type=int, default=20, help="maximum number of PDFs to read, 0 for all")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    pdf_paths = find_pdfs(args.paths, args.limit)
+    if not pdf_paths:
+        print("No PDF files found")
+        sys.exit(1)
+
+    pages = read_pages(pdf_paths)
+    questions = sample_questions(pages, args.queries, args.seed)
+    print(f"Benchmarking {len(pdf_paths)} PDFs ({len(pages)} pages) with {len(questions)} sampled questions, k={args.k}\n")
+
+    embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(model_name="multi-qa-MiniLM-L6-dot-v1")
+
+    print(f"{'strategy':<10}{'chunks':>8}{'mean tok':>10}{'stdev':>8}{'>window':>9}{'index MB':>10}{'chunk s':>9}{'hit@k':>8}")
+
+    for strategy in ("fixed", "sentence"):
+        result = run_strategy(strategy, pages)
+        rate = hit_rate(result["chunks"], result["spans"], questions, embedding_function, args.k)
+
+        print(
+            f"{strategy:<10}{len(result['chunks']):>8}{result['mean_tokens']:>10.1f}{result['stdev_tokens']:>8.1f}"
+            f"{result['over_window']:>9}{result['index_bytes'] / 1e6:>10.2f}{result['seconds']:>9.2f}{rate:>8.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+'''
+This is the microbenchmark we used to compare our old BART summarization loop with the batched one.
+
+The old loop cut long text into 4000 character pieces, built the list with chunks.insert(0, ...) and made one
+pipeline call per piece. The new summarize_with_bart split on BART token counts and summarized all pieces in
+batched pipeline calls. Both ran on the same synthetic conversations and we reported summaries per second.
+
+Usage: python benchmark_summarizer.py --conversations 5 --turns 40 --batch-size 4
+'''
+
+
+
+#All Imports
+
+import time
+import random
+import argparse
+import memory_system
+
+
+
+TOPICS = [
+    "the 2022 budget allocation for basic education",
+    "how the Ghana Education Service is organised",
+    "malaria prevention programmes in the Northern Region",
+    "the history of Korle Bu Teaching Hospital",
+    "cocoa exports and their share of foreign exchange",
+    "the rainy seasons in southern Ghana",
+    "free senior high school enrolment figures",
+    "the role of the Food and Drugs Authority",
+]
+
+
+def synthetic_conversation(turns, seed):
+    """
+    This function builds a conversation in the same User/Kiki format our memory system summarized
+    """
+    rng = random.Random(seed)
+    text = ""
+
+    for _ in range(turns):
+        topic = rng.choice(TOPICS)
+        text += f"User: Can you tell me more about {topic}?\n"
+        text += (
+            f"Kiki: Certainly. Regarding {topic}, the available reports describe several developments. "
+            f"Officials highlighted progress in recent years, while researchers pointed to remaining gaps in funding, "
+            f"staffing and access in rural districts. Further details depend on the region and the year in question.\n\n"
+        )
+
+    return text.strip()
+
+
+def legacy_summarize(summarizer, text):
+    """
+    This is the summarization loop we used before batching, kept here only for comparison
+    """
+    MAX_CHARS = 4000
+
+    if len(text) <= MAX_CHARS:
+        return summarizer(text, max_length=100, min_length=30, do_sample=False)[0]['summary_text']
+
+    chunks = []
+    remaining = text
+
+    while len(remaining) > MAX_CHARS:
+        chunks.insert(0, remaining[-MAX_CHARS:])
+        remaining = remaining[:-MAX_CHARS]
+
+    if remaining:
+        chunks.insert(0, remaining)
+
+    summaries = []
+    for chunk in chunks:
+        result = summarizer(chunk, max_length=80, min_length=20, do_sample=False, truncation=True)
+        summaries.append(result[0]['summary_text'])
+
+    if len(summaries) == 1:
+        return summaries[0]
+
+    return legacy_summarize(summarizer, " ".join(summaries))
+
+
+def run(label, summarize, texts):
+    started = time.perf_counter()
+    for text in texts:
+        summarize(text)
+    elapsed = time.perf_counter() - started
+
+    print(f"{label:<10}{len(texts):>8}{elapsed:>10.2f}{len(texts) / elapsed:>14.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the old and batched BART summarization")
+    parser.add_argument("--conversations", type=int, default=5)
+    parser.add_argument("--turns", type=int, default=40, help="turns per conversation, 40 turns is roughly 15k characters")
+    parser.add_argument("--batch-size", type=int, default=memory_system.MEMORY_CONFIG["bart_batch_size"])
+    args = parser.parse_args()
+
+    memory_system.MEMORY_CONFIG["bart_batch_size"] = args.batch_size
+
+    summarizer = memory_system.init_bart_summarizer()
+    if summarizer is None:
+        print("BART could not be loaded")
+        return
+
+    texts = [synthetic_conversation(args.turns, seed) for seed in range(args.conversations)]
+    print(f"{len(texts)} conversations of about {sum(map(len, texts)) // len(texts)} characters, batch size {args.batch_size}\n")
+
+    #We ran one summary first so model loading and first call overheads were not counted
+    summarizer("Warm up the summarization pipeline before timing it.", max_length=20, min_length=5, do_sample=False)
+
+    print(f"{'method':<10}{'texts':>8}{'seconds':>10}{'summaries/s':>14}")
+    run("before", lambda text: legacy_summarize(summarizer, text), texts)
+    run("after", memory_system.summarize_with_bart, texts)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+'''
+This is our lexical BM25 index, which we kept alongside ChromaDB. MiniLM embeddings were good at paraphrases, but they
+often missed exact lookups that mattered for our legal and budget documents, such as act numbers ("Act 1030"),
+ministry codes ("MoF", "MESTI") and figures from the budget tables.
+
+The index was an inverted index in a small SQLite file next to the vector database. Every chunk got an integer ID, and
+for each term we stored the chunks containing it with the term's frequency. We did not store the chunk text, which
+ChromaDB already held. upsert_chunks and delete_chunks updated the index together with Chroma, so every ingestion path
+kept it in sync. At query time we scored the chunks with BM25, and model_utilities fused the ranking with the dense
+ranking using reciprocal rank fusion.
+'''
+
+
+
+#All Imports
+
+import os
+import re
+import math
+import sqlite3
+import threading
+from collections import Counter
+
+
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(SCRIPT_DIR)
+
+
+#BM25 Configuration - Like the document registry, we only indexed our persistent collections
+BM25_CONFIG = {
+    "enabled": os.environ.get("KIKI_HYBRID_SEARCH", "1") == "1",
+    "path": os.path.join(BASE_DIR, "vector_db", "bm25_index.sqlite3"),
+    "indexed_collections": {"Ghana_chatbot"},
+
+    #The usual BM25 parameters: k1 controlled term frequency saturation and b the document length normalization
+    "k1": 1.2,
+    "b": 0.75,
+
+    #The constant of reciprocal rank fusion. 60 was the value from the original paper and worked well for us
+    "rrf_k": 60,
+
+    #Each retriever returned this many times n_results candidates for the fusion
+    "candidate_multiplier": 4,
+
+    #A BM25 hit was only kept past the dense distance threshold when it was among the best few BM25 hits and its
+    #normalized score showed it matched most of the question's rare terms, not just a word like "ghana"
+    "strong_match_rank": int(os.environ.get("KIKI_BM25_STRONG_RANK", 3)),
+    "strong_match_score": float(os.environ.get("KIKI_BM25_STRONG_SCORE", 0.5)),
+
+    #The number of chunks we read from Chroma at a time when rebuilding the index
+    "rebuild_batch_size": 1000,
+}
+
+
+#Numbers kept their decimals, and thousands separators were removed first so "1,030" and "1030" matched
+TERM_PATTERN = re.compile(r"[^\W_]+(?:\.\d+)?")
+THOUSANDS_PATTERN = re.compile(r"(?<=\d),(?=\d{3}\b)")
+
+#Very common English words matched almost every chunk, so we left them out of the index
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the this to was were what when where which who
+will with how do does did can i you we they he she me my our your their about into than then there these those
+""".split())
+
+
+#We serialized writes, and kept the collections whose index was known to match Chroma
+INDEX_LOCK = threading.Lock()
+SYNCED_COLLECTIONS = set()
+
+#Cached document count and average length per collection, dropped on every write
+COLLECTION_STATS = {}
+
+
+def tokenize(text):
+    """
+    This function splits text into lowercase index terms without stopwords
+    """
+    text = THOUSANDS_PATTERN.sub("", text.lower())
+    return [term for term in TERM_PATTERN.findall(text) if term not in STOPWORDS]
+
+
+def connect_index():
+    """
+    This function opens the index database, creating its tables the first time
+    """
+    connection = sqlite3.connect(BM25_CONFIG["path"], timeout=30)
+    connection.execute(
+        """CREATE TABLE IF NOT EXISTS docs (
+            doc_id INTEGER PRIMARY KEY,
+            collection TEXT NOT NULL,
+            chunk_id TEXT NOT NULL,
+            length INTEGER NOT NULL,
+            UNIQUE (collection, chunk_id)
+        )"""
+    )
+
+    #The postings were clustered by term so a query read each term's postings in one range scan
+    connection.execute(
+        """CREATE TABLE IF NOT EXISTS postings (
+            term TEXT NOT NULL,
+            doc_id INTEGER NOT NULL,
+            tf INTEGER NOT NULL,
+            PRIMARY KEY (term, doc_id)
+        ) WITHOUT ROWID"""
+    )
+    connection.execute("CREATE INDEX IF NOT EXISTS postings_by_doc ON postings (doc_id)")
+    return connection
+
+
+def is_indexed(collection_name):
+    """
+    This function tells whether a collection had a BM25 index we could query
+    """
+    return BM25_CONFIG["enabled"] and collection_name in BM25_CONFIG["indexed_collections"]
+
+
+def is_searchable(collection_name):
+    """
+    This function tells whether the index of a collection had been checked against Chroma and could be searched
+    """
+    return is_indexed(collection_name) and collection_name in SYNCED_COLLECTIONS
+
+
+def delete_docs(connection, collection_name, ids):
+    doc_ids = []
+
+    for start in range(0, len(ids), 500):
+        batch = ids[start:start + 500]
+        rows = connection.execute(
+            f"SELECT doc_id FROM docs WHERE collection = ? AND chunk_id IN ({','.join('?' * len(batch))})",
+            [collection_name, *batch]
+        ).fetchall()
+        doc_ids.extend(row[0] for row in rows)
+
+    connection.executemany("DELETE FROM postings WHERE doc_id = ?", [(doc_id,) for doc_id in doc_ids])
+    connection.executemany("DELETE FROM docs WHERE doc_id = ?", [(doc_id,) for doc_id in doc_ids])
+
+
+def index_chunks(collection_name, ids, documents):
+    """
+    This function adds or replaces chunks in the index of a collection
+    """
+    if not is_indexed(collection_name) or not ids:
+        return
+
+    with INDEX_LOCK:
+        connection = connect_index()
+
+        with connection:
+            delete_docs(connection, collection_name, list(ids))
+
+            for chunk_id, document in zip(ids, documents):
+                terms = Counter(tokenize(document or ""))
+
+                doc_id = connection.execute(
+                    "INSERT INTO docs (collection, chunk_id, length) VALUES (?, ?, ?)",
+                    (collection_name, chunk_id, sum(terms.values()))
+                ).lastrowid
+
+                connection.executemany(
+                    "INSERT INTO postings VALUES (?, ?, ?)",
+                    [(term, doc_id, tf) for term, tf in terms.items()]
+                )
+
+        connection.close()
+        COLLECTION_STATS.pop(collection_name, None)
+
+
+def remove_chunks(collection_name, ids):
+    """
+    This function removes deleted chunks from the index of a collection
+    """
+    if not is_indexed(collection_name) or not ids:
+        return
+
+    with INDEX_LOCK:
+        connection = connect_index()
+
+        with connection:
+            delete_docs(connection, collection_name, list(ids))
+
+        connection.close()
+        COLLECTION_STATS.pop(collection_name, None)
+
+
+def get_collection_stats(connection, collection_name):
+    stats = COLLECTION_STATS.get(collection_name)
+
+    if stats is None:
+        count, average_length = connection.execute(
+            "SELECT COUNT(*), AVG(length) FROM docs WHERE collection = ?",
+            (collection_name,)
+        ).fetchone()
+        stats = (count, average_length or 1.0)
+        COLLECTION_STATS[collection_name] = stats
+
+    return stats
+
+
+def search(collection_name, question, n_results=20):
+    """
+    This function returns the IDs of the best matching chunks for a question with their normalized BM25 scores, best first.
+    We divided every score by the sum of the IDFs of all the question's terms, which was the score of an average length
+    chunk containing each of them once. Terms missing from the collection counted with the highest IDF. A chunk that
+    matched every term scored about 1, and one that only matched a word found in almost every chunk scored close to 0.
+    """
+    if not is_searchable(collection_name):
+        return []
+
+    terms = set(tokenize(question))
+    if not terms:
+        return []
+
+    k1 = BM25_CONFIG["k1"]
+    b = BM25_CONFIG["b"]
+
+    connection = connect_index()
+    doc_count, average_length = get_collection_stats(connection, collection_name)
+
+    if doc_count == 0:
+        connection.close()
+        return []
+
+    scores = Counter()
+    idf_total = 0.0
+
+    for term in terms:
+        postings = connection.execute(
+            """SELECT postings.doc_id, postings.tf, docs.length FROM postings
+               JOIN docs ON docs.doc_id = postings.doc_id
+               WHERE postings.term = ? AND docs.collection = ?""",
+            (term, collection_name)
+        ).fetchall()
+
+        #Rare terms such as act numbers and ministry codes got a much higher weight than common ones
+        idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+        idf_total += idf
+
+        for doc_id, tf, length in postings:
+            scores[doc_id] += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / average_length))
+
+    best = scores.most_common(n_results)
+
+    chunk_ids = {}
+    if best:
+        rows = connection.execute(
+            f"SELECT doc_id, chunk_id FROM docs WHERE doc_id IN ({','.join('?' * len(best))})",
+            [doc_id for doc_id, _ in best]
+        ).fetchall()
+        chunk_ids = dict(rows)
+
+    connection.close()
+
+    return [(chunk_ids[doc_id], score / idf_total) for doc_id, score in best if doc_id in chunk_ids]
+
+
+def is_strong_match(score, rank):
+    """
+    This function tells whether a BM25 hit was good enough to keep when its embedding was far from the question.
+    It took the normalized score from search and the hit's 0-based rank among the BM25 results.
+    """
+    if score is None or rank is None:
+        return False
+
+    return rank < BM25_CONFIG["strong_match_rank"] and score >= BM25_CONFIG["strong_match_score"]
+
+
+def reciprocal_rank_fusion(rankings, k=None):
+    """
+    This function fuses several rankings of IDs, best first, into one ranking by summing 1 / (k + rank)
+    """
+    k = k or BM25_CONFIG["rrf_k"]
+    scores = Counter()
+
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] += 1.0 / (k + rank)
+
+    return [item for item, _ in scores.most_common()]
+
+
+def sync_index(collection):
+    """
+    This function makes sure the index of a collection matched Chroma, rebuilding it from the stored chunks when the
+    number of chunks differed, for example the first time we started with an existing vector database
+    """
+    if not is_indexed(collection.name):
+        return
+
+    connection = connect_index()
+    indexed = get_collection_stats(connection, collection.name)[0]
+    connection.close()
+
+    total = collection.count()
+
+    if indexed != total:
+        print(f"Rebuilding the BM25 index of {collection.name} ({indexed} of {total} chunks indexed)...")
+
+        with INDEX_LOCK:
+            connection = connect_index()
+
+            with connection:
+                connection.execute(
+                    "DELETE FROM postings WHERE doc_id IN (SELECT doc_id FROM docs WHERE collection = ?)",
+                    (collection.name,)
+                )
+                connection.execute("DELETE FROM docs WHERE collection = ?", (collection.name,))
+
+            connection.close()
+            COLLECTION_STATS.pop(collection.name, None)
+
+        batch_size = BM25_CONFIG["rebuild_batch_size"]
+
+        for offset in range(0, total, batch_size):
+            batch = collection.get(include=["documents"], limit=batch_size, offset=offset)
+            index_chunks(collection.name, batch["ids"], batch["documents"])
+
+    SYNCED_COLLECTIONS.add(collection.name)
@@ -12,21 +12,108 @@ more suitable for natural language processing and retrieval.
 
 #All Imports
 
+import os
+import re
+import json
 import pymupdf
-import requests
 import pandas as pd
 from docx import Document
 from bs4 import BeautifulSoup
 from pptx import Presentation
+from text_chunker import CHUNKER_CONFIG, sentence_chunks
+from document_registry import (
+    is_tracked,
+    content_hash,
+    file_sha256,
+    document_unchanged,
+    get_chunk_hashes,
+    record_document,
+)
+from bm25_index import index_chunks, remove_chunks
+from document_metadata import document_metadata
+from http_fetcher import fetch, fetch_many
 
 
 
+#PDF Streaming Configuration - Large PDFs were extracted, embedded and written in batches of at most this many chunks,
+#so memory use and the size of each embedding call stayed the same however many pages a document had
+PDF_STREAM_CONFIG = {
+    "batch_size": int(os.environ.get("KIKI_PDF_BATCH_SIZE", 128)),
+}
 
-def clean_text(text):
+
+
+
+#Functions that were called with the collection name every time chunks were written to or deleted from a collection,
+#for example to invalidate cached answers that may have become out of date
+WRITE_LISTENERS = []
+
+
+def register_write_listener(listener):
+    """
+    This function registers a callback that receives the collection name after every upsert or delete
+    """
+    WRITE_LISTENERS.append(listener)
+
+
+def notify_write_listeners(collection_name):
+    for listener in WRITE_LISTENERS:
+        try:
+            listener(collection_name.name)
+        except Exception as e:
+            print(f"Warning: write listener failed: {e}")
+
+
+def upsert_chunks(collection_name, documents, ids, metadatas, embeddings=None):
+    """
+    This function writes chunks to a ChromaDB collection and notifies the registered listeners.
+    All our ingestion functions wrote through here so nothing could change a collection unnoticed.
+    """
+
+    if embeddings is None:
+        collection_name.upsert(
+            documents=documents,
+            ids=ids,
+            metadatas=metadatas
+        )
+    else:
+        collection_name.upsert(
+            documents=documents,
+            ids=ids,
+            metadatas=metadatas,
+            embeddings=embeddings
+        )
+
+    #We kept the lexical index of the collection in step with Chroma
+    index_chunks(collection_name.name, ids, documents)
+
+    notify_write_listeners(collection_name)
+
+
+def delete_chunks(collection_name, ids):
     """
-    This function cleans and normalizes text by removing unwanted characters and formatting
+    This function deletes chunks from a ChromaDB collection and notifies the registered listeners
+    """
+
+    if not ids:
+        return
+
+    collection_name.delete(ids=list(ids))
+
+    remove_chunks(collection_name.name, list(ids))
 
+    notify_write_listeners(collection_name)
+
+
+def clean_text(text, preserve_paragraphs=False):
+    """
+    This function cleans and normalizes text by removing unwanted characters and formatting.
+    With preserve_paragraphs, blank lines between paragraphs were kept so the sentence chunker could end chunks there.
     """
+
+    if preserve_paragraphs:
+        paragraphs = re.split(r"\n\s*\n", text.replace("\r\n", "\n").replace("\r", "\n").replace("\x0c", "\n\n"))
+        return "\n\n".join(paragraph for paragraph in map(clean_text, paragraphs) if paragraph)
     
     #We replaced line breaks and carriage returns with spaces
     text = text.replace('\n', ' ').replace('\r', ' ')
@@ -79,103 +166,346 @@ def chunk_text(text, chunk_size=1000, overlap=200):
     return chunks
 
 
+def split_into_chunks(text):
+    """
+    This function cleans and chunks text with the chunking strategy selected in CHUNKER_CONFIG
+    """
+
+    if CHUNKER_CONFIG["strategy"] == "fixed":
+        return chunk_text(clean_text(text), chunk_size=1000, overlap=200)
+
+    return sentence_chunks(clean_text(text, preserve_paragraphs=True))
+
 
 
-def pdf_to_database(path, collection_name, original_filename=None):
+
+def new_chunk_set(source=None, doc_hash=None):
     """
-    This function extracts text from PDF files and adds to ChromaDB with page-level metadata
+    This function creates an empty chunk set, the lists of documents, IDs and metadata we wrote to ChromaDB together.
+    It also carried the document's source name and content hash for the document registry.
+    """
+    return {
+        "source": source,
+        "doc_hash": doc_hash,
+        "ids": [],
+        "documents": [],
+        "metadatas": []
+    }
+
+
+def iter_pdf_chunks(doc, filename, shared_metadata):
+    """
+    This generator yields (page number, chunk ID, chunk, metadata) one page at a time, so only the current page's
+    text was ever held in memory
     """
-    
-    #We opened the PDF document using PyMuPDF
-    doc = pymupdf.open(path)
-    
-    #We used the original filename if provided, otherwise extracted from path
-    filename = original_filename if original_filename else path.split("/")[-1]  
-    
-    #We prepared lists to store all chunks, IDs, and metadata
-    all_chunks = []
-    all_ids = []
-    all_metadata = []
-    
 
-    #We processed each page in the PDF document
     for page_number in range(len(doc)):
         page = doc[page_number]
         text = page.get_text()
-    
-        #We cleaned the extracted text
-        text = clean_text(text)
-        
-        #We split the text into chunks for better retrieval
-        chunks = chunk_text(text, chunk_size=1000, overlap=200)
-        
-        #We processed each chunk and created metadata
-        for chunk_idx, chunk in enumerate(chunks):
-            
-            all_chunks.append(chunk)
-            
-            #We created unique IDs for each chunk
-            all_ids.append(f"{filename}_p{page_number+1}_c{chunk_idx}")
-            
+
+        #We cleaned the extracted text and split it into chunks for better retrieval
+        for chunk_idx, chunk in enumerate(split_into_chunks(text)):
+
             #We stored source, page, and chunk information in metadata
-            all_metadata.append({
+            metadata = {
                 "source": filename,
                 "page": page_number + 1,
-                "chunk": chunk_idx
-            })
-        
-    #We added all chunks to the database if any were found
-    if all_chunks:
-        collection_name.upsert(
-            documents=all_chunks,
-            ids=all_ids,
-            metadatas=all_metadata
-        )
+                "chunk": chunk_idx,
+                **shared_metadata
+            }
 
-    #We closed the document to free memory
-    doc.close()
+            yield page_number + 1, f"{filename}_p{page_number+1}_c{chunk_idx}", chunk, metadata
 
-    return
+
+def iter_pdf_batches(path, original_filename=None, doc_hash=None, batch_size=None):
+    """
+    This generator yields a PDF's chunks as chunk sets of at most batch_size chunks, with the number of pages
+    whose chunks had all been yielded so far and the page count. Every batch carried the document's source and hash.
+    """
+
+    batch_size = batch_size or PDF_STREAM_CONFIG["batch_size"]
+
+    #We used the original filename if provided, otherwise extracted from path
+    filename = original_filename if original_filename else path.split("/")[-1]
+    doc_hash = doc_hash or file_sha256(path)
+
+    #Every chunk also carried the document's type, family, year, language and ingestion time for scoped search
+    shared_metadata = document_metadata(filename)
+
+    #We opened the PDF document using PyMuPDF
+    doc = pymupdf.open(path)
+
+    try:
+        page_count = len(doc)
+        batch = new_chunk_set(filename, doc_hash)
+
+        for page_number, chunk_id, chunk, metadata in iter_pdf_chunks(doc, filename, shared_metadata):
+            if len(batch["ids"]) == batch_size:
+                #The next chunk could still be from a page in this batch, so only the pages before it were fully read
+                yield batch, page_number - 1, page_count
+                batch = new_chunk_set(filename, doc_hash)
+
+            batch["ids"].append(chunk_id)
+            batch["documents"].append(chunk)
+            batch["metadatas"].append(metadata)
+
+        yield batch, page_count, page_count
+
+    finally:
+        #We closed the document to free memory
+        doc.close()
 
 
-def scrapped_text_to_database(text,collection_name,source_name):
+def pdf_to_chunks(path, original_filename=None, doc_hash=None):
     """
-    This function adds scraped or processed text to ChromaDB with appropriate chunking
+    This function extracts text from a PDF file and splits it into chunks with page-level metadata
+    """
+
+    filename = original_filename if original_filename else path.split("/")[-1]
+    chunk_set = new_chunk_set(filename, doc_hash or file_sha256(path))
+
+    #We collected the whole document, for callers such as the ingestion pipeline that batched chunks themselves
+    for batch, _, _ in iter_pdf_batches(path, filename, chunk_set["doc_hash"]):
+        for key in ("ids", "documents", "metadatas"):
+            chunk_set[key].extend(batch[key])
+
+    return chunk_set
+
+
+def text_to_chunks(text, source_name, doc_hash=None):
+    """
+    This function cleans and chunks scraped or processed text
     """
     
     #We prepared lists for chunks, IDs, and metadata
-    all_chunks = []
-    all_ids = []
-    all_metadata = []
+    chunk_set = new_chunk_set(source_name, doc_hash or content_hash(text))
+    shared_metadata = document_metadata(source_name)
 
-    #We cleaned the text before processing
-    text = clean_text(text)
-        
-    #We split the text into manageable chunks
-    chunks = chunk_text(text, chunk_size=1000, overlap=200)
+    #We cleaned the text and split it into manageable chunks
+    chunks = split_into_chunks(text)
         
     #We processed each chunk and created metadata
     for chunk_idx, chunk in enumerate(chunks):
             
-        all_chunks.append(chunk)
+        chunk_set["documents"].append(chunk)
             
         #We created unique IDs for each chunk
-        all_ids.append(f"{source_name}_c{chunk_idx}")
+        chunk_set["ids"].append(f"{source_name}_c{chunk_idx}")
             
         #We stored source and chunk information in metadata
-        all_metadata.append({
+        chunk_set["metadatas"].append({
             "source": source_name,
-            "chunk": chunk_idx
+            "chunk": chunk_idx,
+            **shared_metadata
         })
-        
-    #We added all chunks to the database if any were found
-    if all_chunks:
-        collection_name.upsert(
-            documents=all_chunks,
-            ids=all_ids,
-            metadatas=all_metadata
+
+    return chunk_set
+
+
+def chunk_hash(document, metadata):
+    """
+    This function hashes a chunk's text together with its metadata, so either changing meant the chunk was rewritten.
+    The ingestion time was left out, otherwise every chunk would have looked changed on every run.
+    """
+    metadata = {key: value for key, value in metadata.items() if key != "ingested_at"}
+    return content_hash(document + "\x00" + json.dumps(metadata, sort_keys=True))
+
+
+def previous_chunk_hashes(collection_name, source):
+    """
+    This function returns the chunk hashes the document registry recorded for a document, by chunk ID
+    """
+
+    previous = get_chunk_hashes(collection_name.name, source)
+
+    #For documents ingested before we had the registry, we looked up their existing chunk IDs in ChromaDB
+    if previous is None:
+        existing = collection_name.get(where={"source": source}, include=[])
+        previous = {chunk_id: None for chunk_id in existing["ids"]}
+
+    return previous
+
+
+def plan_chunk_set(collection_name, chunk_set, previous=None):
+    """
+    This function compares a chunk set with what the document registry recorded for the same document.
+    It returned the chunks that were new or changed, the IDs of old chunks the new version no longer had,
+    and the hashes of all the new chunks. Streaming writers passed the recorded hashes in so they were read once.
+    """
+
+    source = chunk_set["source"]
+
+    hashes = {
+        chunk_id: chunk_hash(document, metadata)
+        for chunk_id, document, metadata in zip(chunk_set["ids"], chunk_set["documents"], chunk_set["metadatas"])
+    }
+
+    if previous is None:
+        previous = previous_chunk_hashes(collection_name, source)
+
+    changed = [i for i, chunk_id in enumerate(chunk_set["ids"]) if previous.get(chunk_id) != hashes[chunk_id]]
+
+    changed_set = new_chunk_set(source, chunk_set["doc_hash"])
+    changed_set["ids"] = [chunk_set["ids"][i] for i in changed]
+    changed_set["documents"] = [chunk_set["documents"][i] for i in changed]
+    changed_set["metadatas"] = [chunk_set["metadatas"][i] for i in changed]
+
+    if chunk_set.get("embeddings") is not None:
+        changed_set["embeddings"] = [chunk_set["embeddings"][i] for i in changed]
+
+    orphan_ids = [chunk_id for chunk_id in previous if chunk_id not in hashes]
+
+    return changed_set, orphan_ids, hashes
+
+
+def finalize_document(collection_name, chunk_set, chunk_hashes, orphan_ids):
+    """
+    This function deletes a document's orphaned chunks and records its new version in the registry.
+    We only called it after the changed chunks were written, so a crash never recorded a half written document.
+    """
+
+    delete_chunks(collection_name, orphan_ids)
+    record_document(collection_name.name, chunk_set["source"], chunk_set["doc_hash"], chunk_hashes)
+
+
+def write_chunk_set(collection_name, chunk_set):
+    """
+    This function writes a chunk set to ChromaDB, using its precomputed embeddings when it had them.
+    For collections tracked by the document registry only new or changed chunks were written and stale ones were deleted.
+    """
+
+    if not is_tracked(collection_name.name) or not chunk_set.get("source"):
+        #We added all chunks to the database if any were found
+        if chunk_set["ids"]:
+            upsert_chunks(
+                collection_name,
+                documents=chunk_set["documents"],
+                ids=chunk_set["ids"],
+                metadatas=chunk_set["metadatas"],
+                embeddings=chunk_set.get("embeddings")
+            )
+        return
+
+    changed_set, orphan_ids, chunk_hashes = plan_chunk_set(collection_name, chunk_set)
+
+    if changed_set["ids"]:
+        upsert_chunks(
+            collection_name,
+            documents=changed_set["documents"],
+            ids=changed_set["ids"],
+            metadatas=changed_set["metadatas"],
+            embeddings=changed_set.get("embeddings")
         )
 
+    finalize_document(collection_name, chunk_set, chunk_hashes, orphan_ids)
+
+    print(f"{chunk_set['source']}: {len(changed_set['ids'])} of {len(chunk_set['ids'])} chunks written, {len(orphan_ids)} stale chunks removed")
+
+
+def skip_unchanged(collection_name, source, doc_hash):
+    """
+    This function returns True, after saying so, when the registry already had this exact version of a document
+    """
+    if document_unchanged(collection_name.name, source, doc_hash):
+        print(f"Skipping unchanged document: {source}")
+        return True
+
+    return False
+
+
+def file_to_database(path, collection_name, original_filename, chunker):
+    """
+    This function chunks a file with the given chunker and writes it to ChromaDB, unless this exact file was already indexed.
+    The chunker took the path, the source name and the document hash, like docx_to_chunks.
+    """
+
+    filename = original_filename if original_filename else path.split("/")[-1]
+
+    #We skipped the extraction when this exact file was already indexed
+    doc_hash = file_sha256(path)
+    if skip_unchanged(collection_name, filename, doc_hash):
+        return
+
+    write_chunk_set(collection_name, chunker(path, filename, doc_hash))
+
+
+def log_pdf_progress(progress):
+    """
+    This is the default progress callback of pdf_to_database
+    """
+    print(f"{progress['source']}: page {progress['pages_read']}/{progress['page_count']}, {progress['chunks_written']} of {progress['chunks_read']} chunks written")
+
+
+def pdf_to_database(path, collection_name, original_filename=None, progress=log_pdf_progress, batch_size=None):
+    """
+    This function extracts text from PDF files and adds to ChromaDB with page-level metadata.
+    We streamed the document in batches: each batch of chunks was embedded and written before the next pages were read,
+    and progress was called after every batch with the pages read, the page count and the chunks read and written.
+    For collections tracked by the document registry, stale chunks were removed and the document recorded only after
+    the last batch, so an interrupted upload was simply redone next time.
+    """
+
+    filename = original_filename if original_filename else path.split("/")[-1]
+
+    #We skipped the whole extraction when this exact file was already indexed
+    doc_hash = file_sha256(path)
+    if skip_unchanged(collection_name, filename, doc_hash):
+        return
+
+    tracked = is_tracked(collection_name.name)
+    previous = previous_chunk_hashes(collection_name, filename) if tracked else None
+
+    #We only kept the small hash of every chunk across batches, to find stale chunks and record the document at the end
+    chunk_hashes = {}
+    chunks_read = 0
+    chunks_written = 0
+
+    for batch, pages_read, page_count in iter_pdf_batches(path, filename, doc_hash, batch_size):
+        chunks_read += len(batch["ids"])
+
+        if tracked:
+            batch, _, batch_hashes = plan_chunk_set(collection_name, batch, previous)
+            chunk_hashes.update(batch_hashes)
+
+        #Chroma embedded each batch with the collection's embedding function as part of the upsert
+        if batch["ids"]:
+            upsert_chunks(
+                collection_name,
+                documents=batch["documents"],
+                ids=batch["ids"],
+                metadatas=batch["metadatas"]
+            )
+            chunks_written += len(batch["ids"])
+
+        if progress is not None:
+            progress({
+                "source": filename,
+                "pages_read": pages_read,
+                "page_count": page_count,
+                "chunks_read": chunks_read,
+                "chunks_written": chunks_written,
+            })
+
+    if tracked:
+        orphan_ids = [chunk_id for chunk_id in previous if chunk_id not in chunk_hashes]
+        finalize_document(collection_name, new_chunk_set(filename, doc_hash), chunk_hashes, orphan_ids)
+
+        print(f"{filename}: {chunks_written} of {chunks_read} chunks written, {len(orphan_ids)} stale chunks removed")
+
+    return
+
+
+def scrapped_text_to_database(text,collection_name,source_name,doc_hash=None):
+    """
+    This function adds scraped or processed text to ChromaDB with appropriate chunking
+    """
+
+    doc_hash = doc_hash or content_hash(text)
+    if skip_unchanged(collection_name, source_name, doc_hash):
+        return
+
+    write_chunk_set(collection_name, text_to_chunks(text, source_name, doc_hash))
+
     return
 
 
@@ -190,13 +520,13 @@ def extract_pdf_text_from_bytes(pdf_content):
         #We opened the PDF from bytes content
         doc = pymupdf.open(stream=pdf_content, filetype="pdf")
         
-        #We extracted text from all pages
-        text = ""
-        for page in doc:
-            text += page.get_text()
-        
-        #We closed the document to free memory
-        doc.close()
+        #We joined the pages' text once instead of copying the growing string for every page
+        try:
+            text = "".join(page.get_text() for page in doc)
+        finally:
+            #We closed the document to free memory
+            doc.close()
+
         return text.strip()
     
     except Exception as e:
@@ -210,97 +540,97 @@ def is_pdf_url(url):
     return url.lower().endswith('.pdf')
 
 
-def scrape_url(url, headers=None):
+def page_from_response(url, response):
     """
-    This function scrapes content from a single URL (HTML or PDF)
+    This function extracts the text of a fetched HTML page or PDF, or returns None for error statuses
     """
+
+    # We handled different HTTP status codes appropriately
+    if response['status'] == 403:
+        print(f"Access forbidden (403) for {url} - site may have anti-bot protection")
+        return None
+    elif response['status'] == 404:
+        print(f"Page not found (404) for {url}")
+        return None
+    elif response['status'] != 200:
+        print(f"HTTP {response['status']} error for {url}")
+        return None
     
-    #We used more comprehensive headers to avoid blocking
-    if headers is None:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate',
-            'DNT': '1',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
+    #We checked if the content was a PDF
+    if is_pdf_url(url) or 'application/pdf' in response['content_type']:
+        
+        text = extract_pdf_text_from_bytes(response['content'])
+        return {
+            'text': text,
+            'type': 'pdf'
         }
     
-    try:
-        #We made the HTTP request to get the content
-        response = requests.get(url, headers=headers, timeout=15)
+    else:
+        #For HTML content, we used BeautifulSoup to extract text
+        soup = BeautifulSoup(response['content'], 'html.parser')
         
-        # We handled different HTTP status codes appropriately
-        if response.status_code == 403:
-            print(f"Access forbidden (403) for {url} - site may have anti-bot protection")
-            return None
-        elif response.status_code == 404:
-            print(f"Page not found (404) for {url}")
-            return None
-        elif response.status_code != 200:
-            print(f"HTTP {response.status_code} error for {url}")
-            return None
+        # We removed script and style elements that don't contain useful content
+        for script in soup(["script", "style"]):
+            script.decompose()
         
-        #We checked if the content was a PDF
-        if is_pdf_url(url) or 'application/pdf' in response.headers.get('Content-Type', ''):
-            
-            text = extract_pdf_text_from_bytes(response.content)
-            return {
-                'text': text,
-                'type': 'pdf'
-            }
+        # We focused on paragraph tags for clean content
+        paragraphs = soup.find_all('p')
+        text = '\n\n'.join([p.get_text(strip=True) for p in paragraphs if p.get_text(strip=True)])
         
-        else:
-            #For HTML content, we used BeautifulSoup to extract text
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # We removed script and style elements that don't contain useful content
-            for script in soup(["script", "style"]):
-                script.decompose()
-            
-            # We focused on paragraph tags for clean content
-            paragraphs = soup.find_all('p')
-            text = '\n\n'.join([p.get_text(strip=True) for p in paragraphs if p.get_text(strip=True)])
-            
-            # Only if no paragraphs found, we tried article or main content areas
-            if not text.strip():
-                articles = soup.find_all(['article', 'main'])
-                for article in articles:
-                    article_paragraphs = article.find_all('p')
-                    if article_paragraphs:
-                        text = '\n\n'.join([p.get_text(strip=True) for p in article_paragraphs if p.get_text(strip=True)])
-                        break
-            
-            # We filtered out JavaScript requirement messages
-            if 'enable javascript' in text.lower() and len(text) < 200:
-                text = ""
-            
-            return {
-                'text': text,
-                'type': 'html'
-            }
+        # Only if no paragraphs found, we tried article or main content areas
+        if not text.strip():
+            articles = soup.find_all(['article', 'main'])
+            for article in articles:
+                article_paragraphs = article.find_all('p')
+                if article_paragraphs:
+                    text = '\n\n'.join([p.get_text(strip=True) for p in article_paragraphs if p.get_text(strip=True)])
+                    break
+        
+        # We filtered out JavaScript requirement messages
+        if 'enable javascript' in text.lower() and len(text) < 200:
+            text = ""
+        
+        return {
+            'text': text,
+            'type': 'html'
+        }
+
+
+def scrape_url(url, headers=None):
+    """
+    This function scrapes content from a single URL (HTML or PDF).
+    The fetch went through our pooled, retrying and caching fetcher, and headers were added to its browser-like defaults.
+    """
+    
+    try:
+        #We made the HTTP request to get the content
+        response = fetch(url, headers=headers)
+
+        return page_from_response(url, response)
     
     except Exception as e:
         print(f"Error scraping {url}: {e}")
         return None
 
 
-def scrape_url_to_database(url, collection_name):
+def url_to_chunks(url, result=None):
     """
-    This function scrapes a URL and adds the content to ChromaDB with appropriate source naming
+    This function scrapes a URL and chunks its content with appropriate source naming.
+    It returns None when the URL could not be scraped or had no text.
+    A page that was already fetched could be passed as result.
     """
     
     #We scraped the URL to get its content
-    result = scrape_url(url)
+    if result is None:
+        result = scrape_url(url)
     
     if not result:
         print(f"Failed to scrape: {url}")
-        return False
+        return None
 
     if not result['text'].strip():
         print(f"No text content found at: {url}")
-        return False
+        return None
     
     #We extracted the text and content type
     text = result['text']
@@ -311,51 +641,72 @@ def scrape_url_to_database(url, collection_name):
         filename = url.rstrip('/').split('/')[-1]
         source_name = filename if filename else url
 
-        scrapped_text_to_database(
-            text=text,
-            collection_name=collection_name,
-            source_name=source_name,
-        )
-
     else:
         #For HTML: we used the URL as source name (removed trailing slash for consistency)
         source_name = url.rstrip('/') if url.rstrip('/') else url
-        scrapped_text_to_database(
-            text=text,
-            collection_name=collection_name,
-            source_name=source_name,
-        )
+
+    return text_to_chunks(text, source_name)
+
+
+def scrape_url_to_database(url, collection_name):
+    """
+    This function scrapes a URL and adds the content to ChromaDB with appropriate source naming
+    """
+
+    chunk_set = url_to_chunks(url)
+
+    if chunk_set is None:
+        return False
+
+    write_chunk_set(collection_name, chunk_set)
     
     return True
 
 
 def scrape_multiple_urls_to_database(urls, collection_name):
     """
-    This function scrapes multiple URLs and adds all content to ChromaDB
+    This function scrapes multiple URLs and adds all content to ChromaDB.
+    The pages were downloaded concurrently, and written to the collection one at a time as they arrived.
     """
 
-    #We processed each URL in the list
-    for url in urls:
-        result = scrape_url_to_database(url, collection_name)
-        if result:
+    #We processed each URL as soon as its download finished
+    for url, response, error in fetch_many(urls):
+        if error is not None:
+            print(f"Error scraping {url}: {error}")
+            continue
+
+        #A malformed page or PDF only cost us that URL, like it did when scrape_url caught everything
+        try:
+            page = page_from_response(url, response)
+            chunk_set = url_to_chunks(url, page) if page else None
+
+            if chunk_set is None:
+                print(f"Failed to scrape: {url}")
+                continue
+
+            write_chunk_set(collection_name, chunk_set)
             print(f"Scraped and added to database: {url}")
 
+        except Exception as e:
+            print(f"Error adding {url} to the database: {e}")
+
     return
 
 
-def docx_to_database(path, collection_name, original_filename=None):
+def docx_to_chunks(path, original_filename=None, doc_hash=None):
     """
-    This function extracts text from Word documents and adds to ChromaDB
+    This function extracts text from a Word document, including its tables, and splits it into chunks
     """
 
+    filename = original_filename if original_filename else path.split("/")[-1]
+
     #We opened the Word document
     doc = Document(path)
-    filename = original_filename if original_filename else path.split("/")[-1]
 
     #We extracted all text from paragraphs
     full_text = ""
     for paragraph in doc.paragraphs:
-        full_text += paragraph.text + "\n"
+        full_text += paragraph.text + "\n\n"
 
     #We also extracted text from tables
     for table in doc.tables:
@@ -364,39 +715,50 @@ def docx_to_database(path, collection_name, original_filename=None):
                 full_text += cell.text + " "
             full_text += "\n"
 
-    #We used the same processing pipeline as PDFs
-    full_text = clean_text(full_text)
+    #We used the same cleaning and chunking pipeline as PDFs
+    return text_to_chunks(full_text, filename, doc_hash or file_sha256(path))
+
 
-    #We added to database using our existing function
-    scrapped_text_to_database(full_text, collection_name, filename)
+def docx_to_database(path, collection_name, original_filename=None):
+    """
+    This function extracts text from Word documents and adds to ChromaDB
+    """
+
+    file_to_database(path, collection_name, original_filename, docx_to_chunks)
 
     return
 
 
-def pptx_to_database(path, collection_name, original_filename=None):
+def pptx_to_chunks(path, original_filename=None, doc_hash=None):
     """
-    This function extracts text from PowerPoint presentations and adds to ChromaDB
+    This function extracts text from every slide of a PowerPoint presentation and splits it into chunks
     """
 
+    filename = original_filename if original_filename else path.split("/")[-1]
+
     #We opened the PowerPoint presentation
     prs = Presentation(path)
-    filename = original_filename if original_filename else path.split("/")[-1]
 
     #We extracted text from all slides
     full_text = ""
     for slide_number, slide in enumerate(prs.slides, start=1):
-        full_text += f"\n--- Slide {slide_number} ---\n"
+        full_text += f"\n\n--- Slide {slide_number} ---\n"
 
         #We got text from all shapes in the slide
         for shape in slide.shapes:
             if hasattr(shape, "text"):
                 full_text += shape.text + "\n"
 
-    #We used the same processing pipeline as PDFs
-    full_text = clean_text(full_text)
+    #We used the same cleaning and chunking pipeline as PDFs
+    return text_to_chunks(full_text, filename, doc_hash or file_sha256(path))
 
-    #We added to database using our existing function
-    scrapped_text_to_database(full_text, collection_name, filename)
+
+def pptx_to_database(path, collection_name, original_filename=None):
+    """
+    This function extracts text from PowerPoint presentations and adds to ChromaDB
+    """
+
+    file_to_database(path, collection_name, original_filename, pptx_to_chunks)
 
     return
 
@@ -496,35 +858,42 @@ def dataframe_to_semantic_text(df, source_name, sheet_name=None):
     return " ".join(sentences)
 
 
-def csv_to_database(path, collection_name, original_filename=None):
+def csv_to_chunks(path, original_filename=None, doc_hash=None):
     """
-    This function extracts text from CSV files and adds to ChromaDB using semantic NLP-friendly format
+    This function converts a CSV file to semantic text and splits it into chunks
     """
 
+    filename = original_filename if original_filename else path.split("/")[-1]
+
     #We read the CSV file into a DataFrame
     df = pd.read_csv(path)
-    filename = original_filename if original_filename else path.split("/")[-1]
 
     #We converted the tabular data to semantic natural language
     full_text = dataframe_to_semantic_text(df, filename)
 
-    #We used the same processing pipeline as PDFs
-    full_text = clean_text(full_text)
+    #We used the same cleaning and chunking pipeline as PDFs
+    return text_to_chunks(full_text, filename, doc_hash or file_sha256(path))
+
+
+def csv_to_database(path, collection_name, original_filename=None):
+    """
+    This function extracts text from CSV files and adds to ChromaDB using semantic NLP-friendly format
+    """
 
-    #We added to database using our existing function
-    scrapped_text_to_database(full_text, collection_name, filename)
+    file_to_database(path, collection_name, original_filename, csv_to_chunks)
 
     return
 
 
-def excel_to_database(path, collection_name, original_filename=None):
+def excel_to_chunks(path, original_filename=None, doc_hash=None):
     """
-    This function extracts text from Excel files (supported .xlsx and .xls) and adds to ChromaDB using semantic NLP-friendly format.
+    This function converts every sheet of an Excel file (.xlsx or .xls) to semantic text and splits it into chunks
     """
 
+    filename = original_filename if original_filename else path.split("/")[-1]
+
     #We read the Excel file which automatically handled both .xlsx and .xls
     excel_file = pd.ExcelFile(path)
-    filename = original_filename if original_filename else path.split("/")[-1]
 
     #We processed each sheet separately with semantic conversion
     all_text_parts = []
@@ -552,10 +921,52 @@ def excel_to_database(path, collection_name, original_filename=None):
     #We combined all parts into one text
     full_text = " ".join(all_text_parts)
 
-    #We used the same processing pipeline as PDFs
-    full_text = clean_text(full_text)
+    #We used the same cleaning and chunking pipeline as PDFs
+    return text_to_chunks(full_text, filename, doc_hash or file_sha256(path))
 
-    #We added to database using our existing function
-    scrapped_text_to_database(full_text, collection_name, filename)
+
+def excel_to_database(path, collection_name, original_filename=None):
+    """
+    This function extracts text from Excel files (supported .xlsx and .xls) and adds to ChromaDB using semantic NLP-friendly format.
+    """
+
+    file_to_database(path, collection_name, original_filename, excel_to_chunks)
 
     return
+
+
+#The chunking function for each file type we accepted from uploads
+FILE_CHUNKERS = {
+    ".pdf": pdf_to_chunks,
+    ".docx": docx_to_chunks,
+    ".pptx": pptx_to_chunks,
+    ".csv": csv_to_chunks,
+    ".xlsx": excel_to_chunks,
+    ".xls": excel_to_chunks,
+}
+
+
+def document_to_chunks(path, file_ext, original_filename=None):
+    """
+    This function extracts and chunks an uploaded file of any supported type without writing it anywhere.
+    The resulting chunk set could then be embedded once and written to as many collections as we needed.
+    """
+
+    chunker = FILE_CHUNKERS.get(file_ext.lower())
+
+    if chunker is None:
+        raise ValueError(f"File type not supported: {file_ext}")
+
+    return chunker(path, original_filename)
+
+
+def embed_chunk_set(chunk_set, embedding_function):
+    """
+    This function computes the embeddings of a chunk set in one batch and stores them on the chunk set,
+    so write_chunk_set could reuse them for every collection instead of embedding the same text again
+    """
+
+    if chunk_set["ids"] and chunk_set.get("embeddings") is None:
+        chunk_set["embeddings"] = embedding_function(chunk_set["documents"])
+
+    return chunk_set
@@ -0,0 +1,252 @@
+'''
+This is where we derived the document-level metadata we stored on every chunk, and turned scope filters into
+ChromaDB where clauses. Before it, chunks only carried their source, page and chunk number, and every question
+searched the whole Ghana_chatbot collection.
+
+At ingestion we added the document type, the document family (for example every "2025-Budget-by-Detail_*" file
+belonged to the family "2025-Budget-by-Detail"), the year and language read from the name, and when the chunk was
+written. A question could then be scoped to one source, a family, a type, a language, a year or an ingestion date
+range. The filter was pushed down into Chroma's where clause, so a scoped search only compared against that part of
+the corpus. Chunks written before we had this metadata were backfilled once at startup.
+'''
+
+
+
+#All Imports
+
+import os
+import re
+import time
+import threading
+from datetime import datetime, timezone
+
+
+
+#We read the language from the name of the translated documents, e.g. 2022-Citizens-Budget_Asante_Twi.pdf.
+#Everything else in our corpus was English.
+LANGUAGE_NAMES = {
+    "english": "en",
+    "twi": "tw",
+    "ewe": "ee",
+    "ga": "gaa",
+    "dangme": "ada",
+    "gonja": "gjn",
+    "nzema": "nzi",
+    "french": "fr",
+}
+
+DEFAULT_LANGUAGE = "en"
+
+DOC_TYPES = {
+    ".pdf": "pdf",
+    ".docx": "docx",
+    ".pptx": "pptx",
+    ".csv": "csv",
+    ".xlsx": "excel",
+    ".xls": "excel",
+}
+
+YEAR_PATTERN = re.compile(r"(?<!\d)(19[5-9]\d|20\d\d)(?!\d)")
+COPY_SUFFIX_PATTERN = re.compile(r"\s*\(\d+\)$")
+
+#The filters our API accepted, each matched against the metadata field of the same name
+LIST_FILTERS = ("source", "family", "doc_type", "language", "year")
+
+#The scopes offered in the UI, computed from the collection's metadata and dropped whenever the collection changed
+FACETS_CACHE = {}
+FACETS_LOCK = threading.Lock()
+
+
+def source_stem(source):
+    """
+    This function returns a source's file name without folders, URL parts or extension
+    """
+    name = source.rstrip("/").split("/")[-1] if source.startswith(("http://", "https://")) else os.path.basename(source)
+    return COPY_SUFFIX_PATTERN.sub("", os.path.splitext(name)[0])
+
+
+def document_type(source):
+    if source.startswith("image_"):
+        return "image"
+
+    extension = os.path.splitext(source.lower())[1]
+
+    if extension in DOC_TYPES:
+        return DOC_TYPES[extension]
+
+    return "web" if source.startswith(("http://", "https://")) else "text"
+
+
+def document_family(source):
+    """
+    This function groups documents that only differed by a suffix after the first underscore, such as the
+    ministry code of the budget details or the language of a citizens budget. Names that started with
+    a number before the underscore, like 2024_Annual_Report, were their own family. Web pages were grouped by site.
+    """
+    if source.startswith(("http://", "https://")):
+        return source.split("/")[2]
+
+    if source.startswith("image_"):
+        return document_family(source[len("image_"):])
+
+    stem = source_stem(source)
+    prefix, separator, _ = stem.partition("_")
+
+    if separator and re.search(r"[A-Za-z]", prefix):
+        return prefix
+
+    return stem
+
+
+def document_language(source):
+    words = re.split(r"[\W_]+", source_stem(source).lower())
+
+    for word in reversed(words):
+        if word in LANGUAGE_NAMES:
+            return LANGUAGE_NAMES[word]
+
+    return DEFAULT_LANGUAGE
+
+
+def document_metadata(source, ingested_at=None):
+    """
+    This function returns the document-level metadata we stored on every chunk of a source
+    """
+    metadata = {
+        "doc_type": document_type(source),
+        "family": document_family(source),
+        "language": document_language(source),
+        "ingested_at": int(ingested_at or time.time()),
+    }
+
+    #Chroma did not accept None, so documents without a year in their name simply had no year
+    year = YEAR_PATTERN.search(source_stem(source))
+    if year:
+        metadata["year"] = int(year.group(1))
+
+    return metadata
+
+
+def parse_date(value):
+    """
+    This function turns an ISO date such as 2025-06-30 into a Unix timestamp
+    """
+    try:
+        date = datetime.fromisoformat(str(value))
+    except ValueError:
+        raise ValueError(f"Invalid date: {value}. Use YYYY-MM-DD")
+
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+
+    return int(date.timestamp())
+
+
+def build_where_filter(filters):
+    """
+    This function turns the filters of an API request into a ChromaDB where clause, or None when there were none.
+    Each filter could be a single value or a list of values, and ingested_after/ingested_before took ISO dates.
+    """
+    if not filters:
+        return None
+
+    if not isinstance(filters, dict):
+        raise ValueError("filters must be an object")
+
+    unknown = set(filters) - set(LIST_FILTERS) - {"ingested_after", "ingested_before"}
+    if unknown:
+        raise ValueError(f"Unknown filters: {', '.join(sorted(unknown))}")
+
+    clauses = []
+
+    for field in LIST_FILTERS:
+        value = filters.get(field)
+
+        if value in (None, "", []):
+            continue
+
+        values = value if isinstance(value, list) else [value]
+
+        if field == "year":
+            try:
+                values = [int(year) for year in values]
+            except (TypeError, ValueError):
+                raise ValueError("year must be a number")
+
+        clauses.append({field: values[0]} if len(values) == 1 else {field: {"$in": values}})
+
+    if filters.get("ingested_after"):
+        clauses.append({"ingested_at": {"$gte": parse_date(filters["ingested_after"])}})
+
+    if filters.get("ingested_before"):
+        clauses.append({"ingested_at": {"$lt": parse_date(filters["ingested_before"])}})
+
+    if not clauses:
+        return None
+
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def backfill_metadata(collection, batch_size=1000):
+    """
+    This function adds the document-level metadata to chunks that were written before we stored it.
+    It only updated metadata, so the chunks kept their embeddings.
+    """
+    total = collection.count()
+    updated = 0
+
+    for offset in range(0, total, batch_size):
+        batch = collection.get(include=["metadatas"], limit=batch_size, offset=offset)
+
+        ids = []
+        metadatas = []
+
+        for chunk_id, metadata in zip(batch["ids"], batch["metadatas"]):
+            if metadata and "doc_type" not in metadata and metadata.get("source"):
+                ids.append(chunk_id)
+                metadatas.append({**metadata, **document_metadata(metadata["source"])})
+
+        if ids:
+            collection.update(ids=ids, metadatas=metadatas)
+            updated += len(ids)
+
+    if updated:
+        print(f"Added document metadata to {updated} older chunks of {collection.name}")
+
+    invalidate_facets(collection.name)
+
+
+def invalidate_facets(collection_name):
+    """
+    This write listener dropped the scopes of a collection whose chunks had changed
+    """
+    with FACETS_LOCK:
+        FACETS_CACHE.pop(collection_name, None)
+
+
+def get_facets(collection, batch_size=5000):
+    """
+    This function returns the sources, families, types, languages and years found in a collection, for the scope selector
+    """
+    with FACETS_LOCK:
+        facets = FACETS_CACHE.get(collection.name)
+
+    if facets is not None:
+        return facets
+
+    values = {field: set() for field in LIST_FILTERS}
+
+    for offset in range(0, collection.count(), batch_size):
+        batch = collection.get(include=["metadatas"], limit=batch_size, offset=offset)
+
+        for metadata in batch["metadatas"]:
+            for field in LIST_FILTERS:
+                if metadata and metadata.get(field) is not None:
+                    values[field].add(metadata[field])
+
+    facets = {field: sorted(found) for field, found in values.items()}
+
+    with FACETS_LOCK:
+        FACETS_CACHE[collection.name] = facets
+
+    return facets
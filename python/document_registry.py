@@ -0,0 +1,209 @@
+'''
+This is our document registry for incremental re-indexing. It remembered, for every document we ingested
+into a tracked collection, a hash of the whole document and a hash of every chunk we wrote for it.
+
+With it, ingestion could skip a document whose content had not changed, embed only the chunks that
+were new or different, and delete chunk IDs that a new version of the document no longer produced.
+Before this, every run re-embedded every chunk and left stale chunks behind when a document got shorter.
+'''
+
+
+
+#All Imports
+
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(SCRIPT_DIR)
+
+
+#Registry Configuration - We only tracked our persistent collections, never the temporary per-request ones
+REGISTRY_CONFIG = {
+    "path": os.path.join(BASE_DIR, "vector_db", "document_registry.sqlite3"),
+    "tracked_collections": {"Ghana_chatbot"},
+}
+
+
+#We serialized writes so two ingestions never interleaved their updates for the same document
+REGISTRY_LOCK = threading.Lock()
+
+
+def connect_registry():
+    """
+    This function opens the registry database, creating its tables the first time
+    """
+    connection = sqlite3.connect(REGISTRY_CONFIG["path"], timeout=30)
+    connection.execute(
+        """CREATE TABLE IF NOT EXISTS documents (
+            collection TEXT NOT NULL,
+            source TEXT NOT NULL,
+            doc_hash TEXT NOT NULL,
+            chunk_count INTEGER NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (collection, source)
+        )"""
+    )
+    connection.execute(
+        """CREATE TABLE IF NOT EXISTS chunks (
+            collection TEXT NOT NULL,
+            source TEXT NOT NULL,
+            chunk_id TEXT NOT NULL,
+            chunk_hash TEXT NOT NULL,
+            PRIMARY KEY (collection, chunk_id)
+        )"""
+    )
+    connection.execute("CREATE INDEX IF NOT EXISTS chunks_by_source ON chunks (collection, source)")
+    return connection
+
+
+def is_tracked(collection_name):
+    """
+    This function tells whether a collection's documents were recorded in the registry
+    """
+    return collection_name in REGISTRY_CONFIG["tracked_collections"]
+
+
+def content_hash(content):
+    """
+    This function hashes text or bytes content
+    """
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    return hashlib.sha256(content).hexdigest()
+
+
+def file_sha256(path):
+    """
+    This function hashes a file's content in blocks so large PDFs were never read into memory at once
+    """
+    digest = hashlib.sha256()
+
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def document_unchanged(collection_name, source, doc_hash):
+    """
+    This function returns True when the registry already had this exact version of the document
+    """
+    if not is_tracked(collection_name) or doc_hash is None:
+        return False
+
+    connection = connect_registry()
+    row = connection.execute(
+        "SELECT doc_hash FROM documents WHERE collection = ? AND source = ?",
+        (collection_name, source)
+    ).fetchone()
+    connection.close()
+
+    return row is not None and row[0] == doc_hash
+
+
+def get_chunk_hashes(collection_name, source):
+    """
+    This function returns the chunk IDs and hashes recorded for a document, or None if the document was never recorded
+    """
+    connection = connect_registry()
+
+    known = connection.execute(
+        "SELECT 1 FROM documents WHERE collection = ? AND source = ?",
+        (collection_name, source)
+    ).fetchone()
+
+    if known is None:
+        connection.close()
+        return None
+
+    rows = connection.execute(
+        "SELECT chunk_id, chunk_hash FROM chunks WHERE collection = ? AND source = ?",
+        (collection_name, source)
+    ).fetchall()
+    connection.close()
+
+    return dict(rows)
+
+
+def record_document(collection_name, source, doc_hash, chunk_hashes):
+    """
+    This function stores the new version of a document and its chunk hashes, replacing the previous version
+    """
+    with REGISTRY_LOCK:
+        connection = connect_registry()
+
+        with connection:
+            connection.execute(
+                "DELETE FROM chunks WHERE collection = ? AND source = ?",
+                (collection_name, source)
+            )
+            connection.executemany(
+                "INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?)",
+                [(collection_name, source, chunk_id, chunk_hash) for chunk_id, chunk_hash in chunk_hashes.items()]
+            )
+            connection.execute(
+                "INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?)",
+                (collection_name, source, doc_hash or "", len(chunk_hashes), time.time())
+            )
+
+        connection.close()
+
+
+def list_documents(collection_name):
+    """
+    This function lists the documents recorded for a collection with their chunk counts
+    """
+    connection = connect_registry()
+    rows = connection.execute(
+        "SELECT source, chunk_count, updated_at FROM documents WHERE collection = ? ORDER BY source",
+        (collection_name,)
+    ).fetchall()
+    connection.close()
+
+    return [{"source": source, "chunks": chunk_count, "updated_at": updated_at} for source, chunk_count, updated_at in rows]
+
+
+def forget_collection(collection_name):
+    """
+    This function deletes everything recorded for a collection. We called it whenever the collection was dropped
+    or recreated, otherwise document_unchanged would have skipped every document the empty collection no longer had.
+    """
+    with REGISTRY_LOCK:
+        connection = connect_registry()
+
+        with connection:
+            connection.execute("DELETE FROM chunks WHERE collection = ?", (collection_name,))
+            connection.execute("DELETE FROM documents WHERE collection = ?", (collection_name,))
+
+        connection.close()
+
+
+def sync_registry(collection):
+    """
+    This function checks the registry of a collection against ChromaDB at startup, like sync_index did for BM25.
+    When the registry recorded more chunks than the collection held, for example because the vector database was
+    deleted or recreated outside the app, we forgot the collection so every document was ingested again.
+    Fewer recorded chunks were fine: documents ingested before the registry existed were simply not in it.
+    """
+    if not is_tracked(collection.name):
+        return
+
+    connection = connect_registry()
+    recorded = connection.execute(
+        "SELECT COALESCE(SUM(chunk_count), 0) FROM documents WHERE collection = ?",
+        (collection.name,)
+    ).fetchone()[0]
+    connection.close()
+
+    total = collection.count()
+
+    if recorded > total:
+        print(f"The document registry recorded {recorded} chunks of {collection.name} but it held {total}, forgetting its documents")
+        forget_collection(collection.name)
@@ -0,0 +1,213 @@
+'''
+This is our document session cache. A scraped page or uploaded file used to answer exactly one question: /api/query_document
+answered it, copied the chunks into the main collection and deleted the temporary collection, so every follow-up
+question meant scraping, chunking and embedding the whole document again.
+
+A document session kept the embedded document in an in-memory collection from ephemeral_store under a document ID,
+and it stayed queryable for as many questions as the user liked until it had not been used for the TTL. Adding the
+document to the main Ghana collection ("promotion") ran once per session as a background job on a single worker
+thread. It reused the embeddings already in memory and went through write_chunk_set, so the document registry,
+the BM25 index and the answer cache were all updated as for any other ingestion.
+'''
+
+
+
+#All Imports
+
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from chroma_utilities import new_chunk_set, write_chunk_set
+from ephemeral_store import EPHEMERAL_CONFIG, create_ephemeral_collection, get_ephemeral_collection, delete_ephemeral_collection
+
+
+
+#Session Configuration
+DOCUMENT_SESSION_CONFIG = {
+
+    #Sessions lived as long as their in-memory collection, which expired when it was not used for this many seconds
+    "ttl_seconds": EPHEMERAL_CONFIG["ttl_seconds"],
+
+    #We could turn off adding session documents to the main collection
+    "promote": os.environ.get("KIKI_PROMOTE_DOCUMENTS", "1") == "1",
+}
+
+
+#The live sessions by document ID, with their source, question count and promotion state
+DOCUMENT_SESSIONS = {}
+DOCUMENT_SESSIONS_LOCK = threading.Lock()
+
+#One worker promoted documents one after another, so promotions never competed with each other for the database
+PROMOTION_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="document-promotion")
+
+DOCUMENT_SESSION_STATS = {
+    "created": 0,
+    "questions": 0,
+    "promoted": 0,
+    "promotion_failures": 0,
+}
+
+
+def session_collection_name(document_id):
+    return f"document_{document_id}"
+
+
+def create_document_session(document_id, chunk_set, embedding_function):
+    """
+    This function keeps an embedded chunk set queryable under a document ID, replacing any earlier session with that ID
+    """
+    #Every upload got a new document ID, so we dropped the sessions whose collections had expired before adding one
+    prune_expired_sessions()
+
+    collection = create_ephemeral_collection(session_collection_name(document_id), embedding_function)
+    write_chunk_set(collection, chunk_set)
+
+    with DOCUMENT_SESSIONS_LOCK:
+        previous = DOCUMENT_SESSIONS.get(document_id)
+
+        #Re-scraping an unchanged page kept its pending or finished promotion, so it was never promoted twice
+        if previous is not None and previous["doc_hash"] == chunk_set["doc_hash"]:
+            promotion = previous["promotion"]
+        else:
+            promotion = None
+
+        DOCUMENT_SESSIONS[document_id] = {
+            "source": chunk_set["source"],
+            "doc_hash": chunk_set["doc_hash"],
+            "chunks": len(chunk_set["ids"]),
+            "created_at": time.time(),
+            "questions": 0,
+            "promotion": promotion,
+        }
+        DOCUMENT_SESSION_STATS["created"] += 1
+
+    return collection
+
+
+def get_document_session(document_id):
+    """
+    This function returns the session's collection and counts a question against it, or None if the session had expired
+    """
+    collection = get_ephemeral_collection(session_collection_name(document_id))
+
+    with DOCUMENT_SESSIONS_LOCK:
+        session = DOCUMENT_SESSIONS.get(document_id)
+
+        #The collection expired or was evicted from memory, so the session was over
+        if collection is None or session is None:
+            DOCUMENT_SESSIONS.pop(document_id, None)
+            return None
+
+        session["questions"] += 1
+        DOCUMENT_SESSION_STATS["questions"] += 1
+
+    return collection
+
+
+def close_document_session(document_id):
+    with DOCUMENT_SESSIONS_LOCK:
+        DOCUMENT_SESSIONS.pop(document_id, None)
+
+    delete_ephemeral_collection(session_collection_name(document_id))
+
+
+def run_promotion(document_id, source, doc_hash, session_collection, target_collection):
+    """
+    This is the background job that copied a session's chunks and embeddings into the main collection
+    """
+    try:
+        data = session_collection.get(include=["documents", "metadatas", "embeddings"])
+
+        chunk_set = new_chunk_set(source, doc_hash)
+        chunk_set["ids"] = data["ids"]
+        chunk_set["documents"] = data["documents"]
+        chunk_set["metadatas"] = data["metadatas"]
+        chunk_set["embeddings"] = data["embeddings"]
+
+        write_chunk_set(target_collection, chunk_set)
+        state = "done"
+
+    except Exception as e:
+        print(f"Error adding {source} to {target_collection.name}: {e}")
+        state = "failed"
+
+    with DOCUMENT_SESSIONS_LOCK:
+        session = DOCUMENT_SESSIONS.get(document_id)
+
+        #A session replaced by a different version of the document kept its own promotion state
+        if session is not None and session["doc_hash"] == doc_hash:
+            session["promotion"] = state
+
+        DOCUMENT_SESSION_STATS["promoted" if state == "done" else "promotion_failures"] += 1
+
+
+def promote_document(document_id, target_collection):
+    """
+    This function schedules the session's document to be added to the main collection, once per session
+    """
+    if not DOCUMENT_SESSION_CONFIG["promote"]:
+        return
+
+    session_collection = get_ephemeral_collection(session_collection_name(document_id))
+
+    with DOCUMENT_SESSIONS_LOCK:
+        session = DOCUMENT_SESSIONS.get(document_id)
+
+        if session is None or session_collection is None or session["promotion"] is not None:
+            return
+
+        session["promotion"] = "pending"
+
+    #We kept a reference to the collection so the job still had it if the session expired before it ran
+    PROMOTION_EXECUTOR.submit(
+        run_promotion, document_id, session["source"], session["doc_hash"], session_collection, target_collection
+    )
+
+
+def document_session_info(document_id):
+    """
+    This function returns what a client needed to know about a session
+    """
+    with DOCUMENT_SESSIONS_LOCK:
+        session = DOCUMENT_SESSIONS.get(document_id)
+
+        if session is None:
+            return None
+
+        return {
+            "document_id": document_id,
+            "source": session["source"],
+            "chunks": session["chunks"],
+            "questions": session["questions"],
+            "promotion": session["promotion"],
+            "expires_after_idle_seconds": DOCUMENT_SESSION_CONFIG["ttl_seconds"],
+        }
+
+
+def prune_expired_sessions():
+    """
+    This function drops the sessions whose in-memory collections had expired or been evicted
+    """
+    with DOCUMENT_SESSIONS_LOCK:
+        document_ids = list(DOCUMENT_SESSIONS)
+
+    for document_id in document_ids:
+        if get_ephemeral_collection(session_collection_name(document_id), touch=False) is None:
+            with DOCUMENT_SESSIONS_LOCK:
+                DOCUMENT_SESSIONS.pop(document_id, None)
+
+
+def get_document_session_stats():
+    """
+    This function returns the number of live sessions and our counters for the metrics endpoint
+    """
+
+    #We dropped sessions whose collections had expired before counting
+    prune_expired_sessions()
+
+    with DOCUMENT_SESSIONS_LOCK:
+        stats = dict(DOCUMENT_SESSION_STATS)
+        stats["sessions"] = len(DOCUMENT_SESSIONS)
+
+    return stats
@@ -0,0 +1,92 @@
+'''
+This is our query embedding cache. Embedding a question with the SentenceTransformer model was the
+most expensive part of retrieval, and popular questions were asked again and again, so we kept the
+most recently used query embeddings in an LRU cache keyed by the normalized question text.
+
+The cache also let one embedding serve both the primary and the fallback distance threshold in rag_query.
+'''
+
+
+
+#All Imports
+
+import os
+import threading
+from collections import OrderedDict
+
+
+
+#Cache Configuration - We capped the number of query embeddings kept in memory
+EMBEDDING_CACHE_CONFIG = {
+    "max_entries": int(os.environ.get("KIKI_EMBEDDING_CACHE_SIZE", 2048)),
+}
+
+
+#The cache itself, ordered from least to most recently used
+EMBEDDING_CACHE = OrderedDict()
+EMBEDDING_CACHE_LOCK = threading.Lock()
+
+EMBEDDING_CACHE_STATS = {
+    "hits": 0,
+    "misses": 0,
+}
+
+
+def normalize_query(text):
+    """
+    This function normalizes a question so that small differences in case and spacing shared one cache entry
+    """
+    return " ".join(text.lower().split())
+
+
+def embed_query(text, embedding_function):
+    """
+    This function returns the embedding for a question, computing it only when it was not already cached
+    """
+
+    key = normalize_query(text)
+
+    with EMBEDDING_CACHE_LOCK:
+        embedding = EMBEDDING_CACHE.get(key)
+
+        if embedding is not None:
+            EMBEDDING_CACHE.move_to_end(key)
+            EMBEDDING_CACHE_STATS["hits"] += 1
+            return embedding
+
+        EMBEDDING_CACHE_STATS["misses"] += 1
+
+    #We computed the embedding outside the lock so other questions were not blocked meanwhile
+    embedding = embedding_function([key])[0]
+
+    with EMBEDDING_CACHE_LOCK:
+        EMBEDDING_CACHE[key] = embedding
+        EMBEDDING_CACHE.move_to_end(key)
+
+        while len(EMBEDDING_CACHE) > EMBEDDING_CACHE_CONFIG["max_entries"]:
+            EMBEDDING_CACHE.popitem(last=False)
+
+    return embedding
+
+
+def clear_embedding_cache():
+    """
+    This function empties the cache, for example after switching the embedding model
+    """
+    with EMBEDDING_CACHE_LOCK:
+        EMBEDDING_CACHE.clear()
+
+
+def get_embedding_cache_stats():
+    """
+    This function returns the cache size and hit/miss counters for our metrics endpoint
+    """
+    with EMBEDDING_CACHE_LOCK:
+        stats = dict(EMBEDDING_CACHE_STATS)
+        stats["size"] = len(EMBEDDING_CACHE)
+
+    lookups = stats["hits"] + stats["misses"]
+    stats["max_entries"] = EMBEDDING_CACHE_CONFIG["max_entries"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+
+    return stats
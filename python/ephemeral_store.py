@@ -0,0 +1,312 @@
+'''
+This is our in-memory store for throwaway retrieval. Answering a question about a single uploaded file or
+scraped page used to create and delete a collection in the on-disk PersistentClient for every request,
+which touched SQLite and the HNSW files, and two users sharing the temp_rag_file name could overwrite
+each other's document in the middle of a request.
+
+We kept these temporary documents in RAM instead. Each ephemeral collection held its embeddings in a NumPy
+matrix and answered queries with a brute-force dot product, which was faster than an index for a single document.
+It behaved like the parts of a ChromaDB collection our code used (upsert, get, query, delete, count and name),
+so rag_query and our chunk writers worked with it unchanged.
+Collections expired after a TTL and the least recently used ones were evicted when the store grew past its memory cap.
+'''
+
+
+
+#All Imports
+
+import os
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
+
+
+
+#Store Configuration - These settings bounded how long and how much we kept in RAM
+EPHEMERAL_CONFIG = {
+
+    #We dropped collections that had not been used for this many seconds
+    "ttl_seconds": int(os.environ.get("KIKI_EPHEMERAL_TTL", 30 * 60)),
+
+    #We evicted the least recently used collections when the embeddings and text went above this size
+    "max_bytes": int(os.environ.get("KIKI_EPHEMERAL_MAX_MB", 256)) * 1024 * 1024,
+}
+
+
+#All live collections, ordered from least to most recently used
+EPHEMERAL_COLLECTIONS = OrderedDict()
+EPHEMERAL_LOCK = threading.RLock()
+
+EPHEMERAL_STATS = {
+    "created": 0,
+    "expired": 0,
+    "evicted": 0,
+}
+
+
+def value_matches(value, condition):
+    """
+    This function checks a single metadata value against a Chroma style condition such as 5 or {"$gte": 2020}
+    """
+
+    if not isinstance(condition, dict):
+        return value == condition
+
+    for operator, operand in condition.items():
+        if operator == "$eq" and not value == operand:
+            return False
+        if operator == "$ne" and not value != operand:
+            return False
+        if operator == "$in" and value not in operand:
+            return False
+        if operator == "$nin" and value in operand:
+            return False
+
+        #Comparisons against a missing value never matched, like in ChromaDB
+        if operator in ("$gt", "$gte", "$lt", "$lte"):
+            if value is None:
+                return False
+            if operator == "$gt" and not value > operand:
+                return False
+            if operator == "$gte" and not value >= operand:
+                return False
+            if operator == "$lt" and not value < operand:
+                return False
+            if operator == "$lte" and not value <= operand:
+                return False
+
+    return True
+
+
+def metadata_matches(metadata, where):
+    """
+    This function evaluates a Chroma style where filter, including $and and $or, against one chunk's metadata
+    """
+
+    if not where:
+        return True
+
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(metadata_matches(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(metadata_matches(metadata, clause) for clause in condition):
+                return False
+        elif not value_matches(metadata.get(key), condition):
+            return False
+
+    return True
+
+
+class EphemeralCollection:
+    """
+    A small in-memory collection with the subset of the ChromaDB collection interface we used
+    """
+
+    def __init__(self, name, embedding_function):
+        self.name = name
+        self.embedding_function = embedding_function
+        self.ids = []
+        self.documents = []
+        self.metadatas = []
+        self.embeddings = None
+        self.positions = {}
+        self.lock = threading.Lock()
+        self.last_access = time.time()
+
+    def count(self):
+        return len(self.ids)
+
+    def nbytes(self):
+        """
+        The approximate memory used by the embeddings and the chunk text
+        """
+        embedding_bytes = self.embeddings.nbytes if self.embeddings is not None else 0
+        return embedding_bytes + sum(len(document) for document in self.documents)
+
+    def upsert(self, ids, documents, metadatas=None, embeddings=None):
+        if embeddings is None:
+            embeddings = self.embedding_function(documents)
+
+        vectors = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+        metadatas = metadatas or [{} for _ in ids]
+
+        with self.lock:
+            new_rows = []
+
+            for chunk_id, document, metadata, vector in zip(ids, documents, metadatas, vectors):
+                position = self.positions.get(chunk_id)
+
+                #We replaced chunks that were already present, just like ChromaDB upsert
+                if position is not None:
+                    self.documents[position] = document
+                    self.metadatas[position] = metadata
+                    self.embeddings[position] = vector
+                    continue
+
+                self.positions[chunk_id] = len(self.ids) + len(new_rows)
+                new_rows.append((chunk_id, document, metadata, vector))
+
+            if new_rows:
+                self.ids.extend(row[0] for row in new_rows)
+                self.documents.extend(row[1] for row in new_rows)
+                self.metadatas.extend(row[2] for row in new_rows)
+                new_vectors = np.stack([row[3] for row in new_rows])
+                self.embeddings = new_vectors if self.embeddings is None else np.vstack([self.embeddings, new_vectors])
+
+        enforce_memory_cap()
+
+    def add(self, ids, documents, metadatas=None, embeddings=None):
+        self.upsert(ids, documents, metadatas, embeddings)
+
+    def delete(self, ids=None, where=None):
+        with self.lock:
+            doomed = set(ids or [])
+            if where:
+                doomed.update(chunk_id for chunk_id, metadata in zip(self.ids, self.metadatas) if metadata_matches(metadata, where))
+
+            keep = [i for i, chunk_id in enumerate(self.ids) if chunk_id not in doomed]
+            if len(keep) == len(self.ids):
+                return
+
+            self.ids = [self.ids[i] for i in keep]
+            self.documents = [self.documents[i] for i in keep]
+            self.metadatas = [self.metadatas[i] for i in keep]
+            self.embeddings = self.embeddings[keep] if keep else None
+            self.positions = {chunk_id: i for i, chunk_id in enumerate(self.ids)}
+
+    def get(self, ids=None, where=None, include=None):
+        include = ["documents", "metadatas"] if include is None else include
+        self.last_access = time.time()
+
+        with self.lock:
+            if ids is not None:
+                rows = [self.positions[chunk_id] for chunk_id in ids if chunk_id in self.positions]
+            else:
+                rows = range(len(self.ids))
+
+            rows = [i for i in rows if metadata_matches(self.metadatas[i], where)]
+
+            return {
+                "ids": [self.ids[i] for i in rows],
+                "documents": [self.documents[i] for i in rows] if "documents" in include else None,
+                "metadatas": [self.metadatas[i] for i in rows] if "metadatas" in include else None,
+                "embeddings": [self.embeddings[i].tolist() for i in rows] if "embeddings" in include else None,
+            }
+
+    def query(self, query_embeddings=None, query_texts=None, n_results=10, where=None, include=None):
+        if query_embeddings is None:
+            query_embeddings = self.embedding_function(query_texts)
+
+        self.last_access = time.time()
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+
+        with self.lock:
+            rows = np.array([i for i, metadata in enumerate(self.metadatas) if metadata_matches(metadata, where)], dtype=np.int64)
+
+            for query in queries:
+                if rows.size == 0:
+                    for key in results:
+                        results[key].append([])
+                    continue
+
+                candidates = self.embeddings[rows]
+
+                #We returned squared L2 distances, the same space as our ChromaDB collections,
+                #so the existing relevance thresholds kept their meaning. ||a-b||^2 = ||a||^2 + ||b||^2 - 2ab
+                distances = np.einsum("ij,ij->i", candidates, candidates) + float(np.dot(query, query)) - 2.0 * (candidates @ query)
+                distances = np.maximum(distances, 0.0)
+
+                k = min(n_results, rows.size)
+                top = np.argpartition(distances, k - 1)[:k]
+                top = top[np.argsort(distances[top])]
+
+                results["ids"].append([self.ids[rows[i]] for i in top])
+                results["documents"].append([self.documents[rows[i]] for i in top])
+                results["metadatas"].append([self.metadatas[rows[i]] for i in top])
+                results["distances"].append([float(distances[i]) for i in top])
+
+        return results
+
+
+def remove_expired_collections(now=None):
+    """
+    This function drops collections that were not used within the TTL
+    """
+    now = now or time.time()
+    oldest_allowed = now - EPHEMERAL_CONFIG["ttl_seconds"]
+
+    with EPHEMERAL_LOCK:
+        expired = [name for name, collection in EPHEMERAL_COLLECTIONS.items() if collection.last_access < oldest_allowed]
+        for name in expired:
+            del EPHEMERAL_COLLECTIONS[name]
+        EPHEMERAL_STATS["expired"] += len(expired)
+
+
+def enforce_memory_cap():
+    """
+    This function evicts the least recently used collections until the store fitted in its memory cap.
+    The most recently used collection was always kept, even when it was larger than the cap on its own.
+    """
+    with EPHEMERAL_LOCK:
+        total = sum(collection.nbytes() for collection in EPHEMERAL_COLLECTIONS.values())
+
+        while total > EPHEMERAL_CONFIG["max_bytes"] and len(EPHEMERAL_COLLECTIONS) > 1:
+            _, evicted = EPHEMERAL_COLLECTIONS.popitem(last=False)
+            total -= evicted.nbytes()
+            EPHEMERAL_STATS["evicted"] += 1
+
+
+def create_ephemeral_collection(name, embedding_function):
+    """
+    This function creates an empty in-memory collection, replacing any previous collection with the same name
+    """
+    remove_expired_collections()
+
+    collection = EphemeralCollection(name, embedding_function)
+
+    with EPHEMERAL_LOCK:
+        EPHEMERAL_COLLECTIONS.pop(name, None)
+        EPHEMERAL_COLLECTIONS[name] = collection
+        EPHEMERAL_STATS["created"] += 1
+
+    return collection
+
+
+def get_ephemeral_collection(name, touch=True):
+    """
+    This function returns a live in-memory collection by name, or None if it never existed or had expired.
+    With touch=False, looking the collection up did not count as using it.
+    """
+    remove_expired_collections()
+
+    with EPHEMERAL_LOCK:
+        collection = EPHEMERAL_COLLECTIONS.get(name)
+
+        if collection is not None and touch:
+            collection.last_access = time.time()
+            EPHEMERAL_COLLECTIONS.move_to_end(name)
+
+    return collection
+
+
+def delete_ephemeral_collection(name):
+    with EPHEMERAL_LOCK:
+        EPHEMERAL_COLLECTIONS.pop(name, None)
+
+
+def get_ephemeral_store_stats():
+    """
+    This function returns the number of live collections, their memory use and our counters for the metrics endpoint
+    """
+    with EPHEMERAL_LOCK:
+        stats = dict(EPHEMERAL_STATS)
+        stats["collections"] = len(EPHEMERAL_COLLECTIONS)
+        stats["bytes"] = sum(collection.nbytes() for collection in EPHEMERAL_COLLECTIONS.values())
+
+    stats["max_bytes"] = EPHEMERAL_CONFIG["max_bytes"]
+    return stats
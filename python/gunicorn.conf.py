@@ -0,0 +1,44 @@
+'''
+This is our gunicorn configuration for serving Kiki in production. Every setting could be overridden with an
+environment variable so the same file worked locally, in Docker and on Hugging Face Spaces.
+
+We used threaded workers: one Gemma model per worker process, with many request threads sharing it through our
+inference scheduler. More workers meant more model copies in RAM, so one worker was the default.
+'''
+
+
+
+#All Imports
+
+import os
+
+
+
+#We listened on PORT like the development server did (7860 on Hugging Face Spaces, 5081 locally)
+bind = f"0.0.0.0:{os.environ.get('PORT', 5081)}"
+
+#Each worker process loaded its own copy of the model, about 1.6GB for Gemma 2B
+workers = int(os.environ.get("KIKI_WORKERS", 1))
+
+#Threads per worker handled concurrent requests, streaming responses and uploads while the model was busy
+worker_class = "gthread"
+threads = int(os.environ.get("KIKI_THREADS", 8))
+
+#Generations and document uploads could take minutes on CPU, and the first request of a worker waited for the model to load
+timeout = int(os.environ.get("KIKI_TIMEOUT", 300))
+graceful_timeout = int(os.environ.get("KIKI_GRACEFUL_TIMEOUT", 30))
+
+#We kept idle browser connections open for a few seconds so follow-up requests skipped the TCP handshake
+keepalive = int(os.environ.get("KIKI_KEEPALIVE", 5))
+
+#We never loaded the app in the master process: llama.cpp contexts and torch threads do not survive a fork,
+#so each worker imported wsgi.py and loaded the models itself after it was forked
+preload_app = False
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.environ.get("KIKI_LOG_LEVEL", "info")
+
+
+def post_fork(server, worker):
+    server.log.info(f"Worker {worker.pid} forked, loading the models in this worker")
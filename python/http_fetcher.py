@@ -0,0 +1,282 @@
+'''
+This is our HTTP fetch layer for scraping. scrape_url used to call requests.get for every URL, which opened a new
+connection each time, gave up after a single 15 second attempt and downloaded the whole page again on every re-scrape.
+
+All fetches now went through one shared requests.Session whose connection pool was reused across URLs and threads.
+Failed connections and 429/5xx answers were retried with exponential backoff, honouring Retry-After. A semaphore per
+host stopped us from opening too many connections to one government site when we fetched many URLs concurrently.
+Successful responses that had an ETag or Last-Modified header were kept in an on-disk cache, and later fetches sent
+If-None-Match / If-Modified-Since, so a page that had not changed came back as a small 304 and we used the cached body.
+'''
+
+
+
+#All Imports
+
+import os
+import json
+import time
+import hashlib
+import threading
+import requests
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(SCRIPT_DIR)
+
+
+#Fetch Configuration - These settings controlled timeouts, retries, concurrency and the response cache
+FETCH_CONFIG = {
+
+    #Seconds to wait for a connection and then for each read
+    "connect_timeout": float(os.environ.get("KIKI_FETCH_CONNECT_TIMEOUT", 5)),
+    "read_timeout": float(os.environ.get("KIKI_FETCH_TIMEOUT", 30)),
+
+    #Retries after the first attempt, waiting backoff_factor * 2^(retry - 1) seconds between them
+    "retries": int(os.environ.get("KIKI_FETCH_RETRIES", 3)),
+    "backoff_factor": float(os.environ.get("KIKI_FETCH_BACKOFF", 0.5)),
+    "retry_statuses": (429, 500, 502, 503, 504),
+
+    #At most this many requests to the same host at once, and this many URLs fetched at once overall
+    "per_host_limit": int(os.environ.get("KIKI_FETCH_PER_HOST", 4)),
+    "max_workers": int(os.environ.get("KIKI_FETCH_WORKERS", 8)),
+
+    #Connections kept open per host in the shared pool
+    "pool_size": 32,
+
+    "cache_enabled": os.environ.get("KIKI_HTTP_CACHE", "1") == "1",
+    "cache_dir": os.environ.get("KIKI_HTTP_CACHE_DIR", os.path.join(BASE_DIR, "http_cache")),
+}
+
+
+#The browser-like headers we always sent, because several sites blocked the default requests user agent
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Accept-Encoding': 'gzip, deflate',
+    'DNT': '1',
+    'Upgrade-Insecure-Requests': '1',
+}
+
+
+#The shared session, created on first use
+_session = None
+_session_lock = threading.Lock()
+
+#One semaphore per host
+HOST_LIMITS = {}
+HOST_LIMITS_LOCK = threading.Lock()
+
+FETCH_STATS = {
+    "requests": 0,
+    "not_modified": 0,
+    "cache_hits_bytes": 0,
+    "downloaded_bytes": 0,
+    "errors": 0,
+}
+FETCH_STATS_LOCK = threading.Lock()
+
+
+def get_session():
+    """
+    This function returns the shared session with its connection pool and retry policy
+    """
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=FETCH_CONFIG["retries"],
+                connect=FETCH_CONFIG["retries"],
+                read=FETCH_CONFIG["retries"],
+                status=FETCH_CONFIG["retries"],
+                backoff_factor=FETCH_CONFIG["backoff_factor"],
+                status_forcelist=FETCH_CONFIG["retry_statuses"],
+                allowed_methods=frozenset(["GET", "HEAD"]),
+                respect_retry_after_header=True,
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(
+                pool_connections=FETCH_CONFIG["pool_size"],
+                pool_maxsize=FETCH_CONFIG["pool_size"],
+                max_retries=retry,
+            )
+
+            session = requests.Session()
+            session.headers.update(DEFAULT_HEADERS)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+
+    return _session
+
+
+def reset_session():
+    """
+    This function closes the shared session so the next fetch built a new one, for example after changing FETCH_CONFIG
+    """
+    global _session
+
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+def host_limit(url):
+    host = urlparse(url).netloc.lower()
+
+    with HOST_LIMITS_LOCK:
+        if host not in HOST_LIMITS:
+            HOST_LIMITS[host] = threading.BoundedSemaphore(FETCH_CONFIG["per_host_limit"])
+        return HOST_LIMITS[host]
+
+
+def cache_paths(url):
+    key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    return os.path.join(FETCH_CONFIG["cache_dir"], f"{key}.json"), os.path.join(FETCH_CONFIG["cache_dir"], f"{key}.body")
+
+
+def read_cache(url):
+    """
+    This function returns the cached validators and body for a URL, or None
+    """
+    if not FETCH_CONFIG["cache_enabled"]:
+        return None
+
+    meta_path, body_path = cache_paths(url)
+
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(body_path, "rb") as f:
+            meta["content"] = f.read()
+    except (OSError, ValueError):
+        return None
+
+    return meta
+
+
+def write_cache(url, response):
+    """
+    This function stores a response that could be revalidated later. We wrote to temporary files and renamed them,
+    so a crash or a concurrent fetch never left a half written entry behind.
+    """
+    if not FETCH_CONFIG["cache_enabled"]:
+        return
+
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+
+    if not etag and not last_modified:
+        return
+
+    os.makedirs(FETCH_CONFIG["cache_dir"], exist_ok=True)
+    meta_path, body_path = cache_paths(url)
+    suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+
+    meta = {
+        "url": url,
+        "etag": etag,
+        "last_modified": last_modified,
+        "content_type": response.headers.get("Content-Type", ""),
+        "fetched_at": time.time(),
+    }
+
+    try:
+        with open(body_path + suffix, "wb") as f:
+            f.write(response.content)
+        with open(meta_path + suffix, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+        os.replace(body_path + suffix, body_path)
+        os.replace(meta_path + suffix, meta_path)
+    except OSError as e:
+        print(f"Warning: could not cache {url}: {e}")
+
+
+def record(**counts):
+    with FETCH_STATS_LOCK:
+        for name, count in counts.items():
+            FETCH_STATS[name] += count
+
+
+def fetch(url, headers=None):
+    """
+    This function fetches a URL through the shared session and the response cache.
+    It returns a dictionary with the status, content, content type and whether the content came from the cache.
+    Network errors that were still failing after the retries were raised.
+    """
+    request_headers = dict(headers or {})
+    cached = read_cache(url)
+
+    if cached is not None:
+        if cached.get("etag"):
+            request_headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            request_headers["If-Modified-Since"] = cached["last_modified"]
+
+    timeout = (FETCH_CONFIG["connect_timeout"], FETCH_CONFIG["read_timeout"])
+
+    try:
+        with host_limit(url):
+            response = get_session().get(url, headers=request_headers, timeout=timeout)
+    except requests.RequestException:
+        record(requests=1, errors=1)
+        raise
+
+    #The page had not changed since we cached it, so we only transferred the headers
+    if response.status_code == 304 and cached is not None:
+        record(requests=1, not_modified=1, cache_hits_bytes=len(cached["content"]))
+
+        return {
+            "url": url,
+            "status": 200,
+            "content": cached["content"],
+            "content_type": cached.get("content_type", ""),
+            "from_cache": True,
+        }
+
+    record(requests=1, downloaded_bytes=len(response.content))
+
+    if response.status_code == 200:
+        write_cache(url, response)
+
+    return {
+        "url": url,
+        "status": response.status_code,
+        "content": response.content,
+        "content_type": response.headers.get("Content-Type", ""),
+        "from_cache": False,
+    }
+
+
+def fetch_many(urls, headers=None, max_workers=None):
+    """
+    This function fetches URLs concurrently and yields (url, result, error) as each one finished.
+    Exactly one of result and error was None.
+    """
+    max_workers = max_workers or FETCH_CONFIG["max_workers"]
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fetch") as pool:
+        futures = {pool.submit(fetch, url, headers): url for url in urls}
+
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except Exception as e:
+                yield futures[future], None, e
+
+
+def get_fetch_stats():
+    """
+    This function returns our fetch counters
+    """
+    with FETCH_STATS_LOCK:
+        return dict(FETCH_STATS)
@@ -0,0 +1,305 @@
+'''
+This is our inference scheduler that sits between the Flask routes and the Gemma model replicas.
+llama-cpp models are not safe to call from several threads at once, so every generation request
+is placed on a bounded priority queue and picked up by one worker thread per model replica.
+
+Interactive chat requests are served before background work such as memory summarization,
+and when the queue is full new requests are rejected straight away so the server can answer
+with 503 and a Retry-After header instead of letting latency grow without limit.
+'''
+
+
+
+#All Imports
+
+import os
+import time
+import queue
+import itertools
+import threading
+
+
+
+#Scheduler Configuration - These settings controlled how many requests we accepted and how many replicas served them
+SCHEDULER_CONFIG = {
+
+    #We allowed running more than one copy of the model, with the CPU threads split between them
+    "replicas": int(os.environ.get("KIKI_MODEL_REPLICAS", 1)),
+
+    #We capped the number of waiting requests, anything above this was rejected
+    "max_queue": int(os.environ.get("KIKI_MAX_QUEUE", 16)),
+
+    #We told rejected clients how many seconds to wait before retrying
+    "retry_after": int(os.environ.get("KIKI_RETRY_AFTER", 10)),
+
+    #We waited this many seconds for the workers to finish their jobs when stopping, before giving up on them
+    "stop_timeout": float(os.environ.get("KIKI_STOP_TIMEOUT", 10)),
+}
+
+
+#Request priorities - lower numbers were served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+
+class SchedulerBusyError(Exception):
+    """
+    Raised when the request queue is full and a new inference request could not be admitted
+    """
+    pass
+
+
+#Scheduler state shared by the workers
+JOB_QUEUE = None
+WORKERS = []
+STOP_EVENT = None
+
+#How often an idle worker checked whether it had been asked to stop
+WORKER_POLL_SECONDS = 0.5
+
+#We used a sequence counter so requests with the same priority were served in arrival order
+_sequence = itertools.count()
+
+_stats_lock = threading.Lock()
+SCHEDULER_STATS = {
+    "submitted": 0,
+    "completed": 0,
+    "failed": 0,
+    "rejected": 0,
+    "in_flight": 0,
+    "total_wait_seconds": 0.0,
+    "total_run_seconds": 0.0,
+}
+
+
+def start_scheduler(models):
+    """
+    This function starts one worker thread for every loaded model replica
+    """
+    global JOB_QUEUE, WORKERS, STOP_EVENT
+
+    stop_scheduler()
+
+    JOB_QUEUE = queue.PriorityQueue(maxsize=SCHEDULER_CONFIG["max_queue"])
+    WORKERS = []
+    STOP_EVENT = threading.Event()
+
+    for index, model in enumerate(models):
+        worker = threading.Thread(
+            target=worker_loop,
+            args=(JOB_QUEUE, model, STOP_EVENT),
+            name=f"inference-worker-{index}",
+            daemon=True
+        )
+        worker.start()
+        WORKERS.append(worker)
+
+    print(f"Inference scheduler started with {len(WORKERS)} worker(s)")
+
+
+def stop_scheduler(timeout=None):
+    """
+    This function stops accepting requests, lets the workers finish the jobs already queued and waits for them to exit.
+    It returned True when every worker had exited, and False when some were still running a job after the timeout,
+    in which case their model replicas must not be closed.
+    """
+    global JOB_QUEUE, WORKERS, STOP_EVENT
+
+    if JOB_QUEUE is None:
+        return True
+
+    job_queue, workers = JOB_QUEUE, WORKERS
+
+    #New requests were rejected from here on
+    JOB_QUEUE = None
+    WORKERS = []
+    STOP_EVENT.set()
+
+    #We sent one stop signal per worker, with the lowest urgency so pending work finished first. We never blocked on a
+    #full queue: workers that got no signal stopped on their own once the queue was empty and the stop event was set
+    for _ in workers:
+        try:
+            job_queue.put_nowait((float("inf"), next(_sequence), None))
+        except queue.Full:
+            break
+
+    deadline = time.time() + (SCHEDULER_CONFIG["stop_timeout"] if timeout is None else timeout)
+
+    for worker in workers:
+        worker.join(max(0.0, deadline - time.time()))
+
+    running = [worker.name for worker in workers if worker.is_alive()]
+
+    if running:
+        print(f"Warning: inference workers still running after stopping the scheduler: {', '.join(running)}")
+
+    return not running
+
+
+def scheduler_running():
+    """
+    This function reports whether there are workers available to take inference requests
+    """
+    return JOB_QUEUE is not None and len(WORKERS) > 0
+
+
+def update_stats(**changes):
+    with _stats_lock:
+        for key, value in changes.items():
+            SCHEDULER_STATS[key] += value
+
+
+def worker_loop(job_queue, model, stop_event):
+    """
+    This is the loop each worker thread runs: take the most urgent job and run it on our model replica
+    """
+
+    while True:
+        try:
+            priority, sequence, job = job_queue.get(timeout=WORKER_POLL_SECONDS)
+        except queue.Empty:
+            if stop_event.is_set():
+                return
+            continue
+
+        #A missing job was the signal to stop
+        if job is None:
+            return
+
+        started = time.time()
+        update_stats(in_flight=1, total_wait_seconds=started - job["queued_at"])
+
+        try:
+            if job["stream"]:
+                run_stream_job(job, model)
+            else:
+                job["result"] = job["fn"](model)
+            update_stats(completed=1)
+
+        except Exception as e:
+            job["error"] = e
+            if job["stream"]:
+                job["output"].put(("error", e))
+            update_stats(failed=1)
+
+        finally:
+            update_stats(in_flight=-1, total_run_seconds=time.time() - started)
+            job["done"].set()
+
+
+def run_stream_job(job, model):
+    """
+    This function forwards every item produced by a streaming job to the waiting request thread
+    """
+
+    #We skipped jobs whose client had already gone away while they were queued
+    if job["cancelled"]:
+        job["output"].put(("end", None))
+        return
+
+    iterator = job["fn"](model)
+
+    try:
+        for item in iterator:
+
+            #We stopped generating as soon as the client went away
+            if job["cancelled"]:
+                break
+
+            job["output"].put(("item", item))
+    finally:
+        if hasattr(iterator, "close"):
+            iterator.close()
+
+    job["output"].put(("end", None))
+
+
+def submit(fn, priority=PRIORITY_INTERACTIVE, stream=False):
+    """
+    This function places a job on the queue, or raises SchedulerBusyError when the queue is full
+    """
+
+    if not scheduler_running():
+        raise RuntimeError("Inference scheduler is not running")
+
+    job = {
+        "fn": fn,
+        "stream": stream,
+        "queued_at": time.time(),
+        "done": threading.Event(),
+        "result": None,
+        "error": None,
+        "cancelled": False,
+        "output": queue.Queue() if stream else None,
+    }
+
+    try:
+        JOB_QUEUE.put_nowait((priority, next(_sequence), job))
+    except queue.Full:
+        update_stats(rejected=1)
+        raise SchedulerBusyError("Too many requests are waiting for the model")
+
+    update_stats(submitted=1)
+    return job
+
+
+def run_inference(fn, priority=PRIORITY_INTERACTIVE):
+    """
+    Run fn(model) on the next free model replica and return its result
+    """
+
+    job = submit(fn, priority=priority)
+    job["done"].wait()
+
+    if job["error"] is not None:
+        raise job["error"]
+
+    return job["result"]
+
+
+def stream_inference(fn, priority=PRIORITY_INTERACTIVE):
+    """
+    Run fn(model), which returns an iterator, on the next free model replica.
+
+    The job is admitted straight away so a full queue raises SchedulerBusyError here,
+    and the returned generator yields the items as the worker produces them.
+    """
+
+    job = submit(fn, priority=priority, stream=True)
+    return iterate_stream_job(job)
+
+
+def iterate_stream_job(job):
+
+    try:
+        while True:
+            kind, value = job["output"].get()
+
+            if kind == "item":
+                yield value
+            elif kind == "error":
+                raise value
+            else:
+                return
+    finally:
+        #We marked the job as cancelled so the worker stopped if the consumer left early
+        job["cancelled"] = True
+
+
+def get_scheduler_stats():
+    """
+    This function returns the current queue depth and the request counters for our metrics endpoint
+    """
+
+    with _stats_lock:
+        stats = dict(SCHEDULER_STATS)
+
+    finished = stats["completed"] + stats["failed"]
+
+    stats["queue_depth"] = JOB_QUEUE.qsize() if JOB_QUEUE is not None else 0
+    stats["max_queue"] = SCHEDULER_CONFIG["max_queue"]
+    stats["workers"] = len(WORKERS)
+    stats["avg_wait_seconds"] = stats["total_wait_seconds"] / finished if finished else 0.0
+    stats["avg_run_seconds"] = stats["total_run_seconds"] / finished if finished else 0.0
+
+    return stats
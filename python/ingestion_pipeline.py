@@ -0,0 +1,305 @@
+'''
+This is our pipelined ingestion engine for rebuilding the Ghana_chatbot collection.
+Before this, populate_db.py opened, cleaned, chunked, embedded and upserted one PDF at a time,
+so the CPU sat idle while a file was read and the disk sat idle while chunks were embedded.
+
+We split the work into three overlapping stages:
+    1. extraction and chunking of PDFs in a process pool (URLs were fetched in a thread pool instead),
+    2. embedding of chunks from many documents together in large CPU batches,
+    3. a writer thread that upserted the embedded batches into ChromaDB.
+
+The document registry acted as our checkpoint: a document was only recorded once all of its changed chunks
+were written, so a crashed or interrupted run could be started again without redoing the finished files,
+and unchanged files were skipped before they were even opened.
+'''
+
+
+
+#All Imports
+
+import os
+import time
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from document_registry import is_tracked, file_sha256, document_unchanged
+from chroma_utilities import pdf_to_chunks, url_to_chunks, upsert_chunks, plan_chunk_set, finalize_document
+
+
+
+#Ingestion Configuration - These settings controlled how much work ran in parallel
+INGESTION_CONFIG = {
+
+    #We left one core free for the embedding stage
+    "extract_workers": int(os.environ.get("KIKI_INGEST_WORKERS", max(1, (os.cpu_count() or 2) - 1))),
+
+    #We fetched URLs with more threads since they mostly waited on the network
+    "fetch_workers": int(os.environ.get("KIKI_FETCH_WORKERS", 8)),
+
+    #We embedded this many chunks at a time, across document boundaries
+    "embed_batch_size": int(os.environ.get("KIKI_EMBED_BATCH_SIZE", 256)),
+
+    #We let the embedder run at most this many batches ahead of the writer
+    "write_queue_size": 4,
+}
+
+
+#How often the producer checked that the writer thread was still alive while the write queue was full
+WRITER_CHECK_SECONDS = 1.0
+
+
+def extract_pdf(path, doc_hash):
+    """
+    This function runs in a worker process: it extracted and chunked one PDF
+    """
+    return pdf_to_chunks(path, doc_hash=doc_hash)
+
+
+def writer_loop(write_queue, collection, finalize_lock, remaining_chunks, stats, writer_error):
+    """
+    This is the writer stage: it upserted embedded batches and recorded documents whose changed chunks were all written.
+    An unexpected error was stored in writer_error before the thread ended, so the producer could stop waiting for it.
+    """
+
+    try:
+        while True:
+            batch = write_queue.get()
+
+            if batch is None:
+                return
+
+            try:
+                upsert_chunks(
+                    collection,
+                    documents=batch["documents"],
+                    ids=batch["ids"],
+                    metadatas=batch["metadatas"],
+                    embeddings=batch["embeddings"]
+                )
+                stats["chunks_written"] += len(batch["ids"])
+
+            except Exception as e:
+                print(f"Error writing batch of {len(batch['ids'])} chunks: {e}")
+                stats["failed_batches"] += 1
+                continue
+
+            #We recorded a document once the last of its chunks had been written
+            for key in batch["keys"]:
+                remaining_chunks[key]["count"] -= 1
+
+                if remaining_chunks[key]["count"] == 0:
+                    document = remaining_chunks.pop(key)
+                    with finalize_lock:
+                        finalize_safely(collection, document, stats)
+
+    except Exception as e:
+        print(f"Error in the ingestion writer, stopping: {e}")
+        writer_error.append(e)
+
+
+def finalize_safely(collection, document, stats):
+    """
+    This function finalizes a document and counts a failure instead of raising. The document was then not recorded,
+    so the next run wrote it again.
+    """
+    try:
+        finalize(collection, document)
+    except Exception as e:
+        print(f"Error recording {document['chunk_set']['source']}: {e}")
+        stats["failed_documents"] += 1
+
+
+def finalize(collection, document):
+    """
+    This function deletes a finished document's stale chunks and records it in the registry
+    """
+    if document["chunk_hashes"] is None:
+        return
+
+    finalize_document(collection, document["chunk_set"], document["chunk_hashes"], document["orphan_ids"])
+
+
+def run_pipeline(produced, collection, embedding_function):
+    """
+    This function consumes chunk sets as the first stage produced them, works out which chunks changed,
+    embeds those in large batches and hands the batches to the writer thread
+    """
+
+    batch_size = INGESTION_CONFIG["embed_batch_size"]
+    write_queue = queue.Queue(maxsize=INGESTION_CONFIG["write_queue_size"])
+    tracked = is_tracked(collection.name)
+
+    remaining_chunks = {}
+    finalize_lock = threading.Lock()
+    stats = {"documents": 0, "chunks_total": 0, "chunks_written": 0, "stale_removed": 0, "failed_batches": 0, "failed_documents": 0}
+    writer_error = []
+
+    writer = threading.Thread(
+        target=writer_loop,
+        args=(write_queue, collection, finalize_lock, remaining_chunks, stats, writer_error),
+        daemon=True
+    )
+    writer.start()
+
+    def hand_to_writer(item):
+        #The queue was bounded, so we never blocked on it for good: if the writer had died we stopped with its error
+        while True:
+            try:
+                write_queue.put(item, timeout=WRITER_CHECK_SECONDS)
+                return
+            except queue.Full:
+                if not writer.is_alive():
+                    raise RuntimeError(f"The ingestion writer stopped: {writer_error[0] if writer_error else 'unknown error'}")
+
+    pending = {"keys": [], "ids": [], "documents": [], "metadatas": []}
+
+    def flush():
+        if not pending["ids"]:
+            return
+
+        #We embedded the whole batch in one call, which kept the CPU busy with large matrix operations
+        batch = dict(pending)
+        batch["embeddings"] = embedding_function(batch["documents"])
+        hand_to_writer(batch)
+
+        pending["keys"], pending["ids"], pending["documents"], pending["metadatas"] = [], [], [], []
+
+    for key, chunk_set in enumerate(produced):
+        stats["documents"] += 1
+        stats["chunks_total"] += len(chunk_set["ids"])
+
+        #We only embedded the chunks that were new or changed since the document was last indexed
+        if tracked:
+            changed_set, orphan_ids, chunk_hashes = plan_chunk_set(collection, chunk_set)
+        else:
+            changed_set, orphan_ids, chunk_hashes = chunk_set, [], None
+
+        stats["stale_removed"] += len(orphan_ids)
+
+        document = {
+            "count": len(changed_set["ids"]),
+            "chunk_set": chunk_set,
+            "chunk_hashes": chunk_hashes,
+            "orphan_ids": orphan_ids,
+        }
+
+        #Documents with nothing to write were recorded straight away
+        if not changed_set["ids"]:
+            with finalize_lock:
+                finalize_safely(collection, document, stats)
+            continue
+
+        remaining_chunks[key] = document
+
+        pending["keys"].extend([key] * len(changed_set["ids"]))
+        pending["ids"].extend(changed_set["ids"])
+        pending["documents"].extend(changed_set["documents"])
+        pending["metadatas"].extend(changed_set["metadatas"])
+
+        while len(pending["ids"]) >= batch_size:
+            overflow = {name: values[batch_size:] for name, values in pending.items()}
+            for name in pending:
+                pending[name] = pending[name][:batch_size]
+            flush()
+            pending.update(overflow)
+
+    flush()
+
+    hand_to_writer(None)
+    writer.join()
+
+    if writer_error:
+        raise RuntimeError(f"The ingestion writer stopped: {writer_error[0]}")
+
+    return stats
+
+
+def ingest_pdfs(pdf_paths, collection, embedding_function):
+    """
+    This function ingests PDF files through the pipeline, skipping files the registry already had in this exact version
+    """
+
+    started = time.time()
+
+    #We hashed every file first so unchanged files that were already ingested were skipped without being opened
+    to_process = []
+    for path in pdf_paths:
+        if not os.path.exists(path):
+            print(f"Warning: File not found: {path}")
+            continue
+
+        doc_hash = file_sha256(path)
+        if document_unchanged(collection.name, os.path.basename(path), doc_hash):
+            print(f"Skipping (unchanged): {os.path.basename(path)}")
+            continue
+
+        to_process.append((doc_hash, path))
+
+    print(f"Ingesting {len(to_process)} PDF files with {INGESTION_CONFIG['extract_workers']} extraction workers")
+
+    def produced():
+        with ProcessPoolExecutor(max_workers=INGESTION_CONFIG["extract_workers"]) as pool:
+            futures = {pool.submit(extract_pdf, path, doc_hash): path for doc_hash, path in to_process}
+
+            for done_count, future in enumerate(as_completed(futures), 1):
+                filename = os.path.basename(futures[future])
+
+                try:
+                    chunk_set = future.result()
+                except Exception as e:
+                    print(f"Error processing {filename}: {e}")
+                    continue
+
+                print(f"[{done_count}/{len(to_process)}] Extracted {len(chunk_set['ids'])} chunks from: {filename}")
+                yield chunk_set
+
+    stats = run_pipeline(produced(), collection, embedding_function)
+
+    print(
+        f"Ingested {stats['documents']} files in {time.time() - started:.1f}s: "
+        f"{stats['chunks_written']} of {stats['chunks_total']} chunks embedded, {stats['stale_removed']} stale chunks removed"
+    )
+    return stats
+
+
+def ingest_urls(urls, collection, embedding_function):
+    """
+    This function scrapes URLs concurrently and ingests them through the same embed and write stages.
+    Pages whose text had not changed were fetched again but not re-embedded.
+    """
+
+    started = time.time()
+
+    print(f"Scraping {len(urls)} URLs with {INGESTION_CONFIG['fetch_workers']} threads")
+
+    def produced():
+        with ThreadPoolExecutor(max_workers=INGESTION_CONFIG["fetch_workers"]) as pool:
+            futures = {pool.submit(url_to_chunks, url): url for url in urls}
+
+            for future in as_completed(futures):
+                url = futures[future]
+
+                try:
+                    chunk_set = future.result()
+                except Exception as e:
+                    print(f"Error scraping {url}: {e}")
+                    continue
+
+                if chunk_set is None:
+                    continue
+
+                #We skipped pages whose text was exactly what we indexed last time
+                if document_unchanged(collection.name, chunk_set["source"], chunk_set["doc_hash"]):
+                    print(f"Unchanged: {url}")
+                    continue
+
+                print(f"Scraped {len(chunk_set['ids'])} chunks from: {url}")
+                yield chunk_set
+
+    stats = run_pipeline(produced(), collection, embedding_function)
+
+    print(
+        f"Ingested {stats['documents']} URLs in {time.time() - started:.1f}s: "
+        f"{stats['chunks_written']} of {stats['chunks_total']} chunks embedded, {stats['stale_removed']} stale chunks removed"
+    )
+    return stats
@@ -0,0 +1,135 @@
+'''
+This is the load test we used to measure Kiki's throughput and latency under concurrent users.
+It only used the Python standard library, so it could run from any machine against a local or deployed server.
+
+For each concurrency level, that many simulated users sent requests back to back over keep-alive connections for a
+fixed duration. We reported requests per second, median and 95th percentile latency, and how many requests failed
+or were turned away with 503 because the inference queue was full.
+
+Usage: python load_test.py --url http://localhost:5081 --concurrency 1,8,32 --duration 60
+'''
+
+
+
+#All Imports
+
+import json
+import time
+import random
+import argparse
+import threading
+import http.client
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+
+
+
+QUESTIONS = [
+    "What is Ghana's 2025 budget for education?",
+    "How much was allocated to healthcare in 2024?",
+    "What are the main sources of government revenue?",
+    "What is the current income tax rate in Ghana?",
+    "What are the functions of the Ghana Police Service?",
+    "What are Ghana's main export commodities?",
+    "Tell me about the Ghana Stock Exchange",
+    "What is the history of Korle Bu Teaching Hospital?",
+]
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def simulated_user(url, path, payload_for, deadline, results, lock, user_number):
+    """
+    This function sends requests one after another over a single keep-alive connection until the deadline
+    """
+
+    parsed = urlparse(url)
+    connection_class = http.client.HTTPSConnection if parsed.scheme == "https" else http.client.HTTPConnection
+    connection = connection_class(parsed.hostname, parsed.port, timeout=600)
+    rng = random.Random(user_number)
+
+    while time.time() < deadline:
+        body = json.dumps(payload_for(rng))
+        started = time.perf_counter()
+
+        try:
+            connection.request("POST", path, body=body, headers={
+                "Content-Type": "application/json",
+                "X-Session-ID": f"loadtest{user_number}",
+            })
+            response = connection.getresponse()
+            response.read()
+            status = response.status
+
+        except Exception:
+            status = None
+            connection.close()
+            connection = connection_class(parsed.hostname, parsed.port, timeout=600)
+
+        elapsed = time.perf_counter() - started
+
+        with lock:
+            results.append((status, elapsed))
+
+    connection.close()
+
+
+def run_level(url, path, payload_for, concurrency, duration):
+    results = []
+    lock = threading.Lock()
+    deadline = time.time() + duration
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for user_number in range(concurrency):
+            pool.submit(simulated_user, url, path, payload_for, deadline, results, lock, user_number)
+    elapsed = time.perf_counter() - started
+
+    ok = [latency for status, latency in results if status == 200]
+    busy = sum(1 for status, _ in results if status == 503)
+    failed = len(results) - len(ok) - busy
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "rps": len(ok) / elapsed if elapsed else 0.0,
+        "p50": percentile(ok, 0.50),
+        "p95": percentile(ok, 0.95),
+        "busy": busy,
+        "failed": failed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Kiki server")
+    parser.add_argument("--url", default="http://localhost:5081")
+    parser.add_argument("--path", default="/api/chat", help="/api/chat or /api/health")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma separated numbers of concurrent users")
+    parser.add_argument("--duration", type=int, default=60, help="seconds per concurrency level")
+    parser.add_argument("--no-rag", action="store_true", help="send questions in chat mode instead of RAG mode")
+    args = parser.parse_args()
+
+    def payload_for(rng):
+        return {"message": rng.choice(QUESTIONS), "use_rag": not args.no_rag}
+
+    print(f"Load testing {args.url}{args.path} for {args.duration}s per level\n")
+    print(f"{'users':>6}{'requests':>10}{'req/s':>9}{'p50 s':>9}{'p95 s':>9}{'503':>6}{'errors':>8}")
+
+    for concurrency in (int(level) for level in args.concurrency.split(",")):
+        result = run_level(args.url, args.path, payload_for, concurrency, args.duration)
+
+        print(
+            f"{result['concurrency']:>6}{result['requests']:>10}{result['rps']:>9.2f}"
+            f"{result['p50']:>9.2f}{result['p95']:>9.2f}{result['busy']:>6}{result['failed']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -14,7 +14,14 @@ We implemented chunking strategies to handle long conversations and recursive su
 
 from transformers import pipeline
 from typing import Dict, List, Optional
+from collections import OrderedDict
+import os
+import json
+import time
+import sqlite3
+import threading
 import tiktoken
+import inference_scheduler
 
 
 
@@ -31,6 +38,15 @@ MEMORY_CONFIG = {
     "recent_turns_keep": 3,
     "summary_max_tokens": 150,
     "enable_summarization": True,
+
+    #We summarized this many BART chunks together in one pipeline call
+    "bart_batch_size": int(os.environ.get("KIKI_BART_BATCH_SIZE", 4)),
+
+    #BART read at most 1024 positions, so we split long text into pieces of this many BART tokens
+    "bart_max_input_tokens": 1000,
+
+    #We stopped summarizing the combined chunk summaries again after this many rounds
+    "max_summary_depth": 3,
     
 }
 
@@ -40,29 +56,297 @@ BART_SUMMARIZER = None
 
 GEMMA_MODEL = None
 
-#Memory Structures: We created separate memory stores for different interaction modes
-chat_memory = {
-    "summary": "",
-    "recent_turns": [],
-    "total_tokens": 0,
+#Session Configuration - These settings controlled how many users' conversations we kept and for how long
+SESSION_CONFIG = {
+
+    #We capped the number of sessions held in RAM, the least recently used ones were evicted first
+    "max_sessions": int(os.environ.get("KIKI_MAX_SESSIONS", 500)),
+
+    #We dropped sessions that had not been used for this many seconds
+    "session_ttl_seconds": int(os.environ.get("KIKI_SESSION_TTL", 24 * 60 * 60)),
+
+    #We optionally wrote sessions to this SQLite file so they survived restarts, an empty value kept them in RAM only
+    "sqlite_path": os.environ.get("KIKI_SESSION_DB", ""),
 }
 
-rag_memory = {
-    "summary": "",
-    "recent_turns": [],
-    "total_tokens": 0,
+#The session we used when a caller did not provide one, for example from scripts
+DEFAULT_SESSION_ID = "default"
+
+#Memory Structures: Every session had separate memory stores for the chat and RAG modes.
+#We kept sessions in an OrderedDict so the least recently used session was always first.
+SESSIONS = OrderedDict()
+SESSIONS_LOCK = threading.RLock()
+
+#We only swept for expired sessions once a minute instead of on every request
+_last_expiry_sweep = 0.0
+
+
+#Summarization Worker Configuration - Compressions ran on one background worker instead of a thread per request
+SUMMARY_CONFIG = {
+
+    #We held at most this many memory stores waiting for compression. When it was full, the store was trimmed without summarizing.
+    "max_pending": int(os.environ.get("KIKI_SUMMARY_QUEUE", 64)),
+
+    #While chat requests were waiting for the model, we postponed summarization for up to this many seconds
+    "max_defer_seconds": float(os.environ.get("KIKI_SUMMARY_MAX_DEFER", 30)),
 }
 
+#The memory stores waiting for compression, keyed by (session_id, mode). A store that was already waiting was not queued twice.
+PENDING_COMPRESSIONS = OrderedDict()
+SUMMARY_CONDITION = threading.Condition()
+SUMMARY_WORKER = None
+
+SUMMARY_STATS = {
+    "queued": 0,
+    "coalesced": 0,
+    "completed": 0,
+    "failed": 0,
+    "trimmed_without_summary": 0,
+    "discarded": 0,
+    "total_seconds": 0.0,
+    "max_seconds": 0.0,
+}
+
+
+def new_memory():
+    """
+    This function creates an empty memory store for one mode of one session
+    """
+    return {
+        "summary": "",
+        "summary_tokens": 0,
+        "recent_turns": [],
+        "total_tokens": 0,
+        "token_unit": token_unit(),
+
+        #We bumped this whenever old turns were dropped or the summary replaced, so a summary made from a
+        #snapshot of the store could tell that the store changed underneath it
+        "generation": 0,
+    }
+
+
+def connect_session_db():
+    """
+    This function opens the SQLite session file, creating the table the first time
+    """
+    connection = sqlite3.connect(SESSION_CONFIG["sqlite_path"], timeout=10)
+    connection.execute(
+        """CREATE TABLE IF NOT EXISTS session_memory (
+            session_id TEXT NOT NULL,
+            mode TEXT NOT NULL,
+            summary TEXT NOT NULL,
+            recent_turns TEXT NOT NULL,
+            total_tokens INTEGER NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (session_id, mode)
+        )"""
+    )
+    return connection
+
+
+def save_session(session_id, session):
+    """
+    This function writes a session's memory stores to SQLite when persistence was enabled
+    """
+    if not SESSION_CONFIG["sqlite_path"]:
+        return
+
+    try:
+        connection = connect_session_db()
+        with connection:
+            for mode in ("chat", "rag"):
+                memory = session[mode]
+                if memory is None:
+                    connection.execute(
+                        "DELETE FROM session_memory WHERE session_id = ? AND mode = ?",
+                        (session_id, mode)
+                    )
+                    continue
+
+                connection.execute(
+                    "INSERT OR REPLACE INTO session_memory VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        session_id,
+                        mode,
+                        memory["summary"],
+                        json.dumps(memory["recent_turns"]),
+                        memory["total_tokens"],
+                        session["last_access"]
+                    )
+                )
+        connection.close()
+
+    except Exception as e:
+        print(f"Warning: could not save session {session_id}: {e}")
+
+
+def load_session(session_id):
+    """
+    This function reads a session back from SQLite, returning None if it was not stored or had expired
+    """
+    if not SESSION_CONFIG["sqlite_path"]:
+        return None
+
+    try:
+        connection = connect_session_db()
+        rows = connection.execute(
+            "SELECT mode, summary, recent_turns, total_tokens, updated_at FROM session_memory WHERE session_id = ?",
+            (session_id,)
+        ).fetchall()
+        connection.close()
+
+    except Exception as e:
+        print(f"Warning: could not load session {session_id}: {e}")
+        return None
+
+    if not rows:
+        return None
+
+    session = new_session()
+    oldest_allowed = time.time() - SESSION_CONFIG["session_ttl_seconds"]
+
+    for mode, summary, recent_turns, total_tokens, updated_at in rows:
+        if updated_at < oldest_allowed:
+            continue
+        memory = {
+            "summary": summary,
+            "summary_tokens": count_tokens(summary),
+            "recent_turns": json.loads(recent_turns),
+            "total_tokens": total_tokens,
+            "generation": 0,
+        }
+
+        #We did not know which tokenizer counted the saved turns, so we counted them again once here
+        recount_tokens(memory)
+        session[mode] = memory
+
+    if session["chat"] is None and session["rag"] is None:
+        return None
+
+    return session
+
+
+def delete_expired_sessions():
+    """
+    This function evicted sessions that passed their TTL from RAM and from SQLite
+    """
+    global _last_expiry_sweep
+
+    now = time.time()
+    if now - _last_expiry_sweep < 60:
+        return
+    _last_expiry_sweep = now
+
+    oldest_allowed = now - SESSION_CONFIG["session_ttl_seconds"]
+
+    #The OrderedDict was in access order, so we could stop at the first session that was still fresh
+    while SESSIONS:
+        session_id, session = next(iter(SESSIONS.items()))
+        if session["last_access"] >= oldest_allowed:
+            break
+        SESSIONS.popitem(last=False)
+
+    if SESSION_CONFIG["sqlite_path"]:
+        try:
+            connection = connect_session_db()
+            with connection:
+                connection.execute("DELETE FROM session_memory WHERE updated_at < ?", (oldest_allowed,))
+            connection.close()
+        except Exception as e:
+            print(f"Warning: could not delete expired sessions: {e}")
+
+
+def new_session():
+    """
+    This function creates an empty session. The per-mode memory stores were only created once they were used.
+    """
+    return {
+        "chat": None,
+        "rag": None,
+        "last_access": time.time(),
+        "lock": threading.RLock(),
+    }
+
+
+def get_session(session_id=None):
+    """
+    This function returns the session for an ID, loading it from SQLite or creating it when needed.
+    It also moved the session to the most recently used end and evicted the least recently used ones over the cap.
+    """
+    session_id = session_id or DEFAULT_SESSION_ID
+
+    with SESSIONS_LOCK:
+        delete_expired_sessions()
+
+        session = SESSIONS.get(session_id)
+
+        if session is None:
+            session = load_session(session_id) or new_session()
+            SESSIONS[session_id] = session
+
+        session["last_access"] = time.time()
+        SESSIONS.move_to_end(session_id)
+
+        #We evicted the least recently used sessions, they stayed in SQLite when persistence was enabled
+        while len(SESSIONS) > SESSION_CONFIG["max_sessions"]:
+            SESSIONS.popitem(last=False)
+
+        return session
+
+
+def get_memory(session, mode):
+    """
+    This function returns the memory store for a mode of a session, creating it on first use
+    """
+    mode = "rag" if mode == "rag" else "chat"
+
+    if session[mode] is None:
+        session[mode] = new_memory()
+
+    match_token_unit(session[mode])
+
+    return session[mode]
+
+
+#We resolved the tiktoken encoding once instead of on every count
+_tiktoken_encoding = None
+
+
+def get_tiktoken_encoding():
+    global _tiktoken_encoding
+
+    if _tiktoken_encoding is None:
+        #We used the cl100k_base encoding which worked well for our purposes
+        _tiktoken_encoding = tiktoken.get_encoding("cl100k_base")
+
+    return _tiktoken_encoding
+
+
+def token_unit():
+    """
+    This function names the tokenizer count_tokens used at the moment, so stored counts could be checked against it
+    """
+    return "gemma" if GEMMA_MODEL is not None else "tiktoken"
+
 
 def count_tokens(text):
     """
-    This function counts the number of tokens in a text string using tiktoken encoding
+    This function counts the number of tokens in a text string.
+    Once the Gemma model was set we counted with its own tokenizer, so our thresholds matched the real context budget,
+    and before that we used tiktoken.
     """
+
+    if not text:
+        return 0
+
+    if GEMMA_MODEL is not None:
+        try:
+            return len(GEMMA_MODEL.tokenize(text.encode("utf-8"), add_bos=False, special=True))
+        except Exception as e:
+            print(f"Warning: Gemma tokenizer failed, using tiktoken: {e}")
     
     try:
-        #We used the cl100k_base encoding which worked well for our purposes
-        encoding = tiktoken.get_encoding("cl100k_base")
-        return len(encoding.encode(text))
+        return len(get_tiktoken_encoding().encode(text))
     
     except Exception as e:
         
@@ -71,6 +355,16 @@ def count_tokens(text):
         return len(text) // 4
 
 
+def turn_tokens(turn):
+    """
+    This function returns the token count stored on a turn, counting it once for turns that did not have one yet
+    """
+    if "tokens" not in turn:
+        turn["tokens"] = count_tokens(turn['user'] + turn['model'])
+
+    return turn["tokens"]
+
+
 def init_bart_summarizer():
     """
     Initializing the BART summarization model that we used as our primary summarizer
@@ -103,18 +397,63 @@ def init_bart_summarizer():
 
 def set_gemma_model(model):
     """
-    Set reference to Gemma model for summarization fallback when BART failed
+    Set reference to Gemma model for summarization fallback when BART failed.
+    From here on tokens were counted with Gemma's tokenizer, and stores counted with tiktoken before were recounted
+    the next time they were used.
     """
     global GEMMA_MODEL
     GEMMA_MODEL = model
 
 
-def summarize_with_bart(text):
+def run_gemma(prompt, **kwargs):
+    """
+    Run a Gemma completion for summarization. When the inference scheduler was running we queued it
+    as background work so it never delayed an interactive chat request.
+    """
+
+    if inference_scheduler.scheduler_running():
+        return inference_scheduler.run_inference(
+            lambda model: model(prompt, **kwargs),
+            priority=inference_scheduler.PRIORITY_BACKGROUND
+        )
+
+    return GEMMA_MODEL(prompt, **kwargs)
+
+
+def split_for_bart(text, max_tokens=None):
+    """
+    This function splits text into pieces of at most max_tokens BART tokens, cutting only between tokens.
+    We measured with BART's own tokenizer instead of guessing from the number of characters.
+    """
+
+    max_tokens = max_tokens or MEMORY_CONFIG["bart_max_input_tokens"]
+    tokenizer = BART_SUMMARIZER.tokenizer
+
+    encoded = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+    offsets = encoded["offset_mapping"]
+
+    if len(offsets) <= max_tokens:
+        return [text]
+
+    #We cut the original text at the character offset where every run of max_tokens tokens started
+    pieces = []
+    for start in range(0, len(offsets), max_tokens):
+        end = min(start + max_tokens, len(offsets))
+        piece_end = offsets[end][0] if end < len(offsets) else len(text)
+        piece = text[offsets[start][0]:piece_end].strip()
+        if piece:
+            pieces.append(piece)
+
+    return pieces
+
+
+def summarize_with_bart(text, depth=0):
     """
     Summarize text using the BART model with chunking strategy for long texts
     
-    Since BART had a maximum input of approximately 1024 tokens, or 4000-4500 chars, 
-    we implemented chunking when text was too long and used recursive summarization.
+    Since BART had a maximum input of approximately 1024 tokens, we split long text on BART token counts,
+    summarized all the pieces together in batched pipeline calls and recursively summarized the combined result,
+    at most max_summary_depth times. If it was still made of several summaries then, we kept its first summary_max_tokens tokens.
     
     """
     global BART_SUMMARIZER
@@ -126,66 +465,45 @@ def summarize_with_bart(text):
             return summarize_with_gemma(text)
 
     try:
-        #We set the maximum character limit based on BART's token constraints
-        MAX_CHARS = 4000
+        chunks = split_for_bart(text)
 
-        if len(text) <= MAX_CHARS:
+        if len(chunks) == 1:
             #If the text fit within limits, we summarized it directly
             summary = BART_SUMMARIZER(
                 text,
                 max_length=100,
                 min_length=30,
-                do_sample=False
+                do_sample=False,
+                truncation=True
             )
             return summary[0]['summary_text']
 
-        else:
-            #When the text was too long, we chunked and summarized in pieces
-            chunks = []
-            
-            remaining = text
+        #When the text was too long, we summarized all the pieces in batches instead of one pipeline call per piece
+        results = BART_SUMMARIZER(
+            chunks,
+            max_length=80,
+            min_length=20,
+            do_sample=False,
+            truncation=True,
+            batch_size=MEMORY_CONFIG["bart_batch_size"]
+        )
 
-            while len(remaining) > MAX_CHARS:
-                #We took chunks from the end to preserve context flow
-                chunk = remaining[-MAX_CHARS:]
-                
-                chunks.insert(0, chunk) 
-                
-                remaining = remaining[:-MAX_CHARS]
+        summaries = [result['summary_text'] for result in results if result.get('summary_text')]
 
-            if remaining:
-                chunks.insert(0, remaining)
+        if len(summaries) == 0:
+            return ""
+        
+        elif len(summaries) == 1:
+            return summaries[0]
 
-            #We summarized each chunk separately
-            summaries = []
-            for i, chunk in enumerate(chunks):
-                
-                try:
-                    result = BART_SUMMARIZER(
-                        chunk,
-                        max_length=80,
-                        min_length=20,
-                        do_sample=False
-                    )
-                    
-                    summaries.append(result[0]['summary_text'])
-                    
-                except Exception as e:
-                    print(f"There was an error while trying to summarize chunk {i+1}: {e}")
-                    
-                    continue
+        #When we had multiple chunk summaries, we combined and recursively summarized again, up to our depth limit
+        combined = " ".join(summaries)
 
-            if len(summaries) == 0:
-                return ""
-            
-            elif len(summaries) == 1:
-                return summaries[0]
-            
-            else:
-                #When we had multiple chunk summaries, we combined and recursively summarized again
-                combined = " ".join(summaries)
+        #At the depth limit we cut the combined summaries to our summary budget, so memory text always stayed bounded
+        if depth + 1 >= MEMORY_CONFIG["max_summary_depth"]:
+            return split_for_bart(combined, MEMORY_CONFIG["summary_max_tokens"])[0]
 
-                return summarize_with_bart(combined)
+        return summarize_with_bart(combined, depth + 1)
 
     except Exception as e:
         
@@ -219,7 +537,7 @@ def summarize_with_gemma(text):
 Summary:"""
 
             #We generated the summary with controlled parameters
-            output = GEMMA_MODEL(
+            output = run_gemma(
                 prompt,
                 max_tokens=150,
                 temperature=0.3,
@@ -252,7 +570,7 @@ Summary:"""
 
 Summary:"""
 
-                    output = GEMMA_MODEL(
+                    output = run_gemma(
                         prompt,
                         max_tokens=100,
                         temperature=0.3,
@@ -309,163 +627,324 @@ def format_turns_for_summary(turns):
     return text.strip()
 
 
-def compress_memory(memory):
+def recount_tokens(memory):
     """
-    This function was called when memory exceeded the token threshold.
-    We designed it to keep the most recent conversations in full detail and summarize older ones.
+    This function counts the summary and every turn of a memory store again with the current tokenizer.
+    We only needed it for stores loaded from SQLite and when the tokenizer changed, everywhere else the total
+    was kept up to date incrementally.
     """
+    for turn in memory["recent_turns"]:
+        turn.pop("tokens", None)
 
-    #We first checked if summarization was enabled in the configuration
-    if not MEMORY_CONFIG["enable_summarization"]:
-        
-        keep = MEMORY_CONFIG["recent_turns_keep"]
-        memory["recent_turns"] = memory["recent_turns"][-keep:]
+    memory["summary_tokens"] = count_tokens(memory["summary"])
+    memory["total_tokens"] = memory["summary_tokens"] + sum(turn_tokens(turn) for turn in memory["recent_turns"])
+    memory["token_unit"] = token_unit()
 
-        #We recalculated the total token count for the remaining turns
-        memory["total_tokens"] = sum(
-            count_tokens(t['user'] + t['model'])
-            for t in memory["recent_turns"]
-        )
 
-        #If there was an existing summary, we added its tokens to the total
-        if memory["summary"]:
-            memory["total_tokens"] += count_tokens(memory["summary"])
+def match_token_unit(memory):
+    """
+    This function recounts a memory store once if it was counted with a different tokenizer than the current one,
+    so turns added before and after set_gemma_model were never summed in two different units
+    """
+    if memory.get("token_unit") != token_unit():
+        recount_tokens(memory)
+
+
+def drop_oldest_turns(memory, count):
+    """
+    This function removes the oldest turns from a memory store and subtracts their stored token counts from the total
+    """
+    if count <= 0:
         return
 
+    dropped = memory["recent_turns"][:count]
+    memory["recent_turns"] = memory["recent_turns"][count:]
+    memory["total_tokens"] -= sum(turn_tokens(turn) for turn in dropped)
+    memory["generation"] += 1
 
-    #When summarization was enabled, we summarized old turns instead of dropping them
-    #We determined how many recent turns to keep in full detail
+
+def set_summary(memory, summary):
+    """
+    This function replaces the summary of a memory store and updates the total by the difference in tokens
+    """
+    summary_tokens = count_tokens(summary)
+
+    memory["total_tokens"] += summary_tokens - memory["summary_tokens"]
+    memory["summary"] = summary
+    memory["summary_tokens"] = summary_tokens
+    memory["generation"] += 1
+
+
+def trim_memory(memory):
+    """
+    This function keeps only the most recent turns without summarizing the older ones.
+    We used it when summarization was disabled and when the summarization queue was full.
+    """
     keep = MEMORY_CONFIG["recent_turns_keep"]
+    drop_oldest_turns(memory, len(memory["recent_turns"]) - keep)
 
-    #We split the turns: old turns were summarized, recent turns kept as-is
-    turns_to_summarize = memory["recent_turns"][:-keep]  
-    
-    memory["recent_turns"] = memory["recent_turns"][-keep:]  
+
+def merge_summaries(old_summary, new_summary):
+    """
+    This function adds the summary of newly compressed turns to the existing summary
+    """
+
+    #When there was no existing summary, we just used the new one
+    if not old_summary:
+        return new_summary
+
+    #We combined the old summary with the new summary
+    combined = f"{old_summary} {new_summary}"
+
+    #If the combined summary was getting too long (>300 tokens), we summarized it again
+    #This prevented the summary itself from growing indefinitely
+    if count_tokens(combined) > 300:
+        return summarize_text(combined)
+
+    return combined
+
+
+def compress_memory(session_id, mode):
+    """
+    This function was called by the summarization worker when a memory store exceeded the token threshold.
+    We designed it to keep the most recent conversations in full detail and summarize older ones.
+    The session lock was only held to take a snapshot and to apply the result, never while the summarizer ran.
+    """
+
+    session = get_session(session_id)
+    keep = MEMORY_CONFIG["recent_turns_keep"]
+
+    with session["lock"]:
+        memory = session[mode]
+
+        #The store could have been cleared or compressed since it was queued
+        if memory is None:
+            return
+
+        match_token_unit(memory)
+
+        if memory["total_tokens"] <= MEMORY_CONFIG["token_threshold"]:
+            return
+
+        if not MEMORY_CONFIG["enable_summarization"]:
+            trim_memory(memory)
+            save_session(session_id, session)
+            return
+
+        #We split the turns: old turns were summarized, recent turns kept as-is
+        turns_to_summarize = memory["recent_turns"][:-keep]
+        old_summary = memory["summary"]
+        generation = memory["generation"]
 
     #If there were no old turns to summarize, we were done
     if not turns_to_summarize:
         return
 
     #We formatted the old turns into readable text format and generated a summary
-    text_to_summarize = format_turns_for_summary(turns_to_summarize)
-    new_summary = summarize_text(text_to_summarize)
-
-    #We handled the case where we already had a summary from previous compressions
-    if memory["summary"]:
-        #We combined the old summary with the new summary
-        combined = f"{memory['summary']} {new_summary}"
-
-        #If the combined summary was getting too long (>300 tokens), we summarized it again
-        #This prevented the summary itself from growing indefinitely
-        if count_tokens(combined) > 300:
-            memory["summary"] = summarize_text(combined)
-        else:
-            memory["summary"] = combined
-            
-    else:
-        #When there was no existing summary, we just used the new one
-        memory["summary"] = new_summary
+    new_summary = summarize_text(format_turns_for_summary(turns_to_summarize))
+    summary = merge_summaries(old_summary, new_summary)
 
-    #We recalculated the total token count after compression
-    #We started with the summary tokens
-    memory["total_tokens"] = count_tokens(memory["summary"])
+    with session["lock"]:
 
-    #We added the tokens from all remaining recent turns
-    for turn in memory["recent_turns"]:
-        memory["total_tokens"] += count_tokens(turn['user'] + turn['model'])
+        #If the conversation was cleared while we summarized, the summary belonged to nothing anymore
+        if session[mode] is not memory:
+            return
+
+        #If the request thread trimmed the store because the queue was full, the turns we summarized were no longer
+        #the first ones, so dropping them again would have removed newer turns. We discarded the summary instead.
+        if memory["generation"] != generation:
+            with SUMMARY_CONDITION:
+                SUMMARY_STATS["discarded"] += 1
+            return
+
+        #Otherwise new turns had only been appended, so the turns we summarized were still the first ones.
+        #We updated the total token count by what we removed and added instead of recounting everything.
+        drop_oldest_turns(memory, len(turns_to_summarize))
+        set_summary(memory, summary)
+
+        #The Gemma model could have been set while we summarized
+        match_token_unit(memory)
+
+        save_session(session_id, session)
+
+
+def summary_worker_loop():
+    """
+    This is the summarization worker. It compressed one memory store at a time, oldest request first,
+    and postponed its work while interactive requests were waiting for the model.
+    """
+
+    while True:
+        with SUMMARY_CONDITION:
+            while not PENDING_COMPRESSIONS:
+                SUMMARY_CONDITION.wait()
+
+            (session_id, mode), queued_at = PENDING_COMPRESSIONS.popitem(last=False)
+
+        #We ran at low priority: chat requests queued for the model went first
+        deferred_until = time.time() + SUMMARY_CONFIG["max_defer_seconds"]
+        while inference_scheduler.get_scheduler_stats()["queue_depth"] > 0 and time.time() < deferred_until:
+            time.sleep(0.25)
+
+        started = time.time()
+
+        try:
+            compress_memory(session_id, mode)
+            outcome = "completed"
+        except Exception as e:
+            print(f"Memory compression failed for session {session_id} ({mode}): {e}")
+            outcome = "failed"
+
+        elapsed = time.time() - started
 
+        with SUMMARY_CONDITION:
+            SUMMARY_STATS[outcome] += 1
+            SUMMARY_STATS["total_seconds"] += elapsed
+            SUMMARY_STATS["max_seconds"] = max(SUMMARY_STATS["max_seconds"], elapsed)
 
-def add_to_memory(user_question, model_answer, mode="chat"):
+
+def schedule_compression(session_id, mode):
+    """
+    This function queues a memory store for compression by the summarization worker.
+    It returned False when the queue was full so the caller could trim the store instead.
+    """
+    global SUMMARY_WORKER
+
+    key = (session_id, mode)
+
+    with SUMMARY_CONDITION:
+
+        #A store that was already waiting would be compressed with all its turns anyway
+        if key in PENDING_COMPRESSIONS:
+            SUMMARY_STATS["coalesced"] += 1
+            return True
+
+        if len(PENDING_COMPRESSIONS) >= SUMMARY_CONFIG["max_pending"]:
+            SUMMARY_STATS["trimmed_without_summary"] += 1
+            return False
+
+        if SUMMARY_WORKER is None or not SUMMARY_WORKER.is_alive():
+            SUMMARY_WORKER = threading.Thread(target=summary_worker_loop, name="memory-summarizer", daemon=True)
+            SUMMARY_WORKER.start()
+
+        PENDING_COMPRESSIONS[key] = time.time()
+        SUMMARY_STATS["queued"] += 1
+        SUMMARY_CONDITION.notify()
+
+    return True
+
+
+def get_summarizer_stats():
+    """
+    This function returns the summarization queue depth and latency for our metrics endpoint
+    """
+    with SUMMARY_CONDITION:
+        stats = dict(SUMMARY_STATS)
+        stats["queue_depth"] = len(PENDING_COMPRESSIONS)
+
+    finished = stats["completed"] + stats["failed"]
+    stats["max_pending"] = SUMMARY_CONFIG["max_pending"]
+    stats["avg_seconds"] = stats["total_seconds"] / finished if finished else 0.0
+
+    return stats
+
+
+def add_to_memory(user_question, model_answer, mode="chat", session_id=None):
     """
     This was the main function for adding interactions to our memory system.
     We designed it to automatically trigger compression when memory exceeded the token threshold.
-    
+    It was cheap enough to call on the request thread: the compression itself was left to the summarization worker.
     """
 
-    #We selected the appropriate memory storage based on mode because we had separate stores for RAG and chat
-    memory = rag_memory if mode == "rag" else chat_memory
+    session_id = session_id or DEFAULT_SESSION_ID
 
-    #We created a turn object containing both the user's question and model's answer
-    turn = {
-        "user": user_question,
-        "model": model_answer
-    }
+    session = get_session(session_id)
 
-    #We added this turn to the list of recent turns in memory
-    memory["recent_turns"].append(turn)
+    with session["lock"]:
 
-    #We calculated how many tokens this new turn contained
-    turn_tokens = count_tokens(user_question + model_answer)
+        #We selected the appropriate memory storage based on mode because we had separate stores for RAG and chat
+        memory = get_memory(session, mode)
 
-    #We updated the total token count in memory
-    memory["total_tokens"] += turn_tokens
+        #We created a turn object containing both the user's question and model's answer,
+        #with its token count calculated once here and stored on the turn
+        turn = {
+            "user": user_question,
+            "model": model_answer,
+            "tokens": count_tokens(user_question + model_answer)
+        }
 
-    #We checked if the total tokens exceeded the configured threshold
-    threshold = MEMORY_CONFIG["token_threshold"]
-    
-    if memory["total_tokens"] > threshold:
+        #We added this turn to the list of recent turns in memory
+        memory["recent_turns"].append(turn)
+
+        #We updated the total token count in memory
+        memory["total_tokens"] += turn["tokens"]
+
+        #We checked if the total tokens exceeded the configured threshold
+        threshold = MEMORY_CONFIG["token_threshold"]
         
-        #When memory got too large, we triggered compression
-        compress_memory(memory)
+        if memory["total_tokens"] > threshold:
+            
+            #When memory got too large, we queued it for compression, or trimmed it right away if the queue was full
+            if not schedule_compression(session_id, "rag" if mode == "rag" else "chat"):
+                trim_memory(memory)
 
+        save_session(session_id, session)
 
-def get_memory_text(mode: str = "chat") -> str:
+
+def get_memory_text(mode: str = "chat", session_id: Optional[str] = None) -> str:
     """
     This function formatted memory into a readable string that provided context
     from previous conversations. We designed it to include both the summary of old conversations
     and the full text of recent conversations.
     """
-    #We selected the appropriate memory storage based on mode
-    memory = rag_memory if mode == "rag" else chat_memory
+    session = get_session(session_id)
 
-    
-    if not memory["recent_turns"] and not memory["summary"]:
-        return ""
+    with session["lock"]:
 
-    #We started building the memory text with a clear header
-    text = "Previous conversation:\n\n"
+        #We selected the appropriate memory storage based on mode
+        memory = session["rag" if mode == "rag" else "chat"]
 
-    #We included the summary of older conversations if it existed
-    if memory["summary"]:
-        text += f"Earlier context: {memory['summary']}\n\n"
+        if memory is None or (not memory["recent_turns"] and not memory["summary"]):
+            return ""
 
-    #We included the full text of recent conversations
-    if memory["recent_turns"]:
-        text += "Recent messages:\n"
-        for turn in memory["recent_turns"]:
-            
-            #We formatted each turn as a User/Kiki exchange
-            text += f"User: {turn['user']}\n"
-            text += f"Kiki: {turn['model']}\n\n"
+        #We started building the memory text with a clear header
+        text = "Previous conversation:\n\n"
+
+        #We included the summary of older conversations if it existed
+        if memory["summary"]:
+            text += f"Earlier context: {memory['summary']}\n\n"
+
+        #We included the full text of recent conversations
+        if memory["recent_turns"]:
+            text += "Recent messages:\n"
+            for turn in memory["recent_turns"]:
+                
+                #We formatted each turn as a User/Kiki exchange
+                text += f"User: {turn['user']}\n"
+                text += f"Kiki: {turn['model']}\n\n"
 
     return text
 
 
-def clear_memory(mode: Optional[str] = None):
+def clear_memory(mode: Optional[str] = None, session_id: Optional[str] = None):
     """
     This function reset the memory by removing all stored conversations,
     summaries, and resetting token counts. We made it useful for starting new topics
     or when you wanted to remove all conversation history.
 
     """
-    if mode == "chat":
-        #We cleared only the chat memory
-        chat_memory["summary"] = ""
-        chat_memory["recent_turns"] = []
-        chat_memory["total_tokens"] = 0
-    elif mode == "rag":
-        #We cleared only the RAG memory
-        rag_memory["summary"] = ""
-        rag_memory["recent_turns"] = []
-        rag_memory["total_tokens"] = 0
-    else:
-        #When no specific mode was provided, we cleared both chat and RAG memory
-        chat_memory["summary"] = ""
-        chat_memory["recent_turns"] = []
-        chat_memory["total_tokens"] = 0
-        rag_memory["summary"] = ""
-        rag_memory["recent_turns"] = []
-        rag_memory["total_tokens"] = 0
-
-
+    session = get_session(session_id)
+
+    with session["lock"]:
+        if mode == "chat":
+            #We cleared only the chat memory
+            session["chat"] = None
+        elif mode == "rag":
+            #We cleared only the RAG memory
+            session["rag"] = None
+        else:
+            #When no specific mode was provided, we cleared both chat and RAG memory
+            session["chat"] = None
+            session["rag"] = None
 
+        save_session(session_id or DEFAULT_SESSION_ID, session)
@@ -10,6 +10,10 @@ The file also contained functions for loading and working with the Gemma model t
 
 #All Imports
 
+import numpy as np
+from embedding_cache import embed_query
+from bm25_index import BM25_CONFIG, is_searchable, is_strong_match, search as bm25_search, reciprocal_rank_fusion
+
 try:
     import torch
     from transformers import AutoTokenizer, AutoModelForCausalLM
@@ -20,48 +24,130 @@ except ImportError:
 
 #RAG Functions - These functions powered our retrieval-augmented generation system
 
-def query_database(question, collection_name, n_results=5, distance_threshold=None):
+def run_query(question, collection_name, n_results=5, embedding_function=None, where=None):
     """
-    This function simply queries the ChromaDB database to find relevant documents for a given question
-
+    This function runs a single similarity search against ChromaDB and returns the raw results.
+    When an embedding function was given we used the cached query embedding instead of letting Chroma embed the question again.
+    A where clause from document_metadata.build_where_filter limited the search to part of the collection.
     """
 
+    #Collections with a BM25 index were searched both ways and the two rankings were fused
+    if embedding_function is not None and is_searchable(collection_name.name):
+        return run_hybrid_query(question, collection_name, n_results, embedding_function, where)
+
     #We queried the database to find the most relevant documents for the user's question
-    results = collection_name.query(
-        query_texts=[question],
-        n_results=n_results
-    )
+    if embedding_function is not None:
+        results = collection_name.query(
+            query_embeddings=[embed_query(question, embedding_function)],
+            n_results=n_results,
+            where=where
+        )
+    else:
+        results = collection_name.query(
+            query_texts=[question],
+            n_results=n_results,
+            where=where
+        )
 
     #We extracted the text chunks, metadata, and distances from the query results
     chunks = results['documents'][0]
-    metadatas = results['metadatas'][0]
-    distances = results['distances'][0] if 'distances' in results else [0] * len(chunks)
+
+    return {
+        'ids': results['ids'][0],
+        'chunks': chunks,
+        'sources': results['metadatas'][0],
+        'distances': results['distances'][0] if results.get('distances') else [0] * len(chunks)
+    }
+
+
+def run_hybrid_query(question, collection_name, n_results, embedding_function, where=None):
+    """
+    This function runs the dense search and the BM25 search, fuses their rankings with reciprocal rank fusion and
+    returns the best n_results chunks with their dense distances and the normalized score and rank BM25 gave them
+    """
+
+    candidates = n_results * BM25_CONFIG["candidate_multiplier"]
+    query_embedding = embed_query(question, embedding_function)
+
+    dense = collection_name.query(query_embeddings=[query_embedding], n_results=candidates, where=where)
+
+    if where is None:
+        lexical = bm25_search(collection_name.name, question, candidates)
+    else:
+        #The BM25 index did not store metadata, so for scoped searches we took more BM25 candidates
+        #and let Chroma tell us which of them were inside the scope
+        lexical = bm25_search(collection_name.name, question, candidates * BM25_CONFIG["candidate_multiplier"])
+
+        if lexical:
+            in_scope = set(collection_name.get(ids=[chunk_id for chunk_id, _ in lexical], where=where, include=[])['ids'])
+            lexical = [(chunk_id, score) for chunk_id, score in lexical if chunk_id in in_scope][:candidates]
+
+    found = {
+        chunk_id: (chunk, metadata, distance)
+        for chunk_id, chunk, metadata, distance in zip(dense['ids'][0], dense['documents'][0], dense['metadatas'][0], dense['distances'][0])
+    }
+    lexical_ids = [chunk_id for chunk_id, _ in lexical]
+
+    fused_ids = reciprocal_rank_fusion([dense['ids'][0], lexical_ids])[:n_results]
+
+    #Chunks only BM25 found were read from Chroma, and we computed their squared L2 distance like Chroma did
+    missing = [chunk_id for chunk_id in fused_ids if chunk_id not in found]
+    if missing:
+        extra = collection_name.get(ids=missing, include=['documents', 'metadatas', 'embeddings'])
+        query_vector = np.asarray(query_embedding, dtype=np.float32)
+
+        for chunk_id, chunk, metadata, embedding in zip(extra['ids'], extra['documents'], extra['metadatas'], extra['embeddings']):
+            difference = np.asarray(embedding, dtype=np.float32) - query_vector
+            found[chunk_id] = (chunk, metadata, float(np.dot(difference, difference)))
+
+    fused_ids = [chunk_id for chunk_id in fused_ids if chunk_id in found]
+    lexical_ranks = {chunk_id: rank for rank, (chunk_id, _) in enumerate(lexical)}
+    lexical_scores = dict(lexical)
+
+    return {
+        'ids': fused_ids,
+        'chunks': [found[chunk_id][0] for chunk_id in fused_ids],
+        'sources': [found[chunk_id][1] for chunk_id in fused_ids],
+        'distances': [found[chunk_id][2] for chunk_id in fused_ids],
+        'lexical_scores': [lexical_scores.get(chunk_id) for chunk_id in fused_ids],
+        'lexical_ranks': [lexical_ranks.get(chunk_id) for chunk_id in fused_ids]
+    }
+
+
+def apply_distance_threshold(results, distance_threshold=None):
+    """
+    This function checks whether query results are relevant and keeps only the chunks within the distance threshold
+    """
+
+    ids = results['ids']
+    chunks = results['chunks']
+    metadatas = results['sources']
+    distances = results['distances']
+    lexical_scores = results.get('lexical_scores', [None] * len(chunks))
+    lexical_ranks = results.get('lexical_ranks', [None] * len(chunks))
 
     # We then checked if the queried results are relevant based on distance threshold
     is_relevant = True
     
     if distance_threshold is not None and len(distances) > 0:
-        # We check if the best (first) result meets the threshold
-        best_distance = distances[0]
-        is_relevant = best_distance <= distance_threshold
-
-        # We then filtered out chunks that didn't meet the threshold
-        if is_relevant:
-            filtered_chunks = []
-            filtered_metadatas = []
-            filtered_distances = []
-
-            for i in range(len(chunks)):
-                if distances[i] <= distance_threshold:
-                    filtered_chunks.append(chunks[i])
-                    filtered_metadatas.append(metadatas[i])
-                    filtered_distances.append(distances[i])
-
-            chunks = filtered_chunks
-            metadatas = filtered_metadatas
-            distances = filtered_distances
+        # We kept the chunks within the threshold and the strong BM25 matches. Strong matches counted even when their
+        # embedding was far from the question and from every other chunk, because those exact lookups (an act number,
+        # a budget line) were what dense search missed. Fused results were not ordered by distance, so we checked them all
+        keep = [
+            i for i in range(len(chunks))
+            if distances[i] <= distance_threshold or is_strong_match(lexical_scores[i], lexical_ranks[i])
+        ]
+
+        # The results were relevant when at least one chunk passed either test
+        is_relevant = len(keep) > 0
+
+        ids = [ids[i] for i in keep]
+        chunks = [chunks[i] for i in keep]
+        metadatas = [metadatas[i] for i in keep]
+        distances = [distances[i] for i in keep]
 
     return {
+        'ids': ids,
         'chunks': chunks,
         'sources': metadatas,
         'distances': distances,
@@ -69,6 +155,34 @@ def query_database(question, collection_name, n_results=5, distance_threshold=No
     }
 
 
+def query_database(question, collection_name, n_results=5, distance_threshold=None, embedding_function=None, where=None):
+    """
+    This function simply queries the ChromaDB database to find relevant documents for a given question
+
+    """
+
+    results = run_query(question, collection_name, n_results, embedding_function, where)
+
+    return apply_distance_threshold(results, distance_threshold)
+
+
+def query_database_with_fallback(question, collection_name, n_results=5, thresholds=(1.2, 1.5), embedding_function=None, where=None):
+    """
+    This function queries the database once and applies each distance threshold in turn to that single result set,
+    returning the first one that produced relevant chunks
+    """
+
+    results = run_query(question, collection_name, n_results, embedding_function, where)
+
+    for threshold in thresholds:
+        filtered = apply_distance_threshold(results, threshold)
+
+        if filtered['is_relevant'] and len(filtered['chunks']) > 0:
+            return filtered
+
+    return filtered
+
+
 def build_context(chunks, sources):
     """
     This function builds formatted context from retrieved document chunks and their sources
@@ -98,22 +212,28 @@ def build_context(chunks, sources):
     return context
 
 
+#The fixed instructions that started every prompt. Keeping them first and identical meant llama.cpp could reuse
+#their evaluated state from the prefix cache instead of prefilling them again for each question
+KIKI_RAG_PREAMBLE = "You are Kiki, a helpful AI assistant. Based on the previous conversation and the context below, provide a detailed, informative answer with multiple paragraphs.\n\n"
+
+KIKI_CHAT_PREAMBLE = "You are Kiki, a helpful AI assistant. Provide detailed, informative responses with multiple paragraphs.\n\n"
+
+
 def build_prompt(question, context, history=""):
     """
-    This function builds the complete prompt for our language model including context and question
+    This function builds the complete prompt for our language model including context and question.
+    The parts went from the most to the least stable: instructions, conversation history, retrieved context, question.
     """
     
-    #We started building the prompt
-    prompt = ""
+    #We started with the static instructions for Kiki
+    prompt = KIKI_RAG_PREAMBLE
 
-    #We included conversation history if it was provided
+    #We included conversation history if it was provided, it only grew at its end between turns of a session
     if history:
         prompt += f"{history}\n\n"
 
-    #We constructed the main prompt with our specific format for Kiki
-    prompt += f"""You are Kiki, a helpful AI assistant. Based on the past conversations above and the context below, provide a detailed, informative answer with multiple paragraphs.
-
-Context:
+    #We constructed the rest of the prompt with our specific format for Kiki
+    prompt += f"""Context:
 {context}
 
 Question: {question}
@@ -4,6 +4,9 @@ This is our OCR (Optical Character Recognition) utility script for extracting te
 We used EasyOCR which is a Python library that can read text from images with high accuracy.
 This script is particularly useful for processing images that contain text data that we want to include in our Ghana chatbot database.
 
+Loading the EasyOCR detection and recognition networks took seconds and hundreds of MB, so we created
+one shared reader per language set the first time it was needed and reused it for every image after that.
+
 Our script handles SSL certificate verification issues that sometimes occur when downloading models or processing images from various sources.
 '''
 
@@ -11,8 +14,10 @@ Our script handles SSL certificate verification issues that sometimes occur when
 
 #All Imports
 
-import easyocr
+import os
 import ssl
+import threading
+import easyocr
 
 
 
@@ -21,27 +26,193 @@ import ssl
 ssl._create_default_https_context = ssl._create_unverified_context
 
 
-def extract_text_from_image(image_path):
-    
-    #We initialized the EasyOCR reader with English to support reading English text from images
-    reader = easyocr.Reader(['en'])
-    
-    #We read the text from the image and this returns a list of detections with coordinates and text
-    result = reader.readtext(image_path)
-    
-    #We created an empty list to store all the text we extract from the image
-    text_list = []
-    
-    #We iterated through each text detection found in the image
-    for detection in result:
-        
-        #Each detection came with a tuple in the format (coordinates, text, confidence)
-        #We extracted only the text part (index 1) from each detection
-        
-        text_found = detection[1]
-        text_list.append(text_found)
+#OCR Configuration - These settings controlled the languages we read and how large images were handled
+OCR_CONFIG = {
+
+    #We read English by default. Twi, Ewe and our other local languages are written in Latin script,
+    #so extra EasyOCR language codes could be added here as a comma separated list, e.g. "en,fr"
+    "languages": [code.strip() for code in os.environ.get("KIKI_OCR_LANGUAGES", "en").split(",") if code.strip()],
+
+    #We used the GPU only when explicitly enabled
+    "gpu": os.environ.get("KIKI_OCR_GPU", "0") == "1",
+
+    #We downscaled images whose longest side was above this many pixels before detection, 0 disabled it
+    "max_image_side": int(os.environ.get("KIKI_OCR_MAX_SIDE", 2000)),
+
+    #We passed this batch size to the recognition network
+    "batch_size": int(os.environ.get("KIKI_OCR_BATCH_SIZE", 8)),
+
+    #We sent at most this many same sized images to the detector in one readtext_batched call
+    "image_batch_size": int(os.environ.get("KIKI_OCR_IMAGE_BATCH_SIZE", 4)),
+
+    #We loaded the reader at startup alongside the other models when this was on, otherwise on the first image
+    "preload": os.environ.get("KIKI_OCR_PRELOAD", "1") == "1",
+}
+
+
+#We kept one reader per language set, created lazily and shared by all requests
+READERS = {}
+READERS_LOCK = threading.Lock()
+
+#EasyOCR readers are not safe to use from several threads at once, so we ran one image or batch at a time
+OCR_LOCK = threading.Lock()
+
+
+def get_reader(languages=None):
+    """
+    This function returns the shared EasyOCR reader for a set of languages, creating it on first use
+    """
+
+    languages = tuple(languages or OCR_CONFIG["languages"])
+
+    with READERS_LOCK:
+        reader = READERS.get(languages)
+
+        if reader is None:
+            print(f"Loading EasyOCR reader for languages: {', '.join(languages)}")
+            reader = easyocr.Reader(list(languages), gpu=OCR_CONFIG["gpu"])
+            READERS[languages] = reader
+
+    return reader
+
+
+def load_image(image_path, max_side=None):
+    """
+    This function loads an image and downscales it when its longest side was larger than max_side.
+    Detection time grew with the number of pixels, so large phone photos were much faster after resizing.
+    """
+
+    max_side = OCR_CONFIG["max_image_side"] if max_side is None else max_side
+
+    try:
+        import cv2
+
+        image = cv2.imread(image_path)
+
+        #If OpenCV could not decode the image we let EasyOCR try the original file
+        if image is None:
+            return image_path
+
+        height, width = image.shape[:2]
+        longest_side = max(height, width)
+
+        if not max_side or longest_side <= max_side:
+            return image
+
+        scale = max_side / longest_side
+        return cv2.resize(image, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+
+    except Exception as e:
+        print(f"Warning: could not downscale {image_path}: {e}")
+        return image_path
+
+
+def detections_to_text(result):
+    """
+    This function joins the text of EasyOCR detections into one string
+    """
+
+    #Each detection came with a tuple in the format (coordinates, text, confidence)
+    #We extracted only the text part (index 1) from each detection
+    text_list = [detection[1] for detection in result]
 
     #We joined all the extracted text pieces into one complete string separated by spaces
-    full_text = ' '.join(text_list)
-    
-    return full_text
\ No newline at end of file
+    return ' '.join(text_list)
+
+
+def extract_text_from_image(image_path, languages=None):
+
+    #We used the shared reader instead of loading the networks again for every image
+    reader = get_reader(languages)
+
+    image = load_image(image_path)
+
+    #We read the text from the image and this returns a list of detections with coordinates and text
+    with OCR_LOCK:
+        result = reader.readtext(image, batch_size=OCR_CONFIG["batch_size"])
+
+    return detections_to_text(result)
+
+
+def group_by_size(images):
+    """
+    This function groups the positions of decoded images by their (height, width).
+    Images OpenCV could not decode stayed file paths and were left out, so they were read one at a time.
+    """
+
+    groups = {}
+
+    for position, image in enumerate(images):
+        if isinstance(image, str):
+            continue
+
+        groups.setdefault(image.shape[:2], []).append(position)
+
+    return groups
+
+
+def read_one(reader, image, image_path):
+    try:
+        with OCR_LOCK:
+            result = reader.readtext(image, batch_size=OCR_CONFIG["batch_size"])
+
+        return detections_to_text(result)
+
+    except Exception as e:
+        print(f"Error reading text from {image_path}: {e}")
+        return ""
+
+
+def extract_text_from_images(image_paths, languages=None):
+    """
+    This function reads several images with the shared reader, batching images of the same size together.
+    It returns one text string per image in the same order, with an empty string for images that failed.
+    EasyOCR's readtext_batched needed every image in a call to have the same size, so after downscaling we grouped
+    the images by height and width and sent each group in batches of image_batch_size. Photos from the same phone
+    usually came out of the downscale with the same size, so a typical upload ran in a few batched calls.
+    The reader was locked for one batch at a time, so an upload with many images did not hold up other OCR requests.
+    """
+
+    reader = get_reader(languages)
+
+    #We loaded and downscaled every image before taking the OCR lock so the lock was only held for inference
+    images = []
+    for image_path in image_paths:
+        try:
+            images.append(load_image(image_path))
+        except Exception as e:
+            print(f"Error loading {image_path}: {e}")
+            images.append(None)
+
+    texts = [None] * len(image_paths)
+    batch_size = max(1, OCR_CONFIG["image_batch_size"])
+
+    for (height, width), positions in group_by_size(images).items():
+        for start in range(0, len(positions), batch_size):
+            batch = positions[start:start + batch_size]
+
+            #A single image gained nothing from the batched path
+            if len(batch) == 1:
+                continue
+
+            try:
+                with OCR_LOCK:
+                    results = reader.readtext_batched(
+                        [images[position] for position in batch],
+                        n_width=width,
+                        n_height=height,
+                        batch_size=OCR_CONFIG["batch_size"],
+                    )
+
+                for position, result in zip(batch, results):
+                    texts[position] = detections_to_text(result)
+
+            #We fell back to reading the images of a failed batch one at a time below
+            except Exception as e:
+                print(f"Error reading a batch of {len(batch)} images, reading them one at a time: {e}")
+
+    for position, image_path in enumerate(image_paths):
+        if texts[position] is None:
+            texts[position] = read_one(reader, images[position], image_path) if images[position] is not None else ""
+
+    return texts
@@ -14,6 +14,8 @@ We also had some that were pdfs so we downloaded them and added it in the folder
 import time
 import chromadb
 from chroma_utilities import *
+from ingestion_pipeline import ingest_pdfs, ingest_urls
+from document_registry import forget_collection, sync_registry
 from chromadb.utils import embedding_functions
 
 
@@ -226,8 +228,9 @@ def populate_database():
             test_result = collection.query(query_texts=["test"], n_results=1)
         except Exception as e:
             
-            # If incompatible, we deleted and recreated the collection
+            # If incompatible, we deleted and recreated the collection, and forgot the documents the registry had recorded in it
             client.delete_collection(name="Ghana_chatbot")
+            forget_collection("Ghana_chatbot")
             collection = client.create_collection(
                 name="Ghana_chatbot",
                 metadata={"description": "A collection of documents about Ghana."},
@@ -243,10 +246,13 @@ def populate_database():
             embedding_function=sentence_transformer_ef
         )
 
-    # We then process all our URLs using the utility function we designed in chroma_utilities.py
+    # We made sure the registry never claimed documents the collection did not hold
+    sync_registry(collection)
+
+    # We then process all our URLs using the ingestion pipeline, which scrapes them concurrently
     print("\nSkipping URL Processing (already completed)...")
     
-    # scrape_multiple_urls_to_database(urls_to_scrape, collection)
+    # ingest_urls(urls_to_scrape, collection, sentence_transformer_ef)
     
     print("\nURL Processing Skipped!")
 
@@ -255,31 +261,18 @@ def populate_database():
     
     print(f"Processing {len(pdfs_to_process)} PDF files\n")
 
-    for idx, pdf_file in enumerate(pdfs_to_process, 1):
-        print(f"[{idx}/{len(pdfs_to_process)}] Processing: {pdf_file}")
-
-        # Build the full path to the PDF file
-        pdf_path = os.path.join(PDF_DATASETS_PATH, pdf_file)
-        
-        # Check if the file exists before processing
-        if not os.path.exists(pdf_path):
-            print(f"Warning: File not found: {pdf_path}")
-            continue
+    # We ran the PDFs through our pipeline: extraction in a process pool, batched embedding and a writer stage.
+    # Files the document registry already had were skipped, so a crashed run could simply be started again.
+    pdf_paths = [os.path.join(PDF_DATASETS_PATH, pdf_file) for pdf_file in pdfs_to_process]
 
-        # Add the PDF to the database using our utility function
-        try:
-            pdf_to_database(pdf_path, collection)
-            print(f"Successfully processed: {pdf_file}")
-        except Exception as e:
-            print(f"Error processing {pdf_file}: {e}")
-            continue
-
-        
+    stats = ingest_pdfs(pdf_paths, collection, sentence_transformer_ef)
 
-    print(f"\nSuccessfully processed {len(pdfs_to_process)} PDF files")
+    print(f"\nSuccessfully processed {stats['documents']} PDF files")
 
     print("\n\nDatabase Population Complete!")
 
 
 
-populate_database()
+# We guarded the entry point because the extraction worker processes re-import this module on some platforms
+if __name__ == "__main__":
+    populate_database()
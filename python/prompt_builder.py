@@ -0,0 +1,148 @@
+'''
+This is our token-budgeted prompt assembler. Before it, generate() kept only the last 4000 characters of any
+longer prompt, which could cut off the start of Kiki's instructions, and rag_query cut the retrieved context at
+2000 characters, which could end a source in the middle of a sentence while most of the 8192 token window sat unused.
+
+We measured every part of the prompt in Gemma's own tokens with the llama.cpp tokenizer and filled the window by priority:
+the instructions and the question always went in, then the retrieved chunks in rank order, then the conversation history.
+When something did not fit we dropped whole chunks starting from the lowest ranked one, and we only summarized the
+history when it was too long for the space that was left.
+'''
+
+
+
+#All Imports
+
+import os
+import math
+from model_utilities import build_context, build_prompt
+
+
+
+#Prompt Configuration - These settings controlled how much of the model's context window we filled
+PROMPT_CONFIG = {
+
+    #This was replaced by the real n_ctx once the model was loaded
+    "context_window": int(os.environ.get("KIKI_N_CTX", 8192)),
+
+    #We kept a few tokens free in case the prompt tokenized slightly differently once it was assembled
+    "safety_margin": 64,
+
+    #We never let the history take less than this many tokens if it existed and the chunks left room for it
+    "min_history_tokens": 256,
+
+    #RAM for llama.cpp's prefix cache of evaluated prompt states, shared between the model replicas. 0 disabled it.
+    #A state held the KV cache of its prompt, so a few thousand tokens of Gemma 2B took a few hundred MB.
+    "prefix_cache_mb": int(os.environ.get("KIKI_PREFIX_CACHE_MB", 1024)),
+}
+
+
+#The llama model whose tokenizer we used for counting, set once the model was loaded
+TOKENIZER_MODEL = None
+
+
+def set_tokenizer_model(model):
+    """
+    This function sets the model we counted tokens with and takes the context window size from it
+    """
+    global TOKENIZER_MODEL
+
+    TOKENIZER_MODEL = model
+
+    if model is not None and hasattr(model, "n_ctx"):
+        PROMPT_CONFIG["context_window"] = model.n_ctx()
+
+
+def count_llm_tokens(text):
+    """
+    This function counts tokens with the Gemma tokenizer, or estimates four characters per token before the model was loaded
+    """
+
+    if not text:
+        return 0
+
+    if TOKENIZER_MODEL is not None:
+        try:
+            return len(TOKENIZER_MODEL.tokenize(text.encode("utf-8"), add_bos=False, special=True))
+        except Exception as e:
+            print(f"Warning: token counting failed, estimating instead: {e}")
+
+    return math.ceil(len(text) / 4)
+
+
+def prompt_budget(max_tokens):
+    """
+    This function returns how many tokens the prompt could use while leaving room for max_tokens of answer
+    """
+    return PROMPT_CONFIG["context_window"] - max_tokens - PROMPT_CONFIG["safety_margin"]
+
+
+def fit_max_tokens(prompt, max_tokens):
+    """
+    This function lowers max_tokens when a prompt and its answer would not fit in the context window together
+    """
+    available = PROMPT_CONFIG["context_window"] - count_llm_tokens(prompt) - PROMPT_CONFIG["safety_margin"]
+    return max(1, min(max_tokens, available))
+
+
+def fit_history(history, budget):
+    """
+    This function returns the history unchanged when it fitted in the budget.
+    Otherwise it summarized the history, and dropped it completely when even the summary did not fit.
+    """
+
+    if not history or budget <= 0:
+        return ""
+
+    if count_llm_tokens(history) <= budget:
+        return history
+
+    #We imported the summarizer here because memory_system loaded its models lazily and we rarely got this far
+    from memory_system import summarize_text
+
+    summary = summarize_text(history)
+    if not summary:
+        return ""
+
+    history = f"Previous conversation:\n\nEarlier context: {summary}\n\n"
+
+    return history if count_llm_tokens(history) <= budget else ""
+
+
+def assemble_rag_prompt(question, chunks, sources, history="", max_tokens=1500):
+    """
+    This function builds the RAG prompt that fitted in the context window.
+    It returned the prompt and the sources of the chunks it kept, in rank order.
+    """
+
+    budget = prompt_budget(max_tokens)
+
+    #The instructions and the question always went in
+    available = budget - count_llm_tokens(build_prompt(question, ""))
+
+    #We measured each source block exactly as build_context formatted it
+    block_tokens = [count_llm_tokens(build_context([chunk], [source])) for chunk, source in zip(chunks, sources)]
+
+    #The history was only squeezed if the chunks needed its space, and it always kept a minimum share when it existed
+    history_tokens = count_llm_tokens(history)
+    history_budget = min(history_tokens, max(available - sum(block_tokens), PROMPT_CONFIG["min_history_tokens"]))
+    history = fit_history(history, history_budget)
+    available -= count_llm_tokens(history)
+
+    #We kept whole chunks from the best ranked down and dropped the rest
+    kept = 0
+    for tokens in block_tokens:
+        if tokens > available:
+            break
+        available -= tokens
+        kept += 1
+
+    #We always kept the best chunk; generate() lowered max_tokens if it made the prompt too long
+    kept = max(kept, 1) if chunks else 0
+
+    if kept < len(chunks):
+        print(f"Prompt budget: kept {kept} of {len(chunks)} retrieved chunks")
+
+    context = build_context(chunks[:kept], sources[:kept])
+
+    return build_prompt(question, context, history=history), sources[:kept]
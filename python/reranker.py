@@ -0,0 +1,212 @@
+'''
+This is our optional cross-encoder reranking stage. The MiniLM bi-encoder embedded the question and every chunk
+separately, so its top 3 or 5 were often not the best chunks available, and every weak chunk we sent to Gemma made
+the prompt longer and the prefill slower.
+
+With reranking on, retrieval over-fetched about 30 candidates. A small CPU cross-encoder read the question together
+with each candidate and scored them in batches, and we kept the best K that fitted in a token budget. Scoring had a
+hard time budget per query: candidates we had no time to score kept their original order behind the scored ones.
+Scores were cached per (collection, question, chunk ID), and the collection's entries were dropped whenever it was
+written to.
+'''
+
+
+
+#All Imports
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from embedding_cache import normalize_query
+from prompt_builder import count_llm_tokens
+
+
+
+#Reranker Configuration - These settings controlled how many candidates we scored and how long we could take
+RERANK_CONFIG = {
+    "enabled": os.environ.get("KIKI_RERANK", "1") == "1",
+
+    #A 6 layer MS MARCO cross-encoder scored a batch of 16 chunks in tens of milliseconds on CPU
+    "model": os.environ.get("KIKI_RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2"),
+
+    #How many candidates retrieval fetched for us to rerank
+    "candidates": int(os.environ.get("KIKI_RERANK_CANDIDATES", 30)),
+
+    "batch_size": int(os.environ.get("KIKI_RERANK_BATCH_SIZE", 16)),
+
+    #We stopped scoring new batches once this much time had passed for a query
+    "time_budget_ms": int(os.environ.get("KIKI_RERANK_BUDGET_MS", 300)),
+
+    #The kept chunks together never took more than this many Gemma tokens, except that the best chunk was always kept
+    "context_tokens": int(os.environ.get("KIKI_RERANK_CONTEXT_TOKENS", 1500)),
+
+    "cache_size": int(os.environ.get("KIKI_RERANK_CACHE_SIZE", 20000)),
+}
+
+
+#The cross-encoder, loaded by the startup manager when reranking was enabled
+RERANKER = None
+RERANKER_LOCK = threading.Lock()
+
+#Scores keyed by (collection, normalized question, chunk ID), ordered from least to most recently used
+SCORE_CACHE = OrderedDict()
+SCORE_CACHE_LOCK = threading.Lock()
+
+RERANK_STATS = {
+    "queries": 0,
+    "pairs_scored": 0,
+    "cache_hits": 0,
+    "budget_exceeded": 0,
+    "seconds": 0.0,
+}
+
+
+def load_reranker():
+    """
+    This function loads the cross-encoder. We imported sentence_transformers here so the app started without it
+    when reranking was turned off.
+    """
+    global RERANKER
+
+    from sentence_transformers import CrossEncoder
+
+    model = CrossEncoder(RERANK_CONFIG["model"], device="cpu")
+
+    #We scored one pair so the first question did not pay for the first forward pass
+    model.predict([("warm up", "warm up")])
+
+    RERANKER = model
+
+
+def reranker_ready():
+    """
+    This function tells whether retrieval should over-fetch candidates for us
+    """
+    return RERANK_CONFIG["enabled"] and RERANKER is not None
+
+
+def invalidate_scores(collection_name):
+    """
+    This write listener dropped the cached scores of a collection whose chunks had changed
+    """
+    with SCORE_CACHE_LOCK:
+        for key in [key for key in SCORE_CACHE if key[0] == collection_name]:
+            del SCORE_CACHE[key]
+
+
+def score_candidates(collection_name, question, ids, chunks):
+    """
+    This function returns a score for every candidate it had time to score, and None for the others
+    """
+    started = time.perf_counter()
+    deadline = started + RERANK_CONFIG["time_budget_ms"] / 1000
+    query = normalize_query(question)
+
+    scores = [None] * len(ids)
+
+    with SCORE_CACHE_LOCK:
+        for i, chunk_id in enumerate(ids):
+            score = SCORE_CACHE.get((collection_name, query, chunk_id))
+            if score is not None:
+                SCORE_CACHE.move_to_end((collection_name, query, chunk_id))
+                scores[i] = score
+
+    cache_hits = sum(1 for score in scores if score is not None)
+    pending = [i for i, score in enumerate(scores) if score is None]
+    batch_size = RERANK_CONFIG["batch_size"]
+    pairs_scored = 0
+    budget_exceeded = False
+
+    #We scored the best ranked candidates first, so running out of time only cost us the weakest ones
+    for start in range(0, len(pending), batch_size):
+        if time.perf_counter() >= deadline:
+            budget_exceeded = True
+            break
+
+        batch = pending[start:start + batch_size]
+
+        #The cross-encoder was not safe to run from several request threads at once. Waiting for another query to
+        #finish counted against our budget, so under load we gave up on scoring instead of queueing past it
+        if not RERANKER_LOCK.acquire(timeout=max(0.0, deadline - time.perf_counter())):
+            budget_exceeded = True
+            break
+
+        try:
+            #The lock could be granted just as the budget ran out
+            if time.perf_counter() >= deadline:
+                budget_exceeded = True
+                break
+
+            batch_scores = RERANKER.predict([(question, chunks[i]) for i in batch], batch_size=batch_size)
+        finally:
+            RERANKER_LOCK.release()
+
+        with SCORE_CACHE_LOCK:
+            for i, score in zip(batch, batch_scores):
+                scores[i] = float(score)
+                SCORE_CACHE[(collection_name, query, ids[i])] = scores[i]
+
+            while len(SCORE_CACHE) > RERANK_CONFIG["cache_size"]:
+                SCORE_CACHE.popitem(last=False)
+
+        pairs_scored += len(batch)
+
+    with SCORE_CACHE_LOCK:
+        RERANK_STATS["queries"] += 1
+        RERANK_STATS["pairs_scored"] += pairs_scored
+        RERANK_STATS["cache_hits"] += cache_hits
+        RERANK_STATS["budget_exceeded"] += int(budget_exceeded)
+        RERANK_STATS["seconds"] += time.perf_counter() - started
+
+    return scores
+
+
+def rerank_results(question, collection_name, results, n_results):
+    """
+    This function reorders retrieval results by cross-encoder score and keeps the best n_results within the token budget.
+    It takes and returns the dictionaries of model_utilities.query_database.
+    """
+    if not reranker_ready() or not results['chunks']:
+        return results
+
+    scores = score_candidates(collection_name, question, results['ids'], results['chunks'])
+
+    #Scored candidates came first by score, then the unscored ones in their retrieval order
+    order = sorted(range(len(scores)), key=lambda i: (scores[i] is None, -(scores[i] or 0.0), i))
+
+    kept = []
+    tokens = 0
+
+    for i in order:
+        if len(kept) == n_results:
+            break
+
+        chunk_tokens = count_llm_tokens(results['chunks'][i])
+
+        if kept and tokens + chunk_tokens > RERANK_CONFIG["context_tokens"]:
+            continue
+
+        kept.append(i)
+        tokens += chunk_tokens
+
+    reranked = dict(results)
+    for key in ('ids', 'chunks', 'sources', 'distances'):
+        reranked[key] = [results[key][i] for i in kept]
+
+    return reranked
+
+
+def get_reranker_stats():
+    """
+    This function returns the reranker counters and cache size for our metrics endpoint
+    """
+    with SCORE_CACHE_LOCK:
+        stats = dict(RERANK_STATS)
+        stats["cache_size"] = len(SCORE_CACHE)
+
+    stats["enabled"] = RERANK_CONFIG["enabled"]
+    stats["ready"] = RERANKER is not None
+    stats["average_ms"] = 1000 * stats["seconds"] / stats["queries"] if stats["queries"] else 0.0
+
+    return stats
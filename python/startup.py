@@ -0,0 +1,158 @@
+'''
+This is our startup manager. Kiki used to load everything in sequence before the port opened: the ChromaDB client,
+the SentenceTransformer embedder, Gemma with its warmup, and BART. A container restart therefore waited for the sum
+of all those load times before it could even answer a health check.
+
+We registered each heavy component with a loader function and the components it needed, and loaded them all at once
+in background threads while the server was already accepting connections. Every component went through the states
+pending -> loading -> ready (or failed, or disabled), and we recorded how long each one took so /api/health could
+report per-component readiness. Routes asked for the components they needed and answered 503 until those were ready.
+'''
+
+
+
+#All Imports
+
+import time
+import threading
+from collections import OrderedDict
+
+
+
+#The registered components in registration order, each with its loader, dependencies and current state
+COMPONENTS = OrderedDict()
+COMPONENTS_LOCK = threading.Lock()
+
+#We remembered when startup began so the health check could report the total time to ready
+_startup_started = None
+
+
+def register_component(name, loader, depends_on=(), enabled=True):
+    """
+    This function registers a component to load at startup. The loader ran once all components in depends_on were ready.
+    """
+    with COMPONENTS_LOCK:
+        COMPONENTS[name] = {
+            "loader": loader,
+            "depends_on": tuple(depends_on),
+            "state": "pending" if enabled else "disabled",
+            "error": None,
+            "started_at": None,
+            "seconds": None,
+            "done": threading.Event(),
+        }
+
+        if not enabled:
+            COMPONENTS[name]["done"].set()
+
+
+def set_state(name, state, error=None):
+    with COMPONENTS_LOCK:
+        component = COMPONENTS[name]
+        component["state"] = state
+        component["error"] = error
+
+        if state == "loading":
+            component["started_at"] = time.time()
+        elif component["started_at"] is not None:
+            component["seconds"] = round(time.time() - component["started_at"], 2)
+
+    if state in ("ready", "failed"):
+        component["done"].set()
+
+
+def load_component(name):
+    """
+    This function runs in its own thread: it waited for the component's dependencies and then ran its loader
+    """
+    component = COMPONENTS[name]
+
+    for dependency in component["depends_on"]:
+        COMPONENTS[dependency]["done"].wait()
+
+        if COMPONENTS[dependency]["state"] != "ready":
+            set_state(name, "failed", f"{dependency} is not available")
+            print(f"Startup: {name} skipped because {dependency} is not available")
+            return
+
+    set_state(name, "loading")
+    print(f"Startup: loading {name}...")
+
+    try:
+        component["loader"]()
+    except Exception as e:
+        set_state(name, "failed", str(e))
+        print(f"Startup: {name} failed to load: {e}")
+        return
+
+    set_state(name, "ready")
+    print(f"Startup: {name} ready in {COMPONENTS[name]['seconds']}s")
+
+
+def start_components():
+    """
+    This function starts loading every pending component in parallel and returns straight away
+    """
+    global _startup_started
+
+    with COMPONENTS_LOCK:
+        if _startup_started is not None:
+            return
+        _startup_started = time.time()
+        pending = [name for name, component in COMPONENTS.items() if component["state"] == "pending"]
+
+    for name in pending:
+        threading.Thread(target=load_component, args=(name,), name=f"startup-{name}", daemon=True).start()
+
+
+def is_ready(*names):
+    """
+    This function tells whether all the named components finished loading successfully
+    """
+    return all(COMPONENTS[name]["state"] == "ready" for name in names)
+
+
+def wait_for(*names, timeout=None):
+    """
+    This function blocks until the named components finished loading or failed, for scripts and tests
+    """
+    deadline = None if timeout is None else time.time() + timeout
+
+    for name in names:
+        remaining = None if deadline is None else max(0, deadline - time.time())
+        if not COMPONENTS[name]["done"].wait(remaining):
+            return False
+
+    return is_ready(*names)
+
+
+def get_startup_status():
+    """
+    This function returns the overall status and the state, load time and error of every component
+    """
+    with COMPONENTS_LOCK:
+        components = {
+            name: {
+                "state": component["state"],
+                "seconds": component["seconds"],
+                "error": component["error"],
+            }
+            for name, component in COMPONENTS.items()
+        }
+        started = _startup_started
+
+    states = [component["state"] for component in components.values()]
+
+    #We only reported degraded once nothing was still loading, so a failure was not hidden behind a slow component
+    if any(state in ("pending", "loading") for state in states):
+        status = "loading"
+    elif any(state == "failed" for state in states):
+        status = "degraded"
+    else:
+        status = "ready"
+
+    return {
+        "status": status,
+        "uptime_seconds": round(time.time() - started, 2) if started else 0.0,
+        "components": components,
+    }
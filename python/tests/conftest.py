@@ -0,0 +1,73 @@
+'''
+This is the shared pytest setup for our tests of the pure logic in python/.
+Our modules imported each other by their flat names, so we put the python/ folder on the import path, and every test
+got its own document registry and BM25 index files so nothing touched vector_db/.
+'''
+
+
+
+#All Imports
+
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bm25_index
+import text_chunker
+import document_registry
+
+
+
+@pytest.fixture(autouse=True)
+def isolated_indexes(tmp_path, monkeypatch):
+    """
+    This fixture points the registry and the BM25 index at temporary files and forgets any cached index state
+    """
+    monkeypatch.setitem(document_registry.REGISTRY_CONFIG, "path", str(tmp_path / "document_registry.sqlite3"))
+    monkeypatch.setitem(bm25_index.BM25_CONFIG, "path", str(tmp_path / "bm25_index.sqlite3"))
+    monkeypatch.setitem(bm25_index.BM25_CONFIG, "enabled", True)
+    monkeypatch.setattr(bm25_index, "SYNCED_COLLECTIONS", set())
+    monkeypatch.setattr(bm25_index, "COLLECTION_STATS", {})
+
+
+@pytest.fixture(autouse=True)
+def estimated_token_counts(monkeypatch):
+    """
+    This fixture makes the chunker estimate token counts instead of downloading the MiniLM tokenizer
+    """
+    monkeypatch.setattr(text_chunker, "_tokenizer", None)
+    monkeypatch.setattr(text_chunker, "_tokenizer_loaded", True)
+
+
+class FakeCollection:
+    """
+    The few ChromaDB collection methods the registry and BM25 code called, backed by a dictionary
+    """
+
+    def __init__(self, name="Ghana_chatbot", chunks=None):
+        self.name = name
+        self.chunks = dict(chunks or {})
+
+    def count(self):
+        return len(self.chunks)
+
+    def get(self, ids=None, where=None, include=None, limit=None, offset=0):
+        selected = [
+            chunk_id for chunk_id, (document, metadata) in self.chunks.items()
+            if (ids is None or chunk_id in ids) and all(metadata.get(key) == value for key, value in (where or {}).items())
+        ]
+        if limit is not None:
+            selected = selected[offset:offset + limit]
+
+        return {
+            "ids": selected,
+            "documents": [self.chunks[chunk_id][0] for chunk_id in selected],
+            "metadatas": [self.chunks[chunk_id][1] for chunk_id in selected],
+        }
+
+
+@pytest.fixture
+def fake_collection():
+    return FakeCollection
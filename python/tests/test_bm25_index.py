@@ -0,0 +1,101 @@
+'''
+Tests for the BM25 index: tokenizing, searching, normalized scores, deletes, syncing with Chroma and rank fusion
+'''
+
+
+
+#All Imports
+
+import pytest
+import bm25_index
+from bm25_index import tokenize, index_chunks, remove_chunks, search, is_strong_match, reciprocal_rank_fusion, sync_index
+
+
+
+COLLECTION = "Ghana_chatbot"
+
+
+@pytest.fixture
+def indexed(fake_collection):
+    """
+    An index of twenty chunks that all mention Ghana and one chunk about Act 1030
+    """
+    chunks = {f"report_c{i}": f"Ghana education report number {i} about schools in Ghana" for i in range(20)}
+    chunks["act_c0"] = "The Ghana Revenue Authority Act 1030 established the authority"
+
+    collection = fake_collection(COLLECTION, {chunk_id: (text, {}) for chunk_id, text in chunks.items()})
+    sync_index(collection)
+
+    return collection
+
+
+def test_tokenize_drops_stopwords_and_thousands_separators():
+    assert tokenize("What is the GH 1,030 million for Act 1030?") == ["gh", "1030", "million", "act", "1030"]
+    assert tokenize("Inflation was 23.5 percent") == ["inflation", "23.5", "percent"]
+
+
+def test_collections_are_not_searchable_before_sync():
+    index_chunks(COLLECTION, ["a"], ["Act 1030"])
+
+    assert search(COLLECTION, "Act 1030") == []
+
+
+def test_exact_lookup_ranks_first(indexed):
+    results = search(COLLECTION, "What does Act 1030 say?", 5)
+
+    assert results[0][0] == "act_c0"
+
+
+def test_scores_are_normalized_by_the_question(indexed):
+    #A chunk with every term of the question scores about 1
+    assert search(COLLECTION, "Act 1030", 1)[0][1] == pytest.approx(1.0, abs=0.3)
+
+    #Chunks that only share a word found in almost every chunk score close to 0
+    for _, score in search(COLLECTION, "Ghana health insurance", 5):
+        assert score < 0.1
+
+
+def test_only_strong_top_hits_pass(indexed):
+    strong = search(COLLECTION, "What does Act 1030 say about Ghana revenue?", 5)
+    weak = search(COLLECTION, "Ghana health insurance", 5)
+
+    assert is_strong_match(strong[0][1], 0)
+    assert not any(is_strong_match(score, rank) for rank, (_, score) in enumerate(weak))
+    assert not is_strong_match(strong[0][1], bm25_index.BM25_CONFIG["strong_match_rank"])
+    assert not is_strong_match(None, None)
+
+
+def test_removed_chunks_are_not_found(indexed):
+    remove_chunks(COLLECTION, ["act_c0"])
+
+    assert all(chunk_id != "act_c0" for chunk_id, _ in search(COLLECTION, "Act 1030", 5))
+
+
+def test_reindexing_a_chunk_replaces_it(indexed):
+    index_chunks(COLLECTION, ["act_c0"], ["The Fisheries Act 625"])
+
+    assert all(chunk_id != "act_c0" for chunk_id, _ in search(COLLECTION, "1030", 5))
+    assert search(COLLECTION, "Fisheries", 1)[0][0] == "act_c0"
+
+
+def test_sync_rebuilds_an_index_that_does_not_match(indexed, fake_collection):
+    collection = fake_collection(COLLECTION, {"new_c0": ("Act 1030 was amended", {})})
+    sync_index(collection)
+
+    assert [chunk_id for chunk_id, _ in search(COLLECTION, "Act 1030", 5)] == ["new_c0"]
+
+
+def test_unindexed_collections_are_ignored():
+    index_chunks("document_123", ["a"], ["Act 1030"])
+
+    assert search("document_123", "Act 1030") == []
+
+
+def test_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d", "a"]])
+
+    assert fused[0] == "b"
+    assert set(fused) == {"a", "b", "c", "d"}
+
+    #A chunk both retrievers found beat chunks only one of them found, even ones it ranked higher
+    assert fused.index("a") < fused.index("d")
@@ -0,0 +1,89 @@
+'''
+Tests for the document-level metadata and the scope filters we turned into ChromaDB where clauses
+'''
+
+
+
+#All Imports
+
+import pytest
+from document_metadata import build_where_filter, parse_date, document_metadata, document_family, document_type, document_language
+
+
+
+def test_no_filters_means_no_where_clause():
+    assert build_where_filter(None) is None
+    assert build_where_filter({}) is None
+    assert build_where_filter({"source": "", "family": []}) is None
+
+
+def test_single_value_is_an_equality():
+    assert build_where_filter({"source": "2025-Budget-Statement.pdf"}) == {"source": "2025-Budget-Statement.pdf"}
+
+
+def test_list_of_values_is_an_in_clause():
+    assert build_where_filter({"doc_type": ["pdf", "web"]}) == {"doc_type": {"$in": ["pdf", "web"]}}
+
+
+def test_years_are_converted_to_numbers():
+    assert build_where_filter({"year": "2025"}) == {"year": 2025}
+    assert build_where_filter({"year": ["2024", 2025]}) == {"year": {"$in": [2024, 2025]}}
+
+
+def test_several_filters_are_combined_with_and():
+    where = build_where_filter({
+        "family": "2025-Budget-by-Detail",
+        "ingested_after": "2025-01-01",
+        "ingested_before": "2025-07-01",
+    })
+
+    assert where == {"$and": [
+        {"family": "2025-Budget-by-Detail"},
+        {"ingested_at": {"$gte": parse_date("2025-01-01")}},
+        {"ingested_at": {"$lt": parse_date("2025-07-01")}},
+    ]}
+
+
+@pytest.mark.parametrize("filters", [
+    ["source"],
+    {"author": "MoF"},
+    {"year": "last year"},
+    {"ingested_after": "01/02/2025"},
+])
+def test_bad_filters_are_rejected(filters):
+    with pytest.raises(ValueError):
+        build_where_filter(filters)
+
+
+def test_dates_are_utc_timestamps():
+    assert parse_date("1970-01-02") == 86400
+
+
+def test_document_metadata_reads_the_name():
+    metadata = document_metadata("2022-Citizens-Budget_Asante_Twi.pdf", ingested_at=1700000000)
+
+    assert metadata == {
+        "doc_type": "pdf",
+        "family": "2022-Citizens-Budget",
+        "language": "tw",
+        "ingested_at": 1700000000,
+        "year": 2022,
+    }
+
+
+def test_documents_without_a_year_have_no_year():
+    assert "year" not in document_metadata("Constitution.pdf")
+
+
+def test_families_of_images_and_web_pages():
+    assert document_family("image_Budget-Highlights_p1.png") == "Budget-Highlights"
+    assert document_family("https://mofep.gov.gh/publications/budget") == "mofep.gov.gh"
+    assert document_family("2024_Annual_Report.pdf") == "2024_Annual_Report"
+
+
+def test_types_and_languages():
+    assert document_type("image_scan.png") == "image"
+    assert document_type("https://example.gov.gh/page") == "web"
+    assert document_type("Expenditure.xlsx") == "excel"
+    assert document_language("Budget_Ewe.pdf") == "ee"
+    assert document_language("Budget.pdf") == "en"
@@ -0,0 +1,119 @@
+'''
+Tests for the in-memory collections: where filters, nearest neighbour queries, expiry and the memory cap
+'''
+
+
+
+#All Imports
+
+import time
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import ephemeral_store
+from ephemeral_store import (
+    metadata_matches,
+    create_ephemeral_collection,
+    get_ephemeral_collection,
+    remove_expired_collections,
+)
+
+
+
+@pytest.fixture(autouse=True)
+def empty_store(monkeypatch):
+    monkeypatch.setattr(ephemeral_store, "EPHEMERAL_COLLECTIONS", type(ephemeral_store.EPHEMERAL_COLLECTIONS)())
+
+
+def unit_vectors(texts):
+    #Every text got its own axis, so a query for one text was nearest to exactly that text
+    vocabulary = ["budget", "health", "education", "roads", "query"]
+    return [[1.0 if word == text.split()[0] else 0.0 for word in vocabulary] for text in texts]
+
+
+@pytest.fixture
+def collection():
+    collection = create_ephemeral_collection("document_test", unit_vectors)
+    collection.upsert(
+        ids=["c0", "c1", "c2"],
+        documents=["budget 2025", "health 2024", "education 2025"],
+        metadatas=[
+            {"source": "a.pdf", "page": 1, "year": 2025},
+            {"source": "a.pdf", "page": 2, "year": 2024},
+            {"source": "b.pdf", "page": 1, "year": 2025},
+        ],
+    )
+    return collection
+
+
+@pytest.mark.parametrize("where, expected", [
+    (None, True),
+    ({"source": "a.pdf"}, True),
+    ({"source": "b.pdf"}, False),
+    ({"year": {"$gte": 2025}}, True),
+    ({"year": {"$lt": 2025}}, False),
+    ({"source": {"$in": ["b.pdf", "a.pdf"]}}, True),
+    ({"source": {"$nin": ["a.pdf"]}}, False),
+    ({"source": {"$ne": "b.pdf"}}, True),
+    ({"$and": [{"source": "a.pdf"}, {"year": 2025}]}, True),
+    ({"$and": [{"source": "a.pdf"}, {"year": 2024}]}, False),
+    ({"$or": [{"source": "b.pdf"}, {"year": 2025}]}, True),
+])
+def test_metadata_filters(where, expected):
+    assert metadata_matches({"source": "a.pdf", "year": 2025}, where) is expected
+
+
+def test_get_filters_by_ids_and_where(collection):
+    assert collection.get(where={"year": 2025})["ids"] == ["c0", "c2"]
+    assert collection.get(ids=["c1", "c2", "missing"], where={"source": "a.pdf"})["ids"] == ["c1"]
+
+
+def test_query_returns_the_nearest_chunks_first(collection):
+    results = collection.query(query_embeddings=unit_vectors(["health"]), n_results=2)
+
+    assert results["ids"][0][0] == "c1"
+    assert results["distances"][0][0] == pytest.approx(0.0)
+    assert len(results["ids"][0]) == 2
+
+
+def test_query_respects_the_where_filter(collection):
+    results = collection.query(query_embeddings=unit_vectors(["health"]), n_results=3, where={"year": 2025})
+
+    assert sorted(results["ids"][0]) == ["c0", "c2"]
+
+
+def test_upsert_replaces_existing_chunks(collection):
+    collection.upsert(ids=["c1"], documents=["roads 2024"], metadatas=[{"source": "a.pdf"}])
+
+    assert collection.count() == 3
+    assert collection.query(query_embeddings=unit_vectors(["roads"]), n_results=1)["ids"][0] == ["c1"]
+
+
+def test_delete_by_where(collection):
+    collection.delete(where={"source": "a.pdf"})
+
+    assert collection.get()["ids"] == ["c2"]
+
+
+def test_collections_expire_after_the_ttl(collection, monkeypatch):
+    monkeypatch.setitem(ephemeral_store.EPHEMERAL_CONFIG, "ttl_seconds", 60)
+
+    remove_expired_collections(now=time.time() + 30)
+    assert get_ephemeral_collection("document_test", touch=False) is collection
+
+    remove_expired_collections(now=time.time() + 120)
+    assert get_ephemeral_collection("document_test") is None
+
+
+def test_least_recently_used_collections_are_evicted(monkeypatch):
+    first = create_ephemeral_collection("document_first", unit_vectors)
+    first.upsert(ids=["a"], documents=["budget " + "x" * 1000])
+
+    monkeypatch.setitem(ephemeral_store.EPHEMERAL_CONFIG, "max_bytes", 1500)
+
+    second = create_ephemeral_collection("document_second", unit_vectors)
+    second.upsert(ids=["b"], documents=["health " + "x" * 1000])
+
+    assert get_ephemeral_collection("document_first", touch=False) is None
+    assert get_ephemeral_collection("document_second", touch=False) is second
@@ -0,0 +1,156 @@
+'''
+Tests for our fetch layer against a local stub HTTP server, without touching the internet.
+The stub served a page with an ETag, a page that failed twice with 503 before succeeding, and a slow page that
+recorded how many requests were in flight at once.
+'''
+
+
+
+#All Imports
+
+import time
+import threading
+import pytest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+pytest.importorskip("requests")
+
+import http_fetcher
+
+
+
+PAGE_BODY = b"<html><body><p>The 2025 budget allocated GH 1,030 million to education.</p></body></html>"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        state = self.server.state
+
+        if self.path == "/page":
+            with state["lock"]:
+                state["page_requests"] += 1
+
+            if self.headers.get("If-None-Match") == '"v1"':
+                with state["lock"]:
+                    state["page_not_modified"] += 1
+                return self.send_body(304, headers={"ETag": '"v1"'})
+
+            return self.send_body(200, PAGE_BODY, {"ETag": '"v1"', "Content-Type": "text/html"})
+
+        if self.path == "/flaky":
+            with state["lock"]:
+                state["flaky_requests"] += 1
+                attempt = state["flaky_requests"]
+
+            if attempt <= 2:
+                return self.send_body(503, headers={"Retry-After": "0"})
+
+            return self.send_body(200, PAGE_BODY, {"Content-Type": "text/html"})
+
+        if self.path.startswith("/slow"):
+            with state["lock"]:
+                state["in_flight"] += 1
+                state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+
+            time.sleep(0.2)
+
+            with state["lock"]:
+                state["in_flight"] -= 1
+
+            return self.send_body(200, PAGE_BODY, {"Content-Type": "text/html"})
+
+        self.send_body(404)
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.state = {
+        "lock": threading.Lock(),
+        "page_requests": 0,
+        "page_not_modified": 0,
+        "flaky_requests": 0,
+        "in_flight": 0,
+        "max_in_flight": 0,
+    }
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def fetcher(tmp_path, monkeypatch):
+    """
+    This fixture gives every test its own cache folder, short backoffs, a per-host limit of 2 and a fresh session
+    """
+    monkeypatch.setitem(http_fetcher.FETCH_CONFIG, "cache_dir", str(tmp_path / "http_cache"))
+    monkeypatch.setitem(http_fetcher.FETCH_CONFIG, "cache_enabled", True)
+    monkeypatch.setitem(http_fetcher.FETCH_CONFIG, "backoff_factor", 0.01)
+    monkeypatch.setitem(http_fetcher.FETCH_CONFIG, "per_host_limit", 2)
+    monkeypatch.setattr(http_fetcher, "HOST_LIMITS", {})
+    http_fetcher.reset_session()
+
+    yield
+
+    http_fetcher.reset_session()
+
+
+def base_url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def test_unchanged_pages_are_revalidated_with_a_304(stub_server):
+    first = http_fetcher.fetch(f"{base_url(stub_server)}/page")
+    second = http_fetcher.fetch(f"{base_url(stub_server)}/page")
+
+    assert first["status"] == 200 and not first["from_cache"]
+    assert second["status"] == 200 and second["from_cache"]
+    assert second["content"] == PAGE_BODY
+    assert stub_server.state["page_not_modified"] == 1
+
+
+def test_pages_without_validators_are_not_cached(stub_server, tmp_path):
+    http_fetcher.fetch(f"{base_url(stub_server)}/slow")
+
+    assert not (tmp_path / "http_cache").exists() or not any((tmp_path / "http_cache").iterdir())
+
+
+def test_503s_are_retried_until_the_page_succeeds(stub_server):
+    result = http_fetcher.fetch(f"{base_url(stub_server)}/flaky")
+
+    assert result["status"] == 200
+    assert stub_server.state["flaky_requests"] == 3
+
+
+def test_fetch_many_respects_the_per_host_limit(stub_server):
+    urls = [f"{base_url(stub_server)}/slow?{i}" for i in range(8)]
+    fetched = list(http_fetcher.fetch_many(urls, max_workers=8))
+
+    assert sorted(url for url, _, _ in fetched) == sorted(urls)
+    assert all(error is None and result["status"] == 200 for _, result, error in fetched)
+    assert stub_server.state["max_in_flight"] <= 2
+
+
+def test_fetch_many_reports_errors_per_url(stub_server):
+    good = f"{base_url(stub_server)}/page"
+    bad = "http://127.0.0.1:1/unreachable"
+
+    results = {url: (result, error) for url, result, error in http_fetcher.fetch_many([good, bad])}
+
+    assert results[good][1] is None
+    assert results[bad][0] is None and results[bad][1] is not None
@@ -0,0 +1,128 @@
+'''
+Tests for the inference scheduler: priorities, the full queue that our routes turned into 503, and stopping
+'''
+
+
+
+#All Imports
+
+import time
+import threading
+import pytest
+import inference_scheduler
+from inference_scheduler import (
+    SCHEDULER_CONFIG,
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    SchedulerBusyError,
+    start_scheduler,
+    stop_scheduler,
+    submit,
+    run_inference,
+    stream_inference,
+    get_scheduler_stats,
+)
+
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    """
+    A scheduler with one fake model replica and room for two waiting jobs
+    """
+    monkeypatch.setitem(SCHEDULER_CONFIG, "max_queue", 2)
+    start_scheduler(["model"])
+    yield
+    stop_scheduler(timeout=5)
+
+
+def block_worker():
+    """
+    Submits a job that holds the only worker until the returned event is set
+    """
+    release = threading.Event()
+    started = threading.Event()
+
+    def hold(model):
+        started.set()
+        release.wait(5)
+
+    job = submit(hold)
+    assert started.wait(5)
+    return release, job
+
+
+def test_jobs_run_on_the_model(scheduler):
+    assert run_inference(lambda model: f"{model} answered") == "model answered"
+
+
+def test_errors_are_raised_in_the_request_thread(scheduler):
+    def fail(model):
+        raise ValueError("bad prompt")
+
+    with pytest.raises(ValueError, match="bad prompt"):
+        run_inference(fail)
+
+
+def test_streams_yield_every_item(scheduler):
+    assert list(stream_inference(lambda model: iter(["Ghana", " is", " great"]))) == ["Ghana", " is", " great"]
+
+
+def test_a_full_queue_is_rejected_straight_away(scheduler):
+    release, _ = block_worker()
+    rejected_before = get_scheduler_stats()["rejected"]
+
+    queued = [submit(lambda model: "ok"), submit(lambda model: "ok")]
+
+    #This was the error our routes answered with 503 and a Retry-After header
+    started = time.time()
+    with pytest.raises(SchedulerBusyError):
+        submit(lambda model: "too many")
+
+    assert time.time() - started < 1
+    assert get_scheduler_stats()["rejected"] == rejected_before + 1
+
+    release.set()
+    for job in queued:
+        assert job["done"].wait(5) and job["result"] == "ok"
+
+
+def test_interactive_jobs_are_served_before_background_work(scheduler):
+    release, _ = block_worker()
+    order = []
+
+    background = submit(lambda model: order.append("background"), priority=PRIORITY_BACKGROUND)
+    interactive = submit(lambda model: order.append("interactive"), priority=PRIORITY_INTERACTIVE)
+
+    release.set()
+    assert background["done"].wait(5) and interactive["done"].wait(5)
+    assert order == ["interactive", "background"]
+
+
+def test_stopping_finishes_queued_jobs_and_rejects_new_ones(scheduler):
+    release, _ = block_worker()
+    queued = [submit(lambda model: "ok"), submit(lambda model: "ok")]
+
+    threading.Timer(0.2, release.set).start()
+
+    #The queue was full, and stopping still did not block on it
+    assert stop_scheduler(timeout=5)
+    assert all(job["result"] == "ok" for job in queued)
+
+    with pytest.raises(RuntimeError):
+        submit(lambda model: "after stop")
+
+
+def test_stopping_reports_workers_that_are_still_busy(scheduler):
+    release, _ = block_worker()
+
+    assert not stop_scheduler(timeout=0.2)
+
+    release.set()
+
+
+def test_submitting_without_a_scheduler_fails():
+    assert inference_scheduler.JOB_QUEUE is None
+
+    with pytest.raises(RuntimeError):
+        run_inference(lambda model: "no workers")
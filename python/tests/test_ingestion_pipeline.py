@@ -0,0 +1,87 @@
+'''
+Tests for the embed and write stages of the ingestion pipeline, with a fake collection and embedding function
+'''
+
+
+
+#All Imports
+
+import threading
+import pytest
+
+ingestion_pipeline = pytest.importorskip("ingestion_pipeline")
+
+
+
+class RecordingCollection:
+
+    def __init__(self, name="test_collection"):
+        self.name = name
+        self.upserted = []
+
+    def upsert(self, documents, ids, metadatas, embeddings=None):
+        self.upserted.extend(ids)
+
+
+def chunk_sets(count, chunks_per_document=3):
+    for d in range(count):
+        yield {
+            "source": f"doc{d}.pdf",
+            "doc_hash": f"h{d}",
+            "ids": [f"doc{d}_c{c}" for c in range(chunks_per_document)],
+            "documents": [f"text {d} {c}" for c in range(chunks_per_document)],
+            "metadatas": [{"source": f"doc{d}.pdf"} for _ in range(chunks_per_document)],
+        }
+
+
+def embed(documents):
+    return [[1.0, 0.0] for _ in documents]
+
+
+@pytest.fixture(autouse=True)
+def small_batches(monkeypatch):
+    monkeypatch.setitem(ingestion_pipeline.INGESTION_CONFIG, "embed_batch_size", 2)
+    monkeypatch.setitem(ingestion_pipeline.INGESTION_CONFIG, "write_queue_size", 1)
+    monkeypatch.setattr(ingestion_pipeline, "WRITER_CHECK_SECONDS", 0.05)
+
+
+def test_every_chunk_is_written():
+    collection = RecordingCollection()
+    stats = ingestion_pipeline.run_pipeline(chunk_sets(5), collection, embed)
+
+    assert stats["chunks_written"] == 15
+    assert len(collection.upserted) == 15
+
+
+def test_failed_records_are_counted_and_the_run_finishes(monkeypatch):
+    def fail(collection, document):
+        raise RuntimeError("registry is locked")
+
+    monkeypatch.setattr(ingestion_pipeline, "finalize", fail)
+
+    stats = ingestion_pipeline.run_pipeline(chunk_sets(5), RecordingCollection(), embed)
+
+    assert stats["failed_documents"] == 5
+    assert stats["chunks_written"] == 15
+
+
+def test_a_dead_writer_stops_the_run_instead_of_hanging(monkeypatch):
+    def crash(collection, document, stats):
+        raise KeyError("bug in the writer")
+
+    monkeypatch.setattr(ingestion_pipeline, "finalize_safely", crash)
+
+    outcome = []
+
+    def run():
+        try:
+            ingestion_pipeline.run_pipeline(chunk_sets(20), RecordingCollection(), embed)
+        except RuntimeError as e:
+            outcome.append(e)
+
+    runner = threading.Thread(target=run, daemon=True)
+    runner.start()
+    runner.join(10)
+
+    assert not runner.is_alive()
+    assert outcome and "writer stopped" in str(outcome[0])
@@ -0,0 +1,74 @@
+'''
+Tests for the token counts of our memory stores, with a fake Gemma tokenizer that counted one token per word
+'''
+
+
+
+#All Imports
+
+from collections import OrderedDict
+import pytest
+
+memory_system = pytest.importorskip("memory_system")
+
+
+
+class WordTokenizer:
+
+    def tokenize(self, text, add_bos=False, special=True):
+        return text.decode("utf-8").split()
+
+
+@pytest.fixture(autouse=True)
+def fresh_sessions(monkeypatch):
+    """
+    Every test got empty sessions in RAM, no Gemma model and a threshold that never queued a compression
+    """
+    monkeypatch.setattr(memory_system, "SESSIONS", OrderedDict())
+    monkeypatch.setattr(memory_system, "GEMMA_MODEL", None)
+    monkeypatch.setitem(memory_system.SESSION_CONFIG, "sqlite_path", "")
+    monkeypatch.setitem(memory_system.MEMORY_CONFIG, "token_threshold", 10 ** 6)
+
+
+def stored_memory(session_id, mode="chat"):
+    return memory_system.get_session(session_id)[mode]
+
+
+def test_totals_are_kept_in_one_unit_when_the_tokenizer_changes(monkeypatch):
+    memory_system.add_to_memory("What is the capital of Ghana? ", "Accra is the capital.", session_id="s1")
+
+    monkeypatch.setattr(memory_system, "GEMMA_MODEL", WordTokenizer())
+    memory_system.add_to_memory("And its population? ", "About 2.5 million people.", session_id="s1")
+
+    memory = stored_memory("s1")
+
+    assert memory["token_unit"] == "gemma"
+    assert [turn["tokens"] for turn in memory["recent_turns"]] == [10, 7]
+    assert memory["total_tokens"] == 17
+
+
+def test_a_summary_is_discarded_when_the_store_was_trimmed_meanwhile(monkeypatch):
+    monkeypatch.setitem(memory_system.MEMORY_CONFIG, "recent_turns_keep", 2)
+
+    for i in range(6):
+        memory_system.add_to_memory(f"Question {i} ", f"answer {i}", session_id="s2")
+
+    memory = stored_memory("s2")
+    monkeypatch.setitem(memory_system.MEMORY_CONFIG, "token_threshold", 1)
+
+    def summarize_while_the_queue_is_full(text):
+        #The request thread found the queue full, trimmed the store and added another turn while we summarized
+        with memory_system.get_session("s2")["lock"]:
+            memory_system.trim_memory(memory)
+            memory["recent_turns"].append({"user": "Question 6 ", "model": "answer 6", "tokens": 3})
+            memory["total_tokens"] += 3
+
+        return "An old summary"
+
+    monkeypatch.setattr(memory_system, "summarize_text", summarize_while_the_queue_is_full)
+
+    memory_system.compress_memory("s2", "chat")
+
+    assert memory["summary"] == ""
+    assert [turn["user"] for turn in memory["recent_turns"]] == ["Question 4 ", "Question 5 ", "Question 6 "]
+    assert memory["total_tokens"] == sum(turn["tokens"] for turn in memory["recent_turns"])
@@ -0,0 +1,62 @@
+'''
+Tests for the relevance checks we applied to fused dense and BM25 retrieval results
+'''
+
+
+
+#All Imports
+
+import pytest
+
+model_utilities = pytest.importorskip("model_utilities")
+
+
+
+def fused_results(distances, lexical_scores, lexical_ranks):
+    ids = [f"c{i}" for i in range(len(distances))]
+
+    return {
+        'ids': ids,
+        'chunks': [f"chunk {chunk_id}" for chunk_id in ids],
+        'sources': [{"source": "Acts.pdf"} for _ in ids],
+        'distances': distances,
+        'lexical_scores': lexical_scores,
+        'lexical_ranks': lexical_ranks,
+    }
+
+
+def test_chunks_within_the_threshold_are_kept():
+    filtered = model_utilities.apply_distance_threshold(fused_results([0.8, 1.4], [None, None], [None, None]), 1.2)
+
+    assert filtered['is_relevant']
+    assert filtered['ids'] == ["c0"]
+
+
+def test_nothing_close_and_no_strong_match_is_not_relevant():
+    filtered = model_utilities.apply_distance_threshold(fused_results([1.6, 1.7], [0.05, None], [0, None]), 1.2)
+
+    assert not filtered['is_relevant']
+    assert filtered['ids'] == []
+
+
+def test_strong_bm25_match_beyond_both_thresholds_is_returned(monkeypatch):
+    #An exact lookup like "Act 1030" whose embedding was far from the question, next to weak dense neighbours
+    results = fused_results([1.9, 1.7, 1.8], [0.9, None, 0.02], [0, None, 1])
+    monkeypatch.setattr(model_utilities, "run_query", lambda *args, **kwargs: results)
+
+    filtered = model_utilities.query_database_with_fallback("What does Act 1030 say?", None, thresholds=(1.2, 1.5))
+
+    assert filtered['is_relevant']
+    assert filtered['ids'] == ["c0"]
+
+
+def test_weak_or_low_ranked_bm25_hits_do_not_pass():
+    filtered = model_utilities.apply_distance_threshold(fused_results([1.9, 1.9], [0.1, 0.9], [0, 10]), 1.5)
+
+    assert not filtered['is_relevant']
+
+
+def test_no_threshold_keeps_everything():
+    filtered = model_utilities.apply_distance_threshold(fused_results([1.9], [None], [None]), None)
+
+    assert filtered['is_relevant'] and filtered['ids'] == ["c0"]
@@ -0,0 +1,68 @@
+'''
+Tests for batching images of the same size through EasyOCR's readtext_batched, with a fake reader
+'''
+
+
+
+#All Imports
+
+import pytest
+
+np = pytest.importorskip("numpy")
+ocr = pytest.importorskip("ocr")
+
+
+
+class FakeReader:
+
+    def __init__(self, fail_batches=False):
+        self.fail_batches = fail_batches
+        self.batched_calls = []
+        self.single_calls = 0
+
+    def readtext_batched(self, images, n_width=None, n_height=None, batch_size=1):
+        if self.fail_batches:
+            raise RuntimeError("out of memory")
+
+        assert all(image.shape[:2] == (n_height, n_width) for image in images)
+        self.batched_calls.append(len(images))
+        return [[(None, f"batched {int(image[0, 0, 0])}", 0.9)] for image in images]
+
+    def readtext(self, image, batch_size=1):
+        self.single_calls += 1
+        return [(None, f"single {int(image[0, 0, 0])}", 0.9)]
+
+
+@pytest.fixture
+def images(monkeypatch):
+    """
+    Five fake photos keyed by path: three of one size, one of another and one more of the first size
+    """
+    shapes = {"a": (1500, 2000), "b": (1500, 2000), "c": (2000, 1500), "d": (1500, 2000), "e": (1500, 2000)}
+    loaded = {path: np.full(shape + (3,), index, dtype=np.uint8) for index, (path, shape) in enumerate(shapes.items())}
+
+    monkeypatch.setattr(ocr, "load_image", lambda path: loaded[path])
+    monkeypatch.setitem(ocr.OCR_CONFIG, "image_batch_size", 3)
+
+    return list(shapes)
+
+
+def test_same_sized_images_are_read_in_batches(images, monkeypatch):
+    reader = FakeReader()
+    monkeypatch.setattr(ocr, "get_reader", lambda languages=None: reader)
+
+    texts = ocr.extract_text_from_images(images)
+
+    assert reader.batched_calls == [3]
+    assert reader.single_calls == 2
+    assert texts == ["batched 0", "batched 1", "single 2", "batched 3", "single 4"]
+
+
+def test_a_failed_batch_falls_back_to_one_image_at_a_time(images, monkeypatch):
+    reader = FakeReader(fail_batches=True)
+    monkeypatch.setattr(ocr, "get_reader", lambda languages=None: reader)
+
+    texts = ocr.extract_text_from_images(images)
+
+    assert reader.single_calls == 5
+    assert texts == [f"single {i}" for i in range(5)]
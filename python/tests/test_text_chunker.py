@@ -0,0 +1,67 @@
+'''
+Tests for the sentence-aware chunker, with token counts estimated from words instead of the MiniLM tokenizer
+'''
+
+
+
+#All Imports
+
+from text_chunker import sentence_chunks, count_tokens_batch
+
+
+
+def sentences(count, words=10):
+    return [f"Sentence {i} " + " ".join(["budget"] * (words - 2)) + "." for i in range(count)]
+
+
+def test_short_text_is_one_chunk():
+    assert list(sentence_chunks("Ghana's budget grew. Education got more.")) == ["Ghana's budget grew. Education got more."]
+
+
+def test_empty_text_has_no_chunks():
+    assert list(sentence_chunks("")) == []
+    assert list(sentence_chunks("   \n\n  ")) == []
+
+
+def test_chunks_stay_within_the_token_budget():
+    chunks = list(sentence_chunks(" ".join(sentences(60)), max_tokens=60, overlap_tokens=0))
+
+    assert len(chunks) > 1
+    assert all(count <= 60 for count in count_tokens_batch(chunks))
+
+
+def test_chunks_only_end_between_sentences():
+    for chunk in sentence_chunks(" ".join(sentences(30)), max_tokens=50, overlap_tokens=0):
+        assert chunk.startswith("Sentence ") and chunk.endswith(".")
+
+
+def test_every_sentence_is_kept_once_without_overlap():
+    text = sentences(25)
+    chunks = list(sentence_chunks(" ".join(text), max_tokens=50, overlap_tokens=0))
+
+    assert " ".join(chunks) == " ".join(text)
+
+
+def test_overlap_repeats_whole_sentences():
+    text = sentences(20)
+    chunks = list(sentence_chunks(" ".join(text), max_tokens=60, overlap_tokens=15))
+
+    for previous, chunk in zip(chunks, chunks[1:]):
+        first_sentence = chunk.split(". ")[0] + "."
+        assert first_sentence in previous
+
+
+def test_sentences_longer_than_a_chunk_are_split():
+    long_sentence = " ".join(["allocation"] * 200) + "."
+    chunks = list(sentence_chunks(long_sentence, max_tokens=50, overlap_tokens=0))
+
+    assert len(chunks) > 1
+    assert all(count <= 50 for count in count_tokens_batch(chunks))
+
+
+def test_paragraph_breaks_are_preferred_chunk_ends():
+    first = " ".join(sentences(4))
+    second = " ".join(sentences(4))
+    chunks = list(sentence_chunks(f"{first}\n\n{second}", max_tokens=80, overlap_tokens=0))
+
+    assert chunks == [first, second]
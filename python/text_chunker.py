@@ -0,0 +1,177 @@
+'''
+This is our sentence-aware chunker. Our first chunker cut the cleaned text every 1000 characters with 200 characters
+of overlap, so it split words and sentences in half and produced chunks with very different token counts.
+Some chunks were truncated by the embedding model while others left most of its window unused.
+
+This chunker packed whole sentences into chunks until they reached a token budget for multi-qa-MiniLM-L6-dot-v1,
+preferred to end chunks at paragraph breaks, and overlapped chunks by whole sentences instead of raw characters.
+It was a generator that walked the text paragraph by paragraph with regular expression iterators,
+so it never copied the whole text again, and it counted the tokens of all sentences of a paragraph in one tokenizer call.
+'''
+
+
+
+#All Imports
+
+import os
+import re
+import math
+import threading
+
+
+
+#Chunker Configuration - These settings controlled how we split documents before embedding them
+CHUNKER_CONFIG = {
+
+    #"sentence" used this chunker, "fixed" went back to the 1000/200 character chunker
+    "strategy": os.environ.get("KIKI_CHUNKER", "sentence"),
+
+    #MiniLM read at most 256 word pieces including its two special tokens, so we stayed a little below that
+    "max_tokens": int(os.environ.get("KIKI_CHUNK_TOKENS", 240)),
+
+    #We repeated about this many tokens of whole sentences from the end of a chunk at the start of the next one
+    "overlap_tokens": int(os.environ.get("KIKI_CHUNK_OVERLAP_TOKENS", 40)),
+
+    #We ended a chunk at a paragraph break once it was at least this full
+    "paragraph_break_fill": 0.5,
+
+    #We counted tokens with the tokenizer of our embedding model
+    "tokenizer": "sentence-transformers/multi-qa-MiniLM-L6-dot-v1",
+}
+
+
+#A paragraph was any text between blank lines
+PARAGRAPH_PATTERN = re.compile(r"\S(?:.*?)(?=\n\s*\n|\Z)", re.S)
+
+#A sentence ended with ., ! or ? (optionally followed by closing quotes or brackets) and whitespace, or at the end of the paragraph
+SENTENCE_PATTERN = re.compile(r"\S.*?(?:[.!?][\"')\]]*(?=\s)|\Z)", re.S)
+
+WORD_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+#We loaded the tokenizer once and shared it
+_tokenizer = None
+_tokenizer_loaded = False
+_tokenizer_lock = threading.Lock()
+
+
+def get_tokenizer():
+    """
+    This function loads the embedding model's tokenizer on first use, or returns None when transformers was not available
+    """
+    global _tokenizer, _tokenizer_loaded
+
+    with _tokenizer_lock:
+        if not _tokenizer_loaded:
+            try:
+                from transformers import AutoTokenizer
+                _tokenizer = AutoTokenizer.from_pretrained(CHUNKER_CONFIG["tokenizer"])
+            except Exception as e:
+                print(f"Warning: could not load the {CHUNKER_CONFIG['tokenizer']} tokenizer, estimating token counts instead: {e}")
+                _tokenizer = None
+            _tokenizer_loaded = True
+
+    return _tokenizer
+
+
+def count_tokens_batch(texts):
+    """
+    This function returns the number of word pieces in each text, tokenizing all of them in one call
+    """
+
+    if not texts:
+        return []
+
+    tokenizer = get_tokenizer()
+
+    if tokenizer is not None:
+        encoded = tokenizer(texts, add_special_tokens=False, return_attention_mask=False, return_token_type_ids=False)
+        return [len(ids) for ids in encoded["input_ids"]]
+
+    #Without the tokenizer we estimated that WordPiece split words into about 1.3 pieces on average
+    return [math.ceil(len(WORD_PATTERN.findall(text)) * 1.3) for text in texts]
+
+
+def iter_paragraphs(text):
+    for match in PARAGRAPH_PATTERN.finditer(text):
+        yield match.group(0)
+
+
+def iter_sentences(paragraph):
+    for match in SENTENCE_PATTERN.finditer(paragraph):
+        sentence = " ".join(match.group(0).split())
+        if sentence:
+            yield sentence
+
+
+def split_long_sentence(sentence, tokens, max_tokens):
+    """
+    This function splits a sentence that was longer than a whole chunk into roughly equal runs of words
+    """
+    words = sentence.split()
+    pieces = math.ceil(tokens / max_tokens)
+    words_per_piece = math.ceil(len(words) / pieces)
+
+    for start in range(0, len(words), words_per_piece):
+        piece = " ".join(words[start:start + words_per_piece])
+        yield piece, math.ceil(tokens * (min(start + words_per_piece, len(words)) - start) / len(words))
+
+
+def sentence_chunks(text, max_tokens=None, overlap_tokens=None):
+    """
+    This generator yields chunks of whole sentences of at most max_tokens word pieces.
+    Paragraph breaks in the text (blank lines) were kept as preferred places to end a chunk.
+    """
+
+    max_tokens = max_tokens or CHUNKER_CONFIG["max_tokens"]
+    overlap_tokens = CHUNKER_CONFIG["overlap_tokens"] if overlap_tokens is None else overlap_tokens
+    paragraph_break_tokens = max_tokens * CHUNKER_CONFIG["paragraph_break_fill"]
+
+    #The sentences of the chunk we were filling, with their token counts
+    current = []
+    current_tokens = 0
+
+    #The tokens added since the last chunk we yielded, so a chunk made only of overlap was never emitted
+    new_tokens = 0
+
+    def overlap_tail():
+        #We carried the last whole sentences that fitted in the overlap budget into the next chunk
+        tail = []
+        tail_tokens = 0
+        for sentence, tokens in reversed(current):
+            if tail_tokens + tokens > overlap_tokens:
+                break
+            tail.insert(0, (sentence, tokens))
+            tail_tokens += tokens
+        return tail, tail_tokens
+
+    for paragraph in iter_paragraphs(text):
+        sentences = list(iter_sentences(paragraph))
+        counts = count_tokens_batch(sentences)
+
+        for sentence, tokens in zip(sentences, counts):
+            pieces = split_long_sentence(sentence, tokens, max_tokens) if tokens > max_tokens else [(sentence, tokens)]
+
+            for piece, piece_tokens in pieces:
+                if current and current_tokens + piece_tokens > max_tokens:
+                    yield " ".join(sentence for sentence, _ in current)
+                    current, current_tokens = overlap_tail()
+                    new_tokens = 0
+
+                    #The overlap never pushed the next sentence over the budget
+                    while current and current_tokens + piece_tokens > max_tokens:
+                        current_tokens -= current.pop(0)[1]
+
+                current.append((piece, piece_tokens))
+                current_tokens += piece_tokens
+                new_tokens += piece_tokens
+
+        #We ended the chunk at the paragraph break if it was already reasonably full
+        if new_tokens and current_tokens >= paragraph_break_tokens:
+            yield " ".join(sentence for sentence, _ in current)
+            current, current_tokens = overlap_tail()
+            new_tokens = 0
+
+    #We only emitted the remainder when it held something besides the overlap we had already emitted
+    if new_tokens:
+        yield " ".join(sentence for sentence, _ in current)
@@ -0,0 +1,17 @@
+'''
+This is the WSGI entry point for running Kiki behind a production server instead of Flask's development server.
+Gunicorn imported this module inside each worker after forking, so every worker loaded its own Gemma model once
+and served all of its threads from it. The server settings lived in gunicorn.conf.py.
+
+Usage: cd python && gunicorn -c gunicorn.conf.py wsgi:application
+'''
+
+
+
+#All Imports
+
+from app import create_app
+
+
+
+application = create_app()
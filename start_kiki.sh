@@ -18,11 +18,19 @@ if [ $? -ne 0 ]; then
 fi
 
 echo ""
-echo "Starting Flask server..."
 echo "Once loaded, open: http://localhost:5081"
 echo ""
 echo "Press Ctrl+C to stop the server"
 
 
 
-cd python && python3 app.py
+cd python
+
+# We used gunicorn when it was installed and fell back to Flask's development server otherwise
+if python3 -c "import gunicorn" 2>/dev/null; then
+    echo "Starting gunicorn server..."
+    python3 -m gunicorn -c gunicorn.conf.py wsgi:application
+else
+    echo "Starting Flask development server..."
+    python3 app.py
+fi